@@ -37,6 +37,7 @@ function ForkTemplateContent() {
     const [isEditing, setIsEditing] = useState(false);
     const [savingfork, setSavingfork] = useState(false);
     const [server, setServer] = useState('prod');
+    const [parsedResumeIds, setParsedResumeIds] = useState<Record<string, string>>({});
 
     useEffect(() => {
         const init = async () => {
@@ -164,7 +165,8 @@ function ForkTemplateContent() {
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
                     template_text: templateText,
-                    child_text: childText
+                    child_text: childText,
+                    extractedData: parsedResumeIds[selectedChild.id]
                 })
             });
 
@@ -172,6 +174,9 @@ function ForkTemplateContent() {
             if (!res.ok) throw new Error(data.error);
 
             setResult(data.rewrittenContent);
+            if (data.extractedDataId) {
+                setParsedResumeIds(prev => ({ ...prev, [selectedChild.id]: data.extractedDataId }));
+            }
 
             await supabase.from('resumes').update({
                 fork_count: (selectedTemplate.fork_count || 0) + 1
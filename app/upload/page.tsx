@@ -345,7 +345,14 @@ export default function UploadPage() {
         try {
           const formData = new FormData();
           formData.append('file', uploadedFile);
-          const res = await fetch(server == 'local' ? 'http://localhost:8000/extract' : 'https://sastrackerbackend.vercel.app/extract', { method: 'POST', body: formData });
+          // Crops come back inline: they are saved with the question, and /assets URLs are only short-lived previews.
+          const res = await fetch(server == 'local' ? 'http://localhost:8000/extract?inline_images=true' : 'https://sastrackerbackend.vercel.app/extract?inline_images=true', { method: 'POST', body: formData });
+          if (res.status === 413) {
+            const { detail } = await res.json().catch(() => ({ detail: null }));
+            alert(detail || "This PDF is too large to extract.");
+            setView('upload');
+            return;
+          }
           if (!res.ok) throw new Error("Backend Error");
           const data = await res.json();
           const mapped = data.questions.map((q: any) => ({
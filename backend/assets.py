@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional, Tuple
+
+from cache import EVICT_BATCH, SWEEP_SECONDS
+
+# Cropped figures are stored once, keyed by the hash of their encoded bytes,
+# and served from /assets/{digest} instead of being inlined as data URIs.
+ASSET_MAX_DIMENSION = int(os.getenv("ASSET_MAX_DIMENSION", "1024"))
+ASSET_FORMAT = os.getenv("ASSET_FORMAT", "WEBP").upper()
+ASSET_QUALITY = int(os.getenv("ASSET_QUALITY", "80"))
+# Crops are rendered from the PDF at this scale, not cut from the page image
+# the model saw.
+ASSET_RENDER_SCALE = float(os.getenv("ASSET_RENDER_SCALE", "2"))
+DIGEST_CHARS = 32
+
+
+class AssetStore:
+    """Content-addressed SQLite blob store with size-bounded LRU eviction.
+
+    ``put`` is idempotent: identical bytes map to the same digest and are
+    stored once. As in DiskCache, the total size is a running count and
+    eviction removes the least recently used assets a batch at a time.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS assets (
+                digest TEXT PRIMARY KEY,
+                mime_type TEXT NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS assets_accessed ON assets(accessed)")
+        self.deduped = 0
+        self._bytes = self._total()
+        self._synced = time.time()
+
+    def _total(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM assets").fetchone()[0]
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()[:DIGEST_CHARS]
+
+    def put(self, data: bytes, mime_type: str) -> str:
+        digest = self.digest(data)
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO assets (digest, mime_type, data, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, mime_type, data, len(data), now, now),
+            )
+            if cur.rowcount == 0:
+                self.deduped += 1
+                self._conn.execute("UPDATE assets SET accessed = ? WHERE digest = ?", (now, digest))
+            else:
+                self._bytes += len(data)
+                self._evict(now)
+        return digest
+
+    def get(self, digest: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mime_type, data FROM assets WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE assets SET accessed = ? WHERE digest = ?", (time.time(), digest))
+        return (row[0], bytes(row[1])) if row else None
+
+    def missing(self, digests: Iterable[str]) -> bool:
+        """True if any of ``digests`` has been evicted; touches the ones present."""
+        digests = list(set(digests))
+        if not digests:
+            return False
+        marks = ",".join("?" * len(digests))
+        with self._lock:
+            self._conn.execute(f"UPDATE assets SET accessed = ? WHERE digest IN ({marks})", (time.time(), *digests))
+            found = self._conn.execute(f"SELECT COUNT(*) FROM assets WHERE digest IN ({marks})", digests).fetchone()[0]
+        return found < len(digests)
+
+    def _evict(self, now: float):
+        if now - self._synced >= SWEEP_SECONDS:
+            # Other processes write to the same file.
+            self._bytes = self._total()
+            self._synced = now
+        while self._bytes > self.max_bytes:
+            batch = self._conn.execute(
+                "SELECT digest, size FROM assets ORDER BY accessed ASC LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            if not batch:
+                break
+            for digest, size in batch:
+                self._conn.execute("DELETE FROM assets WHERE digest = ?", (digest,))
+                self._bytes -= size
+                if self._bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM assets").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "deduped": self.deduped}
@@ -0,0 +1,124 @@
+"""Cold-start cost: module import, startup and the first requests of a fresh process.
+
+Each run starts a new interpreter that imports the app, runs its lifespan and
+sends two /solve and two /extract requests, timing each step. Gemini is
+replaced by the fake model *after* the SDK has been imported and configured,
+so the first LLM request still pays for the SDK the way it does in
+production. With --warmup the app starts with WARMUP=1 and that cost moves
+into startup instead.
+
+    python bench/coldstart.py --runs 5
+    python bench/coldstart.py --runs 5 --warmup --importtime
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+STEPS = ["import", "startup", "solve_1", "solve_2", "extract_1", "extract_2"]
+
+
+def child(args):
+    started = time.perf_counter()
+    import main as backend
+    timings = {"import": time.perf_counter() - started}
+
+    import asyncio
+    import httpx
+    import models
+    from fake_model import FakeModel
+
+    configure = models._configure
+
+    def configure_then_fake():
+        configure()
+        import google.generativeai as genai
+        genai.GenerativeModel = FakeModel
+
+    models._configure = configure_then_fake
+    FakeModel.latency = 0
+    with open(args.pdf, "rb") as f:
+        pdf = f.read()
+
+    async def timed(name, request):
+        started = time.perf_counter()
+        response = await request
+        timings[name] = time.perf_counter() - started
+        response.raise_for_status()
+
+    async def run():
+        started = time.perf_counter()
+        async with backend.lifespan(backend.app):
+            timings["startup"] = time.perf_counter() - started
+            transport = httpx.ASGITransport(app=backend.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for n in (1, 2):
+                    await timed(f"solve_{n}", client.post("/solve", json={"content": f"Evaluate the integral of x^{n} from 0 to 1."}))
+                for n in (1, 2):
+                    files = {"file": ("paper.pdf", pdf + b"\n%%coldstart-%d\n" % n, "application/pdf")}
+                    await timed(f"extract_{n}", client.post("/extract", files=files))
+
+    asyncio.run(run())
+    print(json.dumps(timings))
+
+
+def spawn(args, env, pdf_path, extra=()):
+    cmd = [sys.executable, *extra, os.path.abspath(__file__), "--child", "--pdf", pdf_path]
+    return subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+
+
+def main(args):
+    from common import make_pdf, percentile
+
+    workdir = tempfile.mkdtemp()
+    pdf_path = os.path.join(workdir, "paper.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(make_pdf(args.pages))
+
+    env = {k: v for k, v in os.environ.items() if k not in ("FAKE_LLM", "WARMUP")}
+    env.update(GOOGLE_API_KEY="bench", PAGE_CACHE="0", WARMUP="1" if args.warmup else "0")
+
+    runs = []
+    for n in range(args.runs):
+        env["CACHE_DIR"] = os.path.join(workdir, f"cache-{n}")
+        runs.append(json.loads(spawn(args, env, pdf_path).stdout.strip().splitlines()[-1]))
+
+    print(f"{args.runs} fresh processes, WARMUP={env['WARMUP']}")
+    print(f"{'step':<12}{'p50 ms':>10}{'max ms':>10}")
+    for step in STEPS:
+        samples = [run[step] for run in runs]
+        print(f"{step:<12}{percentile(samples, 50) * 1e3:>10.1f}{max(samples) * 1e3:>10.1f}")
+    to_first = [run["import"] + run["startup"] + run["solve_1"] for run in runs]
+    print(f"{'to first /solve':<20}{statistics.median(to_first) * 1e3:>8.1f} ms")
+
+    if args.importtime:
+        env["CACHE_DIR"] = os.path.join(workdir, "cache-importtime")
+        rows = []
+        for line in spawn(args, env, pdf_path, ("-X", "importtime")).stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[1].strip().isdigit() and not parts[2].startswith("  "):
+                rows.append((int(parts[1]), parts[2].strip()))
+        print("slowest top-level imports (cumulative, whole run):")
+        for micros, module in sorted(rows, reverse=True)[:args.importtime_top]:
+            print(f"  {micros / 1e3:>8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--warmup", action="store_true")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports of one run")
+    parser.add_argument("--importtime-top", type=int, default=12)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        child(args)
+    else:
+        main(args)
@@ -0,0 +1,170 @@
+import io
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+os.environ.setdefault("CACHE_DIR", f"/tmp/sastracker_bench_{os.getpid()}")
+# Benchmarks re-extract the same synthetic pages as "new" papers; the page
+# cache would turn every run after the first into a lookup.
+os.environ.setdefault("PAGE_CACHE", "0")
+
+import PIL.Image
+import PIL.ImageDraw
+
+from fake_model import FakeModel
+
+
+def install_fake_model(latency: float = 0.5):
+    import google.generativeai as genai
+    import models
+    FakeModel.latency = latency
+    genai.GenerativeModel = FakeModel
+    models.reset()
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    images = []
+    for i in range(pages):
+        img = PIL.Image.new("RGB", (1240, 1754), "white")
+        draw = PIL.ImageDraw.Draw(img)
+        for line in range(60):
+            draw.text((80, 80 + line * 26), f"Q{seed}.{i}.{line} Explain the working of a full adder with a truth table.", fill="black")
+        draw.rectangle((300, 1300, 900, 1650), outline="black", width=4)
+        images.append(img)
+    buffered = io.BytesIO()
+    images[0].save(buffered, "PDF", save_all=True, append_images=images[1:])
+    return buffered.getvalue()
+
+
+def make_text_pdf(pages: int, lines_per_page: int = 45, seed: int = 0) -> bytes:
+    """Born-digital PDF with a real text layer (Helvetica), like a Word/LaTeX export."""
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1 + pages * 2
+    kids = []
+    for p in range(pages):
+        lines = [f"Experience {seed}.{p}.{n}: Built a data pipeline processing 1.{n}M events/day in Python" for n in range(lines_per_page)]
+        ops = "BT /F1 10 Tf 14 TL 50 800 Td " + " ".join(f"({line}) '" for line in lines) + " ET"
+        stream = add(b"<< /Length %d >>\nstream\n" % len(ops) + ops.encode() + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, stream)
+        ))
+    add(b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % pages)
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % i + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for off in offsets:
+        out.write(b"%010d 00000 n \n" % off)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+
+def percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _rss_bytes(pid) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _child_pids(pid: int):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent pid; the command name before it may contain spaces.
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    children.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    return children
+
+
+def _temp_bytes(tmp_dir: str, baseline: set) -> int:
+    # Spooled uploads are unlinked temp files, only visible through open fds.
+    # Only top-level files count, so the cache databases under CACHE_DIR do not.
+    total = 0
+    seen = set()
+    for fd in os.listdir("/proc/self/fd"):
+        try:
+            target = os.readlink(f"/proc/self/fd/{fd}")
+            if os.path.dirname(target) == tmp_dir:
+                st = os.stat(f"/proc/self/fd/{fd}")
+                if (st.st_dev, st.st_ino) not in seen:
+                    seen.add((st.st_dev, st.st_ino))
+                    total += st.st_size
+        except OSError:
+            continue
+    for entry in os.scandir(tmp_dir):
+        try:
+            if entry.is_file(follow_symlinks=False) and entry.name not in baseline:
+                st = entry.stat(follow_symlinks=False)
+                if (st.st_dev, st.st_ino) not in seen:
+                    total += st.st_size
+        except OSError:
+            continue
+    return total
+
+
+class ResourceSampler:
+    """Background thread tracking peak RSS (this process + pool workers) and
+    peak temp-file bytes while a block runs. Linux only (reads /proc)."""
+
+    def __init__(self, interval: float = 0.05):
+        import tempfile
+        self.interval = interval
+        self.tmp_dir = tempfile.gettempdir()
+        self.peak_rss = 0
+        self.peak_temp = 0
+
+    def _sample(self):
+        pid = os.getpid()
+        rss = _rss_bytes(pid) + sum(_rss_bytes(child) for child in _child_pids(pid))
+        self.peak_rss = max(self.peak_rss, rss)
+        self.peak_temp = max(self.peak_temp, _temp_bytes(self.tmp_dir, self._baseline))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        import threading
+        self._baseline = set(os.listdir(self.tmp_dir))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
@@ -0,0 +1,89 @@
+"""Exercise the fetcher against a local HTTP stand-in for Supabase storage.
+
+Serves a synthetic resume PDF with an ETag (and optionally a max-age), then
+hits /extract-pdf-text and /resume-diff with its URL and prints what the
+origin actually saw: one full download, then 304 revalidations or nothing.
+Also checks the size cap and timeouts.
+
+    python bench/fetch_check.py
+    python bench/fetch_check.py --max-age 60
+"""
+import argparse
+import asyncio
+import hashlib
+import http.server
+import os
+import threading
+import time
+
+from common import install_fake_model, make_text_pdf
+
+import httpx
+
+
+def serve(body: bytes, max_age: int):
+    etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+    seen = {"200": 0, "304": 0}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/slow.pdf":
+                time.sleep(3)
+            if self.path == "/huge.pdf":
+                self.send_response(200)
+                self.send_header("Content-Length", str(1 << 34))
+                self.end_headers()
+                return
+            cache_control = f"max-age={max_age}" if max_age else "no-cache"
+            if self.headers.get("If-None-Match") == etag:
+                seen["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", cache_control)
+                self.end_headers()
+                return
+            seen["200"] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, seen
+
+
+async def main(args):
+    install_fake_model(0.05)
+    os.environ.setdefault("FETCH_READ_TIMEOUT", "1")
+    import main as backend
+
+    server, seen = serve(make_text_pdf(1), args.max_age)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for i in range(3):
+            r = await client.post("/extract-pdf-text", data={"url": f"{base}/resume.pdf"})
+            print(f"/extract-pdf-text #{i + 1}: HTTP {r.status_code}, origin saw {seen}")
+        r = await client.post("/resume-diff", data={"resume1_url": f"{base}/resume.pdf", "resume2_url": f"{base}/resume.pdf"})
+        print(f"/resume-diff: HTTP {r.status_code}, origin saw {seen}")
+        r = await client.post("/extract-pdf-text", data={"url": f"{base}/huge.pdf"})
+        print(f"oversized: HTTP {r.status_code} {r.json()['detail']}")
+        r = await client.post("/extract-pdf-text", data={"url": f"{base}/slow.pdf"})
+        print(f"slow origin: HTTP {r.status_code} {r.json()['detail']}")
+    print("fetcher:", backend.fetcher.stats)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-age", type=int, default=0, help="Cache-Control max-age the stand-in sends")
+    asyncio.run(main(parser.parse_args()))
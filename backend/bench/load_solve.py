@@ -0,0 +1,74 @@
+"""Load test: /solve latency while /extract jobs run on the same worker.
+
+Drives the app in-process over ASGI (so everything shares one event loop,
+exactly like a single uvicorn worker) with a fake Gemini model, and reports
+/solve p50/p99 with and without concurrent /extract uploads. If blocking work
+leaks onto the loop, the "under load" p99 grows with the render time.
+
+    python bench/load_solve.py --solves 200 --extracts 8 --pages 10
+
+Requires httpx (not a runtime dependency).
+"""
+import argparse
+import asyncio
+import time
+
+from common import install_fake_model, make_pdf, percentile
+
+import httpx
+
+
+async def solve_loop(client, n: int, concurrency: int):
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with slots:
+            start = time.perf_counter()
+            r = await client.post("/solve", json={"content": f"What is {i} + {i}?"})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return latencies
+
+
+async def extract_loop(client, pdfs):
+    async def one(i, pdf):
+        r = await client.post("/extract", files={"file": (f"paper{i}.pdf", pdf, "application/pdf")})
+        r.raise_for_status()
+
+    await asyncio.gather(*(one(i, pdf) for i, pdf in enumerate(pdfs)))
+
+
+def report(label, latencies):
+    print(f"{label:<24} n={len(latencies):<5} p50={percentile(latencies, 50) * 1000:8.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:8.1f}ms max={max(latencies) * 1000:8.1f}ms")
+
+
+async def main(args):
+    install_fake_model(args.latency)
+    import main as backend
+
+    # Distinct PDFs so the extraction cache cannot short-circuit the load.
+    pdfs = [make_pdf(args.pages, seed=i) for i in range(args.extracts)]
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        report("/solve idle", await solve_loop(client, args.solves, args.concurrency))
+
+        extract_task = asyncio.create_task(extract_loop(client, pdfs))
+        start = time.perf_counter()
+        latencies = await solve_loop(client, args.solves, args.concurrency)
+        report("/solve during /extract", latencies)
+        await extract_task
+        print(f"{args.extracts} x {args.pages}-page /extract finished in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--solves", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--extracts", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake Gemini latency in seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+"""Microbenchmarks for the CPU-bound pieces of /extract.
+
+Times page rendering (raster vs JPEG encode, scanned and born-digital pages),
+bbox cropping, and JSON repair/streaming on the recorded extraction replies,
+in-process and without the executor, so regressions show up as plain numbers.
+
+    python bench/micro.py --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from common import make_pdf, make_text_pdf
+
+from jsonstream import JsonArrayStream, loads_lenient, repair_latex_escapes
+from render import crop_questions, render_page_jpeg, render_page_jpeg_timed
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings.json")
+
+
+def bench(label: str, fn, repeat: int, number: int = 1):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    median = statistics.median(samples)
+    unit, scale = ("ms", 1e3) if median >= 1e-3 else ("us", 1e6)
+    print(f"{label:<44} {median * scale:10.2f} {unit}  (min {min(samples) * scale:.2f})")
+
+
+def main(args):
+    scanned = make_pdf(1)
+    digital = make_text_pdf(1)
+
+    for name, pdf in (("scanned", scanned), ("digital", digital)):
+        bench(f"render_page_jpeg {name} scale=2", lambda: render_page_jpeg(pdf, 0), args.repeat)
+        splits = [render_page_jpeg_timed(pdf, 0)[1:] for _ in range(args.repeat)]
+        print(f"{'  raster / encode':<44} {statistics.median(s[0] for s in splits) * 1e3:10.2f} ms"
+              f" / {statistics.median(s[1] for s in splits) * 1e3:.2f} ms")
+
+    page = render_page_jpeg(scanned, 0)
+    questions = [
+        {"hasImage": True, "page_number": 1, "visual_bbox": [100 + i * 200, 100, 250 + i * 200, 900]}
+        for i in range(4)
+    ]
+    bench("crop_questions 4 bboxes on one page", lambda: crop_questions({0: page}, [dict(q) for q in questions]), args.repeat)
+
+    with open(RECORDINGS, encoding="utf-8") as f:
+        replies = next(r for r in json.load(f) if r["match"] == "exam digitizer")["responses"]
+    bodies = [r.split("```json")[1].split("```")[0] if "```json" in r else r for r in replies]
+    broken = next(b for b in bodies if repair_latex_escapes(b) != b)
+    # A realistic full paper: the broken reply's questions repeated to ~50 entries.
+    items = broken.strip()[1:-1]
+    paper = "[" + ", ".join([items] * 25) + "]"
+
+    bench("loads_lenient clean reply", lambda: loads_lenient(bodies[0]), args.repeat, 1000)
+    bench("loads_lenient LaTeX-broken reply", lambda: loads_lenient(broken), args.repeat, 1000)
+    bench("repair_latex_escapes 50-question paper", lambda: repair_latex_escapes(paper), args.repeat, 100)
+
+    def stream_paper():
+        parser = JsonArrayStream()
+        for i in range(0, len(paper), 64):
+            parser.feed(paper[i:i + 64])
+
+    bench("JsonArrayStream 50-question paper / 64B chunks", stream_paper, args.repeat, 10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,193 @@
+"""Page preprocessing: what the model is sent, and what it makes of it.
+
+Renders sample papers the way /extract does under three settings, each in a
+fresh subprocess: "current" (PREPROCESS=0, whole pages at scale 2 in colour),
+"gray" (the default preprocessing) and "bilevel" (PREPROCESS_TEXT_MODE=
+bilevel). Reports image bytes, pixels, estimated Gemini image tokens and
+preprocessing time per paper. The samples are synthetic scans and a
+born-digital paper; pass --pdf to add real ones.
+
+With --live (and a real GOOGLE_API_KEY) every paper is also extracted by
+Gemini under each setting, reporting latency and how well the questions
+agree with the "current" ones: matched questions (same number, word-pair
+Jaccard >= 0.8) over the average question count.
+
+    python bench/preprocess_bench.py
+    python bench/preprocess_bench.py --pdf papers/*.pdf --live
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import make_pdf, make_text_pdf
+
+VARIANTS = {
+    "current": {"PREPROCESS": "0"},
+    "gray": {"PREPROCESS": "1", "PREPROCESS_TEXT_MODE": "gray"},
+    "bilevel": {"PREPROCESS": "1", "PREPROCESS_TEXT_MODE": "bilevel"},
+}
+
+
+def make_scan(pages: int, seed: int = 0, figure: str = "") -> bytes:
+    """A scanned-looking paper: off-white 150 dpi pages of numbered questions,
+    with a colour or a shaded figure on the first page if asked."""
+    import PIL.Image
+    import PIL.ImageDraw
+    import PIL.ImageFont
+
+    font = PIL.ImageFont.load_default(size=22)
+    rng = random.Random(seed)
+    images = []
+    for p in range(pages):
+        img = PIL.Image.new("RGB", (1240, 1754), (248, 247, 243))
+        draw = PIL.ImageDraw.Draw(img)
+        for line in range(34):
+            text = f"{p * 34 + line + 1}. " + "Explain the working of a full adder with a truth table and a diagram. "[:rng.randint(25, 70)]
+            draw.text((150, 160 + line * 38), text, fill=(25, 25, 25), font=font)
+        if p == 0 and figure == "colour":
+            draw.rectangle((300, 1000, 600, 1300), fill=(40, 90, 200))
+            draw.ellipse((700, 1000, 1000, 1300), outline=(200, 30, 30), width=6)
+        if p == 0 and figure == "shaded":
+            for x in range(300, 900):
+                draw.line((x, 1100, x, 1500), fill=(int(80 + 100 * (x - 300) / 600),) * 3)
+        images.append(img)
+    buffered = io.BytesIO()
+    images[0].save(buffered, "PDF", resolution=150, save_all=True, append_images=images[1:])
+    return buffered.getvalue()
+
+
+def image_tokens(width: int, height: int) -> int:
+    # Gemini counts 258 tokens for an image up to 384x384, otherwise 258 per
+    # 768x768 tile it is cut into.
+    if width <= 384 and height <= 384:
+        return 258
+    return math.ceil(width / 768) * math.ceil(height / 768) * 258
+
+
+def run_case(paths, live: bool):
+    import PIL.Image
+    import executor
+    from pipeline import prepare_pdf_pages
+
+    async def warm():
+        await asyncio.gather(*(executor.run_cpu(time.sleep, 0.2) for _ in range(executor.CPU_WORKERS)))
+
+    async def measure(pdf: bytes) -> dict:
+        started = time.perf_counter()
+        pages, plans = await prepare_pdf_pages(pdf, 50)
+        result = {"prep_s": time.perf_counter() - started, "pages": len(pages), "bytes": 0, "pixels": 0, "tokens": 0,
+                  "modes": "".join(plan.get("mode", "C")[0] for plan in plans)}
+        for page in pages:
+            with PIL.Image.open(io.BytesIO(page)) as img:
+                result["bytes"] += len(page)
+                result["pixels"] += img.width * img.height
+                result["tokens"] += image_tokens(img.width, img.height)
+        if live:
+            import main as backend
+            started = time.perf_counter()
+            questions = await backend.extract_paper(pdf)
+            result["extract_s"] = time.perf_counter() - started
+            result["questions"] = [{"number": str(q.get("number")), "content": q.get("content", "")} for q in questions]
+        return result
+
+    async def run():
+        await warm()
+        out = []
+        for path in paths:
+            with open(path, "rb") as f:
+                out.append(await measure(f.read()))
+        return out
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def agreement(reference: list, candidate: list) -> float:
+    from similar import shingles
+
+    if not reference and not candidate:
+        return 1.0
+    unmatched = [(q["number"], shingles(q["content"])) for q in candidate]
+    matched = 0
+    for q in reference:
+        words = shingles(q["content"])
+        for i, (number, other) in enumerate(unmatched):
+            union = words | other
+            if number == q["number"] and union and len(words & other) / len(union) >= 0.8:
+                matched += 1
+                del unmatched[i]
+                break
+    return matched / ((len(reference) + len(candidate)) / 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", nargs="*", default=[], help="extra papers to include")
+    parser.add_argument("--pages", type=int, default=4, help="pages per synthetic paper")
+    parser.add_argument("--live", action="store_true", help="also extract with Gemini (needs GOOGLE_API_KEY)")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.paths, args.live)
+        return
+
+    workdir = tempfile.mkdtemp()
+    samples = {
+        "scan": make_scan(args.pages, 0),
+        "scan+colour": make_scan(args.pages, 1, "colour"),
+        "scan+shaded": make_scan(args.pages, 2, "shaded"),
+        "tiny-font scan": make_pdf(args.pages),
+        "born-digital": make_text_pdf(args.pages),
+    }
+    paths, names = [], []
+    for name, data in samples.items():
+        path = os.path.join(workdir, f"{len(paths)}.pdf")
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+        names.append(name)
+    for path in args.pdf:
+        paths.append(os.path.abspath(path))
+        names.append(os.path.basename(path))
+
+    results = {}
+    for variant, env in VARIANTS.items():
+        cmd = [sys.executable, os.path.abspath(__file__), "--case", variant, "--paths", *paths]
+        if args.live:
+            cmd.append("--live")
+        out = subprocess.run(cmd, env={**os.environ, **env}, capture_output=True, text=True, check=True)
+        results[variant] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    header = f"{'paper':<16}{'setting':<9}{'modes':>7}{'KB':>8}{'MP':>7}{'tokens':>8}{'prep ms':>9}"
+    if args.live:
+        header += f"{'extract s':>11}{'questions':>11}{'agree':>7}"
+    print(header)
+    totals = {variant: [0, 0, 0] for variant in VARIANTS}
+    for i, name in enumerate(names):
+        for variant in VARIANTS:
+            r = results[variant][i]
+            totals[variant][0] += r["bytes"]
+            totals[variant][1] += r["pixels"]
+            totals[variant][2] += r["tokens"]
+            line = (f"{name[:15]:<16}{variant:<9}{r['modes'][:6]:>7}{r['bytes'] / 1024:>8.0f}{r['pixels'] / 1e6:>7.2f}"
+                    f"{r['tokens']:>8}{r['prep_s'] * 1e3:>9.0f}")
+            if args.live:
+                agree = agreement(results["current"][i]["questions"], r["questions"])
+                line += f"{r['extract_s']:>11.1f}{len(r['questions']):>11}{agree:>7.2f}"
+            print(line)
+    base = totals["current"]
+    for variant, (size, pixels, tokens) in totals.items():
+        print(f"{variant:<9} bytes {size / base[0]:>6.1%}  pixels {pixels / base[1]:>6.1%}  tokens {tokens / base[2]:>6.1%} of current")
+
+
+if __name__ == "__main__":
+    main()
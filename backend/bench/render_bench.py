@@ -0,0 +1,111 @@
+"""Benchmark: /extract page rendering, legacy /tmp JPEG path vs in-memory pipeline.
+
+Each (path, pages) case runs in a fresh subprocess so peak RSS is not
+polluted by earlier cases. The "legacy" case reproduces the original
+sequential render -> /tmp JPEG -> PIL.Image.open flow (all pages held open);
+"pipeline" uses render_pdf_in_memory plus crop_questions.
+
+    python bench/render_bench.py --pages 1 5 10
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from common import make_pdf
+
+BBOX_QUESTION = {"hasImage": True, "page_number": 1, "visual_bbox": [700, 200, 950, 750]}
+
+
+def legacy(pdf_bytes: bytes):
+    start = time.perf_counter()
+    import PIL.Image
+    import pypdfium2 as pdfium
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir="/tmp") as tmp_pdf:
+        tmp_pdf.write(pdf_bytes)
+        tmp_pdf_path = tmp_pdf.name
+    image_paths = []
+    try:
+        pdf = pdfium.PdfDocument(tmp_pdf_path)
+        for i in range(min(len(pdf), 10)):
+            pil_image = pdf[i].render(scale=2).to_pil()
+            tmp_img_path = f"/tmp/page_{uuid.uuid4()}_{i}.jpg"
+            pil_image.save(tmp_img_path, "JPEG")
+            image_paths.append(tmp_img_path)
+        pil_images = [PIL.Image.open(p) for p in image_paths]
+        for img in pil_images:
+            img.load()
+        target = pil_images[0]
+        width, height = target.size
+        ymin, xmin, ymax, xmax = BBOX_QUESTION["visual_bbox"]
+        target.crop((xmin * width / 1000, ymin * height / 1000, xmax * width / 1000, ymax * height / 1000)).save(io.BytesIO(), format="JPEG")
+    finally:
+        os.remove(tmp_pdf_path)
+        for p in image_paths:
+            os.remove(p)
+    return time.perf_counter() - start
+
+
+def pipeline(pdf_bytes: bytes):
+    import executor
+    from pipeline import render_pdf_in_memory
+    from render import crop_questions
+
+    async def run():
+        pages = await render_pdf_in_memory(pdf_bytes, 10)
+        await executor.run_cpu(crop_questions, {0: pages[0]}, [dict(BBOX_QUESTION)])
+
+    async def warm():
+        # Start every worker up front; a long-running server pays this once.
+        await asyncio.gather(*(executor.run_cpu(time.sleep, 0.2) for _ in range(executor.CPU_WORKERS)))
+
+    asyncio.run(warm())
+    start = time.perf_counter()
+    asyncio.run(run())
+    wall = time.perf_counter() - start
+    # Join the workers so their peak RSS shows up under RUSAGE_CHILDREN.
+    executor._cpu_pool.shutdown(wait=True)
+    return wall
+
+
+def run_case(path: str, pages: int):
+    pdf_bytes = make_pdf(pages)
+    wall = {"legacy": legacy, "pipeline": pipeline}[path](pdf_bytes)
+    print(json.dumps({
+        "wall_s": wall,
+        "main_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "worker_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--case", nargs=2, metavar=("PATH", "PAGES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.case[0], int(args.case[1]))
+        return
+
+    print(f"{'pages':>5} {'path':<9} {'wall':>8} {'main RSS':>10} {'worker RSS':>11}")
+    for pages in args.pages:
+        for path in ("legacy", "pipeline"):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--case", path, str(pages)],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            r = json.loads(out)
+            print(f"{pages:>5} {path:<9} {r['wall_s']:>7.2f}s {r['main_rss_mb']:>8.0f}MB {r['worker_rss_mb']:>9.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
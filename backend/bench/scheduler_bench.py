@@ -0,0 +1,70 @@
+"""Drive the LLM scheduler against the fake model with injected 429s/503s.
+
+Runs a flood of bulk calls with a trickle of interactive calls on top and
+reports per-lane latency, how the concurrency limit moved, and how many
+calls were retried or failed.
+
+    python bench/scheduler_bench.py --bulk 200 --interactive 20 --quota-rate 0.1
+"""
+import argparse
+import asyncio
+import time
+
+from common import FakeModel, install_fake_model, percentile
+
+
+async def main(args):
+    install_fake_model(args.latency)
+    FakeModel.jitter = args.latency / 2
+    FakeModel.quota_rate = args.quota_rate
+    FakeModel.error_rate = args.error_rate
+
+    import scheduler
+    scheduler.LLM_BACKOFF_BASE = args.backoff
+    llm = scheduler.Scheduler("fake")
+    latencies = {scheduler.INTERACTIVE: [], scheduler.BULK: []}
+    failures = {scheduler.INTERACTIVE: 0, scheduler.BULK: 0}
+    limits = []
+
+    async def call(priority: int, delay: float):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        try:
+            await llm.generate(["benchmark prompt"], priority)
+            latencies[priority].append(time.perf_counter() - start)
+        except Exception:
+            failures[priority] += 1
+
+    async def sample():
+        while True:
+            limits.append(llm.limit)
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.create_task(sample())
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(call(scheduler.BULK, 0) for _ in range(args.bulk)),
+        *(call(scheduler.INTERACTIVE, i * args.latency) for i in range(args.interactive)),
+    )
+    wall = time.perf_counter() - start
+    sampler.cancel()
+
+    for priority, name in scheduler.LANES.items():
+        samples = latencies[priority]
+        print(
+            f"{name:12s} ok={len(samples):4d} failed={failures[priority]:3d} "
+            f"p50={percentile(samples, 50) * 1000:7.0f}ms p99={percentile(samples, 99) * 1000:7.0f}ms"
+        )
+    print(f"wall {wall:.2f}s, model calls {FakeModel.calls}, limit min/max {min(limits):.1f}/{max(limits):.1f}")
+    print(llm.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bulk", type=int, default=200)
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--quota-rate", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--backoff", type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
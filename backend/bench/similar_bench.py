@@ -0,0 +1,90 @@
+"""Near-duplicate index at scale: insert throughput and lookup latency.
+
+Fills a fresh index with synthetic exam questions (templated wording,
+LaTeX and random values, so buckets are realistically crowded), then times
+lookups of lightly edited copies and checks they find their originals.
+
+    python bench/similar_bench.py --questions 200000 --lookups 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from common import percentile
+
+from similar import SimilarIndex, shingles, signature
+
+SUBJECTS = ["entropy", "the Laplace transform", "a binary search tree", "Kirchhoff's laws", "the Fourier series",
+            "deadlock", "a finite automaton", "the Bernoulli equation", "TCP congestion control", "eigenvalues"]
+TEMPLATES = [
+    "Define {s} and explain its significance with an example.",
+    "Evaluate $\\int_{{0}}^{{{a}}} x^{{{b}}} \\, dx$ and relate the result to {s}.",
+    "Find the eigenvalues of $\\begin{{bmatrix}} {a} & {b} \\\\ {c} & {a} \\end{{bmatrix}}$ in the context of {s}.",
+    "With a neat diagram, describe {s}. What happens when the input is {a}?",
+    "Prove that $\\sum_{{k=1}}^{{{a}}} k^{{{b}}}$ is bounded and discuss {s} for n = {c}.",
+    "Compare {s} with its alternatives for a system of {a} nodes and {b} links.",
+]
+EDITS = [
+    lambda t: t.replace("explain", "discuss"),
+    lambda t: t.replace(" and ", " & ", 1),
+    lambda t: "Q3. " + t,
+    lambda t: t.replace("$", "$\\displaystyle ", 1),
+    lambda t: t + " (10 marks)",
+]
+
+
+# Topic words, so questions from the same template differ the way real ones do.
+_letters = random.Random(0)
+VOCABULARY = ["".join(_letters.choice("bcdfghklmnprstvz") + _letters.choice("aeiou") for _ in range(3)) for _ in range(3000)]
+
+
+def question(rng: random.Random) -> str:
+    topic = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randrange(4, 10)))
+    return rng.choice(TEMPLATES).format(
+        s=rng.choice(SUBJECTS), a=rng.randrange(2, 999), b=rng.randrange(2, 99), c=rng.randrange(2, 999)
+    ) + f" Consider {topic}."
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    path = os.path.join(tempfile.mkdtemp(), "similar.sqlite3")
+    index = SimilarIndex(path)
+
+    originals = []
+    start = time.perf_counter()
+    for paper in range(0, args.questions, args.paper_size):
+        batch = [{"content": question(rng)} for _ in range(min(args.paper_size, args.questions - paper))]
+        index.add_paper(batch, source=f"paper-{paper}")
+        originals.extend(q for q in batch if rng.random() < args.lookups / args.questions)
+    elapsed = time.perf_counter() - start
+    print(f"indexed {args.questions} questions in {elapsed:.1f}s ({args.questions / elapsed:.0f}/s), "
+          f"{os.path.getsize(path) / 2 ** 20:.1f} MB")
+
+    sig_times, lookup_times, found = [], [], 0
+    for q in originals:
+        edited = rng.choice(EDITS)(q["content"])
+        t0 = time.perf_counter()
+        signature(shingles(edited))
+        t1 = time.perf_counter()
+        matches = index.query(edited)
+        t2 = time.perf_counter()
+        sig_times.append(t1 - t0)
+        lookup_times.append(t2 - t0)
+        found += any(m["id"] == q["index_id"] for m in matches)
+
+    print(f"{len(originals)} lookups of edited questions, recall {found / max(len(originals), 1):.3f}")
+    print(f"  signature  p50 {statistics.median(sig_times) * 1e3:.3f} ms")
+    print(f"  lookup     p50 {percentile(lookup_times, 50) * 1e3:.3f} ms  "
+          f"p95 {percentile(lookup_times, 95) * 1e3:.3f} ms  p99 {percentile(lookup_times, 99) * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--paper-size", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,149 @@
+"""Offline load suite: every LLM-backed endpoint at increasing concurrency.
+
+Gemini is replaced by the recorded-response fake (bench/recordings.json),
+including fenced and LaTeX-broken JSON the parsers have to repair, with the
+recorded latencies scaled by --time-scale. Every request carries unique
+content so the caches and single-flight never short-circuit the work.
+
+    python bench/suite.py --levels 1 4 16 --requests 32 --time-scale 0.05
+    python bench/suite.py --endpoints solve extract --json results.json
+
+Reports throughput, p50/p95/p99 latency, peak RSS (server process plus pool
+workers) and peak temp-file bytes per endpoint and concurrency level.
+Forks go through template style compilation and the local renderer; set
+FORK_COMPILE_TEMPLATES=0 to measure the LLM cloning step instead.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+
+from common import FakeModel, ResourceSampler, install_fake_model, make_pdf, make_text_pdf, percentile
+
+import httpx
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings.json")
+_unique = itertools.count()
+
+
+def unique_pdf(base: bytes) -> bytes:
+    # Trailing comments after %%EOF are ignored by pdfium but change the hash.
+    return base + b"\n%%bench-%d\n" % next(_unique)
+
+
+def build_scenarios(pages: int):
+    scanned = make_pdf(pages)
+    scanned_page = make_pdf(1, seed=1)
+    digital = make_text_pdf(2)
+    alternate = itertools.cycle([digital, scanned_page])
+
+    async def extract(client):
+        files = {"file": ("paper.pdf", unique_pdf(scanned), "application/pdf")}
+        return await client.post("/extract", files=files)
+
+    async def extract_pdf_text(client):
+        # Alternate born-digital (text layer) and scanned (OCR) resumes.
+        files = {"file": ("resume.pdf", unique_pdf(next(alternate)), "application/pdf")}
+        return await client.post("/extract-pdf-text", files=files)
+
+    async def solve(client):
+        return await client.post("/solve", json={"content": f"Evaluate the integral of x^2 from 0 to {next(_unique)}."})
+
+    async def fork_template(client):
+        n = next(_unique)
+        return await client.post("/fork-template", json={
+            "template_text": f"TEMPLATE {n}\nEXPERIENCE\n- Led a team of 4 engineers",
+            "child_text": f"Jane Doe {n}\nEXPERIENCE\n- Built things",
+        })
+
+    async def resume_diff(client):
+        files = {
+            "resume1_file": ("a.pdf", unique_pdf(digital), "application/pdf"),
+            "resume2_file": ("b.pdf", unique_pdf(digital), "application/pdf"),
+        }
+        return await client.post("/resume-diff", files=files)
+
+    return {
+        "extract": extract,
+        "extract-pdf-text": extract_pdf_text,
+        "solve": solve,
+        "fork-template": fork_template,
+        "resume-diff": resume_diff,
+    }
+
+
+async def run_level(client, scenario, concurrency: int, n: int) -> dict:
+    latencies, errors = [], 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with slots:
+            start = time.perf_counter()
+            try:
+                response = await scenario(client)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    with ResourceSampler() as sampler:
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(n)))
+        wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": n,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": round(sampler.peak_rss / 2 ** 20, 1),
+        "peak_temp_mb": round(sampler.peak_temp / 2 ** 20, 2),
+    }
+
+
+async def main(args):
+    install_fake_model()
+    FakeModel.load_recordings(args.recordings)
+    FakeModel.time_scale = args.time_scale
+    import main as backend
+
+    scenarios = build_scenarios(args.pages)
+    results = {}
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await scenarios["extract"](client)  # start the process pool outside the measurements
+        print(f"{'endpoint':<18}{'conc':>5}{'ok':>6}{'err':>5}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'rss MB':>8}{'tmp MB':>8}")
+        for name in args.endpoints:
+            results[name] = []
+            for level in args.levels:
+                row = await run_level(client, scenarios[name], level, max(args.requests, level))
+                results[name].append(row)
+                print(
+                    f"{name:<18}{level:>5}{row['requests'] - row['errors']:>6}{row['errors']:>5}"
+                    f"{row['throughput_rps']:>8}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+                    f"{row['peak_rss_mb']:>8}{row['peak_temp_mb']:>8}"
+                )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoints", nargs="+", default=["extract", "extract-pdf-text", "solve", "fork-template", "resume-diff"])
+    parser.add_argument("--levels", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per level (at least the concurrency)")
+    parser.add_argument("--pages", type=int, default=3, help="pages per synthetic exam paper")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="multiplier on recorded Gemini latencies")
+    parser.add_argument("--recordings", default=RECORDINGS)
+    parser.add_argument("--json", help="also write results to this file")
+    asyncio.run(main(parser.parse_args()))
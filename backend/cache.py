@@ -0,0 +1,169 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+# How often expired rows are swept and the byte total is re-read from the
+# table (other processes write to the same file).
+SWEEP_SECONDS = 60
+EVICT_BATCH = 64
+
+
+class DiskCache:
+    """SQLite-backed key/value store with TTLs and size-bounded LRU eviction.
+
+    Keys are namespaced as ``"<namespace>:<rest>"``; hit/miss counters are kept
+    per namespace so each endpoint's cache can be reported separately.
+    Values must be JSON-serialisable. Pinned entries never expire and are
+    never evicted.
+
+    The total size is kept as a running count, so ``set`` does not scan the
+    table; eviction removes the least recently used entries a batch at a time.
+    """
+
+    def __init__(self, path: str, max_bytes: int, default_ttl: Optional[float] = None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                expires REAL,
+                accessed REAL NOT NULL,
+                pinned INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}
+        if "pinned" not in columns:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries(expires)")
+        self._hits = {}
+        self._misses = {}
+        self._bytes = self._total()
+        self._swept = time.time()
+
+    def _total(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _size_of(self, key: str) -> int:
+        row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(":", 1)[0]
+
+    def _count(self, counter: dict, key: str):
+        ns = self._namespace(key)
+        counter[ns] = counter.get(ns, 0) + 1
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires, pinned, size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (not row[2] and row[1] is not None and row[1] < now):
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._bytes -= row[3]
+                self._count(self._misses, key)
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._count(self._hits, key)
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        blob = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = now + ttl if ttl else None
+        with self._lock:
+            previous = self._size_of(key)
+            self._conn.execute(
+                "INSERT INTO entries (key, value, size, created, expires, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "created = excluded.created, expires = excluded.expires, accessed = excluded.accessed",
+                (key, blob, len(blob), now, expires, now),
+            )
+            self._bytes += len(blob) - previous
+            self._evict(now)
+
+    def pin(self, key: str, pinned: bool = True) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE entries SET pinned = ? WHERE key = ?", (1 if pinned else 0, key)
+            )
+            return cur.rowcount > 0
+
+    def delete(self, key: str):
+        with self._lock:
+            self._bytes -= self._size_of(key)
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, now: float):
+        if now - self._swept >= SWEEP_SECONDS:
+            self._conn.execute(
+                "DELETE FROM entries WHERE pinned = 0 AND expires IS NOT NULL AND expires < ?", (now,)
+            )
+            self._bytes = self._total()
+            self._swept = now
+        while self._bytes > self.max_bytes:
+            batch = self._conn.execute(
+                "SELECT key, size FROM entries WHERE pinned = 0 ORDER BY accessed ASC LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            if not batch:
+                break
+            for key, size in batch:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._bytes -= size
+                if self._bytes <= self.max_bytes:
+                    break
+
+    def purge(self, namespace: Optional[str] = None) -> int:
+        with self._lock:
+            if namespace:
+                cur = self._conn.execute(
+                    "DELETE FROM entries WHERE key LIKE ? ESCAPE '\\'",
+                    (namespace.replace("%", "\\%").replace("_", "\\_") + ":%",),
+                )
+            else:
+                cur = self._conn.execute("DELETE FROM entries")
+            self._bytes = self._total()
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, size, pinned FROM entries"
+            ).fetchall()
+        namespaces = {}
+        for key, size, pinned in rows:
+            ns = namespaces.setdefault(self._namespace(key), {"entries": 0, "bytes": 0, "pinned": 0})
+            ns["entries"] += 1
+            ns["bytes"] += size
+            ns["pinned"] += pinned
+        for ns in set(self._hits) | set(self._misses):
+            namespaces.setdefault(ns, {"entries": 0, "bytes": 0, "pinned": 0})
+        for ns, info in namespaces.items():
+            info["hits"] = self._hits.get(ns, 0)
+            info["misses"] = self._misses.get(ns, 0)
+        return {
+            "max_bytes": self.max_bytes,
+            "bytes": sum(info["bytes"] for info in namespaces.values()),
+            "namespaces": namespaces,
+        }
@@ -0,0 +1,83 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+# Blocking work must never run on the event loop: one slow render or download
+# would stall every other request on the worker. I/O-bound calls (downloads,
+# file reads) go to a thread pool; CPU-bound pdfium/PIL work goes to a process
+# pool so it neither holds the GIL nor shares pdfium (which is not thread-safe).
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_io_pool: Executor = None
+_cpu_pool: Executor = None
+_loop_locals = weakref.WeakKeyDictionary()
+
+
+def loop_local(name: str, factory):
+    """One instance of ``factory()`` per running event loop.
+
+    asyncio primitives bind to the loop that first uses them, so module-level
+    semaphores break as soon as a second loop (tests, a restarted worker)
+    touches them.
+    """
+    per_loop = _loop_locals.setdefault(asyncio.get_running_loop(), {})
+    if name not in per_loop:
+        per_loop[name] = factory()
+    return per_loop[name]
+
+
+def _get_io_pool() -> Executor:
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    return _io_pool
+
+
+def _get_cpu_pool() -> Executor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        try:
+            if CPU_WORKERS < 1:
+                raise NotImplementedError("process pool disabled")
+            # spawn, not fork: the parent already runs gRPC threads for Gemini.
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        except (OSError, NotImplementedError) as e:
+            # Some serverless sandboxes have no /dev/shm for process pools.
+            # A single thread keeps pdfium calls serialised.
+            print(f"Process pool unavailable ({e}); rendering on a single thread")
+            _cpu_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cpu")
+    return _cpu_pool
+
+
+async def _run(pool: Executor, slots: asyncio.Semaphore, fn, *args, **kwargs):
+    # The semaphore bounds how much work (and pickled input) can queue up
+    # behind the pool, so a burst of uploads applies backpressure instead.
+    async with slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    slots = loop_local("io", lambda: asyncio.Semaphore(IO_WORKERS * 2))
+    # Threads see the caller's context variables (the request trace among them).
+    return await _run(_get_io_pool(), slots, contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    slots = loop_local("cpu", lambda: asyncio.Semaphore(max(CPU_WORKERS, 1) * 2))
+    return await _run(_get_cpu_pool(), slots, fn, *args, **kwargs)
+
+
+def shutdown():
+    global _io_pool, _cpu_pool
+    for pool in (_io_pool, _cpu_pool):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    _io_pool = _cpu_pool = None
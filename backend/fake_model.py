@@ -0,0 +1,114 @@
+import asyncio
+import json
+import math
+import os
+import random
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+# Offline stand-in for genai.GenerativeModel, used by the benchmarks and
+# enabled for the whole app with FAKE_LLM=1. Latency and failure rates are
+# configurable so the scheduler's retry and backoff paths can be exercised
+# without a network or an API quota.
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_QUOTA_RATE = float(os.getenv("FAKE_LLM_QUOTA_RATE", "0"))
+# Optional JSON file of recorded replies; see bench/recordings.json.
+FAKE_LLM_RECORDINGS = os.getenv("FAKE_LLM_RECORDINGS", "")
+
+EXTRACT_REPLY = '[{"number": "1", "type": "text", "content": "Define entropy.", "marks": 2, "isMath": false, "hasImage": false}]'
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Sleeps instead of calling the API and answers with canned replies.
+
+    With ``recordings`` loaded, the first recording whose ``match`` string
+    occurs in the prompt supplies both the reply (one of its ``responses``,
+    picked at random) and a log-normal latency around its ``median_seconds``,
+    multiplied by ``time_scale``. Otherwise every call takes ``latency`` +/-
+    ``jitter`` seconds. ``error_rate`` raises a 503 and ``quota_rate`` a 429,
+    each checked independently per call.
+    """
+
+    latency = FAKE_LLM_LATENCY
+    jitter = FAKE_LLM_JITTER
+    error_rate = FAKE_LLM_ERROR_RATE
+    quota_rate = FAKE_LLM_QUOTA_RATE
+    recordings = []
+    time_scale = 1.0
+    calls = 0
+
+    def __init__(self, model_name: str, *args, **kwargs):
+        self.model_name = model_name
+
+    @classmethod
+    def load_recordings(cls, path: str):
+        with open(path, encoding="utf-8") as f:
+            cls.recordings = json.load(f)
+
+    def _recording(self, parts):
+        prompt = parts[0] if parts and isinstance(parts[0], str) else ""
+        for recording in self.recordings:
+            if recording["match"] in prompt:
+                return recording
+        return None
+
+    def _reply(self, parts) -> FakeResponse:
+        recording = self._recording(parts)
+        if recording is not None:
+            return FakeResponse(random.choice(recording["responses"]))
+        prompt = parts[0] if parts and isinstance(parts[0], str) else ""
+        if "exam digitizer" in prompt:
+            return FakeResponse(EXTRACT_REPLY)
+        return FakeResponse("<p>ok</p>")
+
+    def _delay(self, parts) -> float:
+        recording = self._recording(parts)
+        if recording is not None:
+            median = recording["median_seconds"]
+            return random.lognormvariate(math.log(median), recording.get("sigma", 0.3)) * self.time_scale
+        return max(self.latency + random.uniform(-self.jitter, self.jitter), 0.0)
+
+    def _fail(self):
+        type(self).calls += 1
+        if random.random() < self.quota_rate:
+            raise google_exceptions.ResourceExhausted("Fake quota exceeded")
+        if random.random() < self.error_rate:
+            raise google_exceptions.ServiceUnavailable("Fake model unavailable")
+
+    def generate_content(self, parts, **kwargs):
+        time.sleep(self._delay(parts))
+        self._fail()
+        return self._reply(parts)
+
+    async def generate_content_async(self, parts, stream: bool = False, **kwargs):
+        await asyncio.sleep(self._delay(parts))
+        self._fail()
+        response = self._reply(parts)
+        if stream:
+            return _FakeStream(response.text)
+        return response
+
+
+class _FakeStream:
+    def __init__(self, text: str, chunk_size: int = 64):
+        self._chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(0)
+            yield FakeResponse(chunk)
+
+
+if FAKE_LLM_RECORDINGS:
+    FakeModel.load_recordings(FAKE_LLM_RECORDINGS)
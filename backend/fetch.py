@@ -0,0 +1,238 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from cache import EVICT_BATCH, SWEEP_SECONDS
+from executor import loop_local, run_io
+from tracing import span
+from uploads import SpooledPdf, UploadedPdf
+
+# Resume PDFs and question images mostly come from the same Supabase storage
+# host, so downloads share one keep-alive connection pool per event loop.
+FETCH_CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "5"))
+FETCH_READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", "30"))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "32"))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_MB", "25")) * 1024 * 1024
+# Bodies up to this size stay in memory while downloading; larger ones spill to
+# a temp file that is handed on as is (render workers open it by path).
+FETCH_SPOOL_BYTES = int(os.getenv("FETCH_SPOOL_MB", "4")) * 1024 * 1024
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_MB", "64")) * 1024 * 1024
+FETCH_CACHE_MAX_OBJECT = int(os.getenv("FETCH_CACHE_MAX_OBJECT_MB", "8")) * 1024 * 1024
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class FetchError(HTTPException):
+    pass
+
+
+class FetchCache:
+    """Small SQLite store of downloaded bodies plus their validators.
+
+    Entries are revalidated with If-None-Match / If-Modified-Since once the
+    origin's max-age has passed. As in DiskCache, the total size is a
+    running count and eviction removes the least recently used bodies a
+    batch at a time.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS objects (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                fresh_until REAL NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS objects_accessed ON objects(accessed)")
+        self._bytes = self._total()
+        self._synced = time.time()
+
+    def _total(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def get(self, url: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, fresh_until, body FROM objects WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE objects SET accessed = ? WHERE url = ?", (time.time(), url))
+        return {"etag": row[0], "last_modified": row[1], "fresh_until": row[2], "body": bytes(row[3])}
+
+    def set(self, url: str, etag: Optional[str], last_modified: Optional[str], fresh_until: float, body: bytes):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM objects WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO objects (url, etag, last_modified, fresh_until, body, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, fresh_until, body, len(body), now),
+            )
+            self._bytes += len(body) - (row[0] if row else 0)
+            self._evict(now)
+
+    def _evict(self, now: float):
+        if now - self._synced >= SWEEP_SECONDS:
+            # Other processes write to the same file.
+            self._bytes = self._total()
+            self._synced = now
+        while self._bytes > self.max_bytes:
+            batch = self._conn.execute(
+                "SELECT url, size FROM objects ORDER BY accessed ASC LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            if not batch:
+                break
+            for old_url, size in batch:
+                self._conn.execute("DELETE FROM objects WHERE url = ?", (old_url,))
+                self._bytes -= size
+                if self._bytes <= self.max_bytes:
+                    break
+
+    def refresh(self, url: str, fresh_until: float):
+        with self._lock:
+            self._conn.execute("UPDATE objects SET fresh_until = ? WHERE url = ?", (fresh_until, url))
+
+    def purge(self) -> int:
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM objects").rowcount
+            self._bytes = 0
+            return removed
+
+
+def data_url_bytes(url: str) -> Optional[bytes]:
+    """The payload of a ``data:`` URL (base64 or percent-encoded), None for
+    any other URL. Questions store their images this way, so they must never
+    reach httpx, which only speaks http(s)."""
+    if url[:5].lower() != "data:":
+        return None
+    header, sep, payload = url[5:].partition(",")
+    if not sep:
+        raise FetchError(status_code=400, detail="Malformed data URL")
+    if header.lower().endswith(";base64"):
+        try:
+            return base64.b64decode(payload.strip(), validate=False)
+        except (binascii.Error, ValueError) as e:
+            raise FetchError(status_code=400, detail=f"Malformed data URL: {e}") from e
+    return urllib.parse.unquote_to_bytes(payload)
+
+
+def _freshness(headers: httpx.Headers) -> Tuple[bool, float]:
+    """(may store, fresh until) from the response's Cache-Control."""
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return False, 0.0
+    match = MAX_AGE.search(cache_control)
+    if match and "no-cache" not in cache_control:
+        return True, time.time() + int(match.group(1))
+    return True, 0.0
+
+
+class Fetcher:
+    def __init__(self, cache: FetchCache):
+        self.cache = cache
+        self.stats = {"requests": 0, "fresh_hits": 0, "not_modified": 0, "bytes_downloaded": 0, "spilled": 0}
+
+    def _client(self) -> httpx.AsyncClient:
+        return loop_local("http_client", lambda: httpx.AsyncClient(
+            timeout=httpx.Timeout(FETCH_READ_TIMEOUT, connect=FETCH_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=FETCH_MAX_CONNECTIONS, max_keepalive_connections=FETCH_MAX_CONNECTIONS),
+            follow_redirects=True,
+        ))
+
+    async def aclose(self):
+        await self._client().aclose()
+
+    async def fetch(self, url: str) -> Tuple[UploadedPdf, str]:
+        """Download ``url`` and return the body with its sha256: bytes, or a
+        SpooledPdf once it passes FETCH_SPOOL_BYTES. Cached bodies are served
+        when fresh or not modified."""
+        cached = await run_io(self.cache.get, url)
+        if cached is not None and cached["fresh_until"] > time.time():
+            self.stats["fresh_hits"] += 1
+            return cached["body"], hashlib.sha256(cached["body"]).hexdigest()
+
+        headers = {}
+        if cached is not None and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        elif cached is not None and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        self.stats["requests"] += 1
+        try:
+            with span("download"):
+                async with self._client().stream("GET", url, headers=headers) as response:
+                    may_store, fresh_until = _freshness(response.headers)
+                    if response.status_code == 304 and cached is not None:
+                        self.stats["not_modified"] += 1
+                        await run_io(self.cache.refresh, url, fresh_until)
+                        return cached["body"], hashlib.sha256(cached["body"]).hexdigest()
+                    if response.status_code >= 400:
+                        raise FetchError(status_code=502, detail=f"Download failed: HTTP {response.status_code} from {url}")
+                    declared = int(response.headers.get("content-length") or 0)
+                    if declared > FETCH_MAX_BYTES:
+                        raise FetchError(status_code=413, detail=f"Remote file is larger than {FETCH_MAX_BYTES // 2 ** 20} MB")
+
+                    buffer = bytearray()
+                    spool = None
+                    digest = hashlib.sha256()
+                    size = 0
+                    try:
+                        async for chunk in response.aiter_bytes():
+                            size += len(chunk)
+                            if size > FETCH_MAX_BYTES:
+                                raise FetchError(status_code=413, detail=f"Remote file is larger than {FETCH_MAX_BYTES // 2 ** 20} MB")
+                            digest.update(chunk)
+                            if spool is None and size > FETCH_SPOOL_BYTES:
+                                spool = tempfile.NamedTemporaryFile(prefix="download-")
+                                await run_io(spool.write, bytes(buffer))
+                                buffer = None
+                            if spool is None:
+                                buffer += chunk
+                            else:
+                                await run_io(spool.write, chunk)
+                        if spool is not None:
+                            await run_io(spool.flush)
+                    except BaseException:
+                        if spool is not None:
+                            spool.close()
+                        raise
+                    etag = response.headers.get("etag")
+                    last_modified = response.headers.get("last-modified")
+        except httpx.TimeoutException as e:
+            raise FetchError(status_code=504, detail=f"Download timed out: {url}") from e
+        except httpx.HTTPError as e:
+            raise FetchError(status_code=502, detail=f"Download failed: {e}") from e
+
+        self.stats["bytes_downloaded"] += size
+        if spool is not None:
+            self.stats["spilled"] += 1
+        body = bytes(buffer) if spool is None else SpooledPdf(spool, size)
+        if may_store and (etag or last_modified or fresh_until) and size <= FETCH_CACHE_MAX_OBJECT:
+            data = body if spool is None else await run_io(body.read)
+            await run_io(self.cache.set, url, etag, last_modified, fresh_until, data)
+        return body, digest.hexdigest()
+
+    async def fetch_bytes(self, url: str) -> bytes:
+        body, _ = await self.fetch(url)
+        return body if isinstance(body, bytes) else await run_io(body.read)
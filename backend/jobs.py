@@ -0,0 +1,222 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+# Long extractions run as jobs so a request timeout no longer throws the work
+# away. Jobs live in SQLite: a worker claims one by taking a lease and renews
+# it while it works; if the worker dies, the lease runs out and another worker
+# picks the job up again. Several processes can share one queue file.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "64"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(HTTPException):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail="Extraction queue is full, try again shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class JobQueue:
+    """Persistent FIFO of extraction jobs with leases.
+
+    A job is identified by its idempotency key (the extraction cache key), so
+    submitting the same PDF twice returns the job already queued or running.
+    ``claim`` hands the oldest queued job, or a running one whose lease has
+    expired, to a worker; a job that has been claimed ``max_attempts`` times
+    without finishing is failed.
+    """
+
+    def __init__(self, path: str, max_pending: int = JOB_QUEUE_MAX, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                state TEXT NOT NULL,
+                payload BLOB,
+                stages TEXT NOT NULL DEFAULT '{}',
+                result TEXT NOT NULL DEFAULT '[]',
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_until REAL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, created)")
+        self.stats = {"submitted": 0, "deduplicated": 0, "rejected": 0, "reclaimed": 0}
+
+    def _pending(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)", (QUEUED, RUNNING)
+        ).fetchone()[0]
+
+    def submit(self, key: str, payload: bytes) -> str:
+        """Queue ``payload`` under ``key`` and return the job id. A job for
+        the same key that is queued or running is reused; a finished or failed
+        one is queued again (the caller checks its result cache first)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT id, state FROM jobs WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] in (QUEUED, RUNNING):
+                    self.stats["deduplicated"] += 1
+                    self._conn.execute("COMMIT")
+                    return row[0]
+                if self._pending() >= self.max_pending:
+                    self.stats["rejected"] += 1
+                    self._conn.execute("COMMIT")
+                    raise QueueFull(retry_after=max(int(self.lease_seconds // 4), 1))
+                job_id = row[0] if row is not None else uuid.uuid4().hex
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (id, key, state, payload, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, key, QUEUED, payload, now, now),
+                )
+                self._conn.execute("DELETE FROM jobs WHERE state IN (?, ?) AND updated < ?",
+                                   (DONE, FAILED, now - JOB_RETENTION_SECONDS))
+                self._conn.execute("COMMIT")
+            except QueueFull:
+                raise
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.stats["submitted"] += 1
+        return job_id
+
+    def finished(self, key: str, result: List[dict]) -> str:
+        """Record an already-available result as a done job (cache hits).
+        A job for the key that a worker is running is left to finish."""
+        now = time.time()
+        stages = json.dumps({"cache": {"state": DONE}})
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT id, state FROM jobs WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    job_id = uuid.uuid4().hex
+                    self._conn.execute(
+                        "INSERT INTO jobs (id, key, state, stages, result, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, key, DONE, stages, json.dumps(result), now, now),
+                    )
+                elif row[1] != RUNNING:
+                    job_id = row[0]
+                    self._conn.execute(
+                        "UPDATE jobs SET state = ?, stages = ?, result = ?, error = NULL, payload = NULL, worker = NULL, "
+                        "lease_until = NULL, updated = ? WHERE id = ?",
+                        (DONE, stages, json.dumps(result), now, job_id),
+                    )
+                else:
+                    job_id = row[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim(self, worker: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, error = ?, payload = NULL, updated = ? "
+                    "WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, "Worker lost the job too many times", now, RUNNING, now, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    "SELECT id, key, state, payload, attempts FROM jobs "
+                    "WHERE state = ? OR (state = ? AND lease_until < ?) ORDER BY created LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (RUNNING, worker, now + self.lease_seconds, now, row[0]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row[2] == RUNNING:
+            self.stats["reclaimed"] += 1
+        return {"id": row[0], "key": row[1], "payload": bytes(row[3]), "attempt": row[4] + 1}
+
+    def _owned_update(self, job_id: str, worker: str, sql: str, args: tuple) -> bool:
+        # Every write checks ownership: a worker whose lease was taken over must not clobber the new owner.
+        with self._lock:
+            cur = self._conn.execute(sql + " WHERE id = ? AND worker = ? AND state = ?", (*args, job_id, worker, RUNNING))
+        return cur.rowcount == 1
+
+    def progress(self, job_id: str, worker: str, stages: dict, result: List[dict]) -> bool:
+        """Save progress and renew the lease; False if the job is no longer ours."""
+        now = time.time()
+        return self._owned_update(
+            job_id, worker, "UPDATE jobs SET stages = ?, result = ?, lease_until = ?, updated = ?",
+            (json.dumps(stages), json.dumps(result), now + self.lease_seconds, now),
+        )
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        return self._owned_update(job_id, worker, "UPDATE jobs SET lease_until = ?", (time.time() + self.lease_seconds,))
+
+    def release(self, job_id: str, worker: str) -> bool:
+        """Hand a job back without counting the attempt (graceful shutdown)."""
+        return self._owned_update(
+            job_id, worker, "UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, attempts = attempts - 1, updated = ?",
+            (QUEUED, time.time()),
+        )
+
+    def complete(self, job_id: str, worker: str, stages: dict, result: List[dict]) -> bool:
+        return self._owned_update(
+            job_id, worker, "UPDATE jobs SET state = ?, stages = ?, result = ?, payload = NULL, lease_until = NULL, updated = ?",
+            (DONE, json.dumps(stages), json.dumps(result), time.time()),
+        )
+
+    def fail(self, job_id: str, worker: str, stages: dict, error: str) -> bool:
+        return self._owned_update(
+            job_id, worker, "UPDATE jobs SET state = ?, stages = ?, error = ?, payload = NULL, lease_until = NULL, updated = ?",
+            (FAILED, json.dumps(stages), error, time.time()),
+        )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, state, stages, result, error, attempts, created, updated FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0], "state": row[1], "stages": json.loads(row[2]), "result": json.loads(row[3]),
+            "error": row[4], "attempts": row[5], "created": row[6], "updated": row[7],
+        }
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {**{QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}, **dict(rows), "max_pending": self.max_pending, **self.stats}
@@ -0,0 +1,76 @@
+import json
+import re
+from typing import List
+
+# Gemini often writes LaTeX such as "\alpha" without doubling the backslash,
+# which is an invalid JSON escape. Double any backslash that does not start a
+# valid escape sequence.
+_LONE_BACKSLASH = re.compile(r'(?<!\\)\\(?!["\\/bfnrtu])')
+
+
+def repair_latex_escapes(text: str) -> str:
+    return _LONE_BACKSLASH.sub(r'\\\\', text)
+
+
+def loads_lenient(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(repair_latex_escapes(text))
+
+
+class JsonArrayStream:
+    """Incrementally parse a streamed JSON array of objects.
+
+    Feed it text chunks as they arrive; it returns each top-level object as
+    soon as its closing brace is seen. Anything before the opening ``[``
+    (such as a ```` ```json ```` fence) is skipped, and objects are decoded
+    with the same LaTeX backslash repair as a full response.
+    """
+
+    def __init__(self):
+        self._buf = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.errors = 0
+
+    def feed(self, chunk: str) -> List[dict]:
+        objects = []
+        for ch in chunk:
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                continue
+
+            if self._depth == 0:
+                # Between elements: only an opening brace matters.
+                if ch == "{":
+                    self._depth = 1
+                    self._buf = [ch]
+                continue
+
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    text = "".join(self._buf)
+                    self._buf = []
+                    try:
+                        objects.append(loads_lenient(text))
+                    except json.JSONDecodeError as e:
+                        self.errors += 1
+                        print(f"Skipping malformed streamed object: {e}")
+        return objects
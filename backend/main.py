@@ -1,29 +1,95 @@
 import os
 import json
+import asyncio
 import uuid
-import tempfile
-import base64
-import io
-import urllib.request
 import re
-from typing import List, Optional
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import time
+import hashlib
+import functools
+import hmac
+import base64
+import urllib.parse
+from typing import List, Optional, Tuple, Union
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Depends, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import google.generativeai as genai
-import pypdfium2 as pdfium
-from dotenv import load_dotenv
-import PIL.Image
-
-load_dotenv() 
+from pydantic import BaseModel, ValidationError
+from cache import DiskCache
+from assets import AssetStore, ASSET_MAX_DIMENSION, ASSET_FORMAT, ASSET_QUALITY, ASSET_RENDER_SCALE
+from fetch import Fetcher, FetchCache, FETCH_CACHE_MAX_BYTES, data_url_bytes
+from executor import loop_local, run_io, run_cpu, shutdown as shutdown_executors
+from models import WARMUP, load_env, warmup
+from render import PdfSource, image_blob, page_blob, sniff_image_blob, render_page_jpeg, render_crops
+from textlayer import read_text_layer
+from jsonstream import JsonArrayStream, loads_lenient
+from windows import plan_windows, WindowMerger
+from singleflight import inflight
+from scheduler import Scheduler, INTERACTIVE, BULK
+from tracing import TracingMiddleware, span, register_collector, render_metrics, profiles
+from pipeline import prepare_pdf_pages
+from preprocess import PREPROCESS_SETTINGS
+from uploads import UploadLimitMiddleware, read_upload, pdf_bytes_of, spool_pdf
+from similar import SimilarIndex, SIMILAR_LIMIT, SIMILAR_THRESHOLD
+from pagecache import PageCache, PAGE_CACHE, page_digests
+from jobs import JobQueue, JOB_WORKERS, JOB_POLL_SECONDS, DONE, FAILED
+from resume_diff import diff_resumes, strengths as resume_strengths, comparison as diff_comparison, suggestions as diff_suggestions
+from resume_render import TemplateStyle, STYLE_PROMPT, STYLE_VERSION, compile_style, render_resume
+
+load_env()
 
 GENAI_KEY = os.getenv("GOOGLE_API_KEY")
 if not GENAI_KEY:
     print("WARNING: GOOGLE_API_KEY not found.")
 
-genai.configure(api_key=GENAI_KEY)
+MODEL_NAME = 'gemini-2.5-flash'
+llm = Scheduler(MODEL_NAME)
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
 
-app = FastAPI(title="Question Paper Extractor API")
+CACHE_DIR = os.getenv("CACHE_DIR", "/tmp/sastracker_cache")
+extraction_cache = DiskCache(
+    os.path.join(CACHE_DIR, "extraction.sqlite3"),
+    max_bytes=int(os.getenv("EXTRACTION_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    default_ttl=float(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(30 * 24 * 3600))),
+)
+solution_cache = DiskCache(
+    os.path.join(CACHE_DIR, "solutions.sqlite3"),
+    max_bytes=int(os.getenv("SOLUTION_CACHE_MAX_MB", "128")) * 1024 * 1024,
+    default_ttl=float(os.getenv("SOLUTION_CACHE_TTL_SECONDS", str(90 * 24 * 3600))),
+)
+asset_store = AssetStore(
+    os.path.join(CACHE_DIR, "assets.sqlite3"),
+    max_bytes=int(os.getenv("ASSET_STORE_MAX_MB", "512")) * 1024 * 1024,
+)
+# Crops are served from /assets/{digest}; set ASSET_INLINE=1 (or ?inline_images=true
+# per request) to get data URIs in image_base64 as before. The asset store is a
+# per-instance LRU cache, so /assets URLs are for previews only: anything that
+# stores a crop (the upload page publishing questions) asks for it inline.
+ASSET_INLINE = os.getenv("ASSET_INLINE", "0").lower() in ("1", "true", "yes")
+fetcher = Fetcher(FetchCache(os.path.join(CACHE_DIR, "downloads.sqlite3"), FETCH_CACHE_MAX_BYTES))
+job_queue = JobQueue(os.path.join(CACHE_DIR, "jobs.sqlite3"))
+similar_index = SimilarIndex(os.path.join(CACHE_DIR, "similar.sqlite3"))
+# Timed /solve calls only; the cache's own hit/miss counts also include /solve-batch.
+solve_latency = {"hits": 0, "hit_seconds": 0.0, "misses": 0, "miss_seconds": 0.0}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP:
+        # Pay the SDK import and the first process-pool spawn before traffic arrives.
+        timings = await run_io(warmup, [MODEL_NAME])
+        started = time.perf_counter()
+        await run_cpu(os.getpid)
+        timings["cpu_pool"] = time.perf_counter() - started
+        print(f"Warmed up: {timings}")
+    workers = [asyncio.ensure_future(job_worker(n)) for n in range(JOB_WORKERS)]
+    yield
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await fetcher.aclose()
+    shutdown_executors()
+
+app = FastAPI(title="Question Paper Extractor API", lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -37,14 +103,28 @@ origins = [
     "https://cse.sastra.edu"
 ]
 
+# Inside CORS, so browsers can read the 413.
+app.add_middleware(UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id"],
 )
 
+def is_admin_key(key: Optional[str]) -> bool:
+    return bool(ADMIN_API_KEY and key and hmac.compare_digest(key, ADMIN_API_KEY))
+
+def profiling_allowed(scope: dict) -> bool:
+    headers = dict(scope.get("headers") or [])
+    return is_admin_key(headers.get(b"x-admin-key", b"").decode("latin-1"))
+
+# Added last so it wraps CORS too and times the whole request.
+app.add_middleware(TracingMiddleware, allow_profile=profiling_allowed)
+
 # --- Data Models ---
 class ExtractRequest(BaseModel):
     file_url: str
@@ -53,6 +133,11 @@ class SolveRequest(BaseModel):
     content: str
     image_url: Optional[str] = None
 
+class SimilarQuestion(BaseModel):
+    id: int
+    content: str
+    score: float
+
 class Question(BaseModel):
     id: str
     number: str
@@ -62,6 +147,11 @@ class Question(BaseModel):
     isMath: bool
     hasImage: bool
     image_base64: Optional[str] = None 
+    image_url: Optional[str] = None
+    # Near-duplicates from previously extracted papers; see GET /similar/{index_id}.
+    # A match with the question's own index_id is an exact repeat.
+    index_id: Optional[int] = None
+    similar: List[SimilarQuestion] = []
 
 class ExtractionResponse(BaseModel):
     questions: List[Question]
@@ -72,14 +162,21 @@ class SolutionResponse(BaseModel):
 
 # --- Helper Functions ---
 
-def analyze_images_with_gemini(image_paths: List[str]) -> List[dict]:
-    if not GENAI_KEY:
-        raise HTTPException(status_code=500, detail="Server missing API Key")
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    if not is_admin_key(x_admin_key):
+        raise HTTPException(status_code=403, detail="Admin key required")
 
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    # Updated Prompt with Smarter Marks Deduction Logic
-    prompt = """
+@functools.lru_cache(maxsize=64)
+def prompt_version(prompt: str) -> str:
+    # Prompts are module constants, so each is hashed once per process.
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+def cache_key(namespace: str, prompt: str, digest: str) -> str:
+    # Prompt text is part of the key so editing a prompt invalidates its old results.
+    return f"{namespace}:{MODEL_NAME}:{prompt_version(prompt)}:{digest}"
+
+# Updated Prompt with Smarter Marks Deduction Logic
+EXTRACT_PROMPT = """
     You are an expert exam digitizer. 
     Analyze the provided images of a question paper.
     Extract every single question individually.
@@ -111,109 +208,642 @@ def analyze_images_with_gemini(image_paths: List[str]) -> List[dict]:
     }
     """
 
-    pil_images = [PIL.Image.open(p) for p in image_paths]
+WINDOW_RULES = """
+    Context: these images are pages {first} to {last} of a {total}-page paper.
+    7. page_number is relative to the images provided (1 = first image). Set page_number on EVERY question to the page where the question starts.
+    8. If the first image begins with the remainder of a question from an earlier page, return that fragment as its own object with "continuation": true and the question number if visible.
+    """
 
-    try:
-        response = model.generate_content(
-            [prompt, *pil_images],
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
-        text_response = response.text
+# Longer PDFs are rejected at upload with a 413 rather than cut short.
+EXTRACT_MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "50"))
+EXTRACT_WINDOW_PAGES = int(os.getenv("EXTRACT_WINDOW_PAGES", "5"))
+EXTRACT_WINDOW_OVERLAP = int(os.getenv("EXTRACT_WINDOW_OVERLAP", "1"))
+EXTRACT_WINDOW_PARALLELISM = int(os.getenv("EXTRACT_WINDOW_PARALLELISM", "4"))
+
+def extract_cache_key(pdf_digest: str) -> str:
+    # Window settings change how a paper is split, so they version the result too.
+    settings = f"{EXTRACT_MAX_PAGES}/{EXTRACT_WINDOW_PAGES}/{EXTRACT_WINDOW_OVERLAP}"
+    settings += f"/assets:{ASSET_MAX_DIMENSION}/{ASSET_FORMAT}/{ASSET_QUALITY}/{ASSET_RENDER_SCALE}"
+    settings += f"/pages:{PREPROCESS_SETTINGS}"
+    return cache_key("extract", EXTRACT_PROMPT + WINDOW_RULES + settings, pdf_digest)
+
+def window_prompt(start: int, end: int, total: int) -> str:
+    return EXTRACT_PROMPT + WINDOW_RULES.format(first=start + 1, last=end, total=total)
+
+# Per-page results are only valid for the prompt, model and crop settings
+# they came from, which is exactly what an extraction cache key encodes.
+page_cache = PageCache(os.path.join(CACHE_DIR, "pages.sqlite3"), extract_cache_key("pages"))
+
+def parse_json_response(text_response: str):
+    with span("parse"):
         if "```json" in text_response:
             text_response = text_response.split("```json")[1].split("```")[0]
         elif "```" in text_response:
             text_response = text_response.split("```")[1]
-        
-        try:
-            data = json.loads(text_response)
-        except json.JSONDecodeError:
-            cleaned_response = re.sub(r'(?<!\\)\\(?!["\\/bfnrtu])', r'\\\\', text_response)
-            data = json.loads(cleaned_response)
-        
-        for q in data:
-            if q.get('hasImage') and 'visual_bbox' in q and 'page_number' in q:
-                try:
-                    page_idx = q['page_number'] - 1 
-                    if 0 <= page_idx < len(pil_images):
-                        target_img = pil_images[page_idx]
-                        ymin, xmin, ymax, xmax = q['visual_bbox']
-                        
-                        width, height = target_img.size
-                        left = xmin * width / 1000
-                        top = ymin * height / 1000
-                        right = xmax * width / 1000
-                        bottom = ymax * height / 1000
-                        
-                        cropped_img = target_img.crop((left, top, right, bottom))
-                        buffered = io.BytesIO()
-                        cropped_img.save(buffered, format="JPEG")
-                        img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                        q['image_base64'] = f"data:image/jpeg;base64,{img_str}"
-                except Exception as img_err:
-                    print(f"Failed to crop image: {img_err}")
-        return data
 
+        return loads_lenient(text_response)
+
+async def request_questions(pages: List[bytes], prompt: str) -> List[dict]:
+    if not GENAI_KEY:
+        raise HTTPException(status_code=500, detail="Server missing API Key")
+
+    try:
+        response = await llm.generate(
+            [prompt, *(page_blob(p) for p in pages)],
+            generation_config={"response_mime_type": "application/json"}
+        )
+        return parse_json_response(response.text)
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"AI Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI Processing Failed: {str(e)}")
 
+async def crop_extracted(pdf: PdfSource, plans: List[dict], data: List[dict]) -> List[dict]:
+    # Questions from the page cache already have their crop.
+    needed = {str(q.get('page_number')) for q in data if q.get('hasImage') and not q.get('image_asset')}
+    crop_frames = {i: plan["frame"] for i, plan in enumerate(plans) if str(i + 1) in needed}
+    if not crop_frames:
+        return data
+    with span("crop"):
+        data = await run_cpu(
+            render_crops, pdf, crop_frames, data, ASSET_RENDER_SCALE, ASSET_MAX_DIMENSION, ASSET_FORMAT, ASSET_QUALITY
+        )
+    return await run_io(store_crops, data)
+
+def store_crops(questions: List[dict]) -> List[dict]:
+    for q in questions:
+        data = q.pop("image_data", None)
+        mime_type = q.pop("image_mime", None)
+        if data:
+            q["image_asset"] = asset_store.put(data, mime_type)
+    return questions
+
+def cached_extraction(key: str) -> Optional[List[dict]]:
+    extracted = extraction_cache.get(key)
+    if extracted is not None and asset_store.missing(q["image_asset"] for q in extracted if q.get("image_asset")):
+        # A crop was evicted from the asset store; extract again rather than link to a 404.
+        return None
+    return extracted
+
+async def extract_windows(pages: List[bytes], start: int = 0, end: Optional[int] = None):
+    """Extract pages[start:end] in overlapping windows concurrently,
+    yielding merged questions in page order as soon as they are final.
+
+    When the pages around the range came from the page cache, the page after
+    ``end`` goes along as context and questions starting on it are dropped,
+    as is a continuation fragment at ``start``: the cached page before it
+    already holds that question.
+    """
+    end = len(pages) if end is None else end
+    stop = min(end + 1, len(pages))
+    windows = [(start + s, start + e) for s, e in plan_windows(stop - start, EXTRACT_WINDOW_PAGES, EXTRACT_WINDOW_OVERLAP)]
+    merger = WindowMerger(windows)
+    slots = asyncio.Semaphore(EXTRACT_WINDOW_PARALLELISM)
+
+    async def run(index: int, first: int, last: int):
+        async with slots:
+            questions = clean_questions(await request_questions(pages[first:last], window_prompt(first, last, len(pages))))
+        if index == 0 and start > 0:
+            questions = [q for q in questions if not q.get("continuation")]
+        return index, questions
+
+    tasks = [asyncio.ensure_future(run(i, first, last)) for i, (first, last) in enumerate(windows)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, questions = await next_done
+            released = [q for q in merger.add(index, questions) if q["page_number"] <= end]
+            if released:
+                yield released
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def page_of(q: dict) -> int:
+    try:
+        return int(q.get("page_number"))
+    except (TypeError, ValueError):
+        return 0
+
+async def recall_pages(pdf: PdfSource, pages: List[bytes]) -> Tuple[list, list]:
+    """Page digests and, for pages seen before, their cached questions (None
+    for new pages). Best effort, like index_paper."""
+    nothing = [None] * len(pages)
+    if not PAGE_CACHE:
+        return nothing, nothing
+    try:
+        with span("page_cache"):
+            digests = await run_cpu(page_digests, pdf, len(pages))
+            known = await run_io(page_cache.lookup, digests)
+    except Exception as e:
+        print(f"Page cache lookup failed: {str(e)}")
+        return nothing, nothing
+    for i, questions in enumerate(known):
+        if questions is None:
+            continue
+        if await run_io(asset_store.missing, [q["image_asset"] for q in questions if q.get("image_asset")]):
+            known[i] = None
+            continue
+        for q in questions:
+            q["page_number"] = i + 1
+    return digests, known
+
+async def remember_pages(digests: list, known: list, questions: List[dict]):
+    """Cache the questions of each newly extracted page under its digest."""
+    if any(page_of(q) < 1 for q in questions):
+        return  # a question we cannot place would be missing from its page's entry
+    new_pages = {}
+    for i, digest in enumerate(digests):
+        if digest is None or known[i] is not None:
+            continue
+        page_questions = [
+            {k: v for k, v in q.items() if k not in ("page_number", "index_id", "similar")}
+            for q in questions if page_of(q) == i + 1
+        ]
+        new_pages[i] = (digest, page_questions)
+    try:
+        await run_io(page_cache.add, new_pages)
+    except Exception as e:
+        print(f"Page cache update failed: {str(e)}")
+
+async def extract_batches(pages: List[bytes], known: list, parser: Optional[JsonArrayStream] = None):
+    """Yield a paper's questions in page order: pages found in the page
+    cache straight away, runs of new pages from the model (all runs at once).
+    A paper with no cached pages that fits in one window is streamed token by
+    token when ``parser`` is given."""
+    if all(k is None for k in known):
+        if len(pages) > EXTRACT_WINDOW_PAGES:
+            async for batch in extract_windows(pages):
+                yield batch
+        elif parser is not None:
+            async for batch in stream_questions(pages, parser):
+                yield clean_questions(batch)
+        else:
+            yield clean_questions(await request_questions(pages, window_prompt(0, len(pages), len(pages))))
+        return
+
+    async def collect(start: int, end: int) -> List[dict]:
+        return [q async for batch in extract_windows(pages, start, end) for q in batch]
+
+    segments = []
+    for i, questions in enumerate(known):
+        if questions is not None:
+            segments.append(questions)
+        elif segments and isinstance(segments[-1], tuple):
+            segments[-1] = (segments[-1][0], i + 1)
+        else:
+            segments.append((i, i + 1))
+    runs = {s: asyncio.ensure_future(collect(*s)) for s in segments if isinstance(s, tuple)}
+    try:
+        for segment in segments:
+            yield await runs[segment] if isinstance(segment, tuple) else segment
+    finally:
+        for task in runs.values():
+            task.cancel()
+
+async def extract_and_cache(pdf: PdfSource, key: str) -> List[dict]:
+    extracted = await index_paper(await extract_paper(pdf), key)
+    await run_io(extraction_cache.set, key, extracted)
+    return extracted
+
+async def index_paper(questions: List[dict], key: str) -> List[dict]:
+    """Add a paper's questions to the near-duplicate index, annotating each
+    with its matches from earlier papers. Best effort: extraction never
+    fails because of the index."""
+    try:
+        with span("similar"):
+            # The PDF hash identifies the paper, so re-extracting it adds no self-matches.
+            return await run_io(similar_index.add_paper, questions, key.rsplit(":", 1)[-1])
+    except Exception as e:
+        print(f"Similarity indexing failed: {str(e)}")
+        return questions
+
+async def extract_paper(pdf: PdfSource) -> List[dict]:
+    pages, plans = await prepare_pdf_pages(pdf, EXTRACT_MAX_PAGES)
+    digests, known = await recall_pages(pdf, pages)
+    questions = []
+    async for batch in extract_batches(pages, known):
+        questions.extend(batch)
+    questions = await crop_extracted(pdf, plans, questions)
+    await remember_pages(digests, known, questions)
+    return questions
+
+def parse_marks(value) -> int:
+    """Marks as the model wrote them: 8, 8.0, "8", "8 marks", "[8]" or null."""
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return max(int(value), 0)
+    match = re.search(r"\d+", str(value or ""))
+    return int(match.group()) if match else 0
+
+def parse_flag(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+def clean_question(q) -> Optional[dict]:
+    """Coerce one question from the model into the Question shape, keeping its
+    other keys (page_number, visual_bbox, ...). None if it cannot be one."""
+    if not isinstance(q, dict):
+        return None
+    content = q.get("content")
+    cleaned = {
+        **q,
+        "number": "?" if q.get("number") is None else str(q["number"]),
+        "type": str(q.get("type") or "text"),
+        "content": content if isinstance(content, str) else "" if content is None else str(content),
+        "marks": parse_marks(q.get("marks")),
+        "isMath": parse_flag(q.get("isMath", False)),
+        "hasImage": parse_flag(q.get("hasImage", False)),
+    }
+    try:
+        Question(id="", **{k: cleaned[k] for k in ("number", "type", "content", "marks", "isMath", "hasImage")})
+    except ValidationError as e:
+        print(f"Dropping malformed question: {str(e)}")
+        return None
+    return cleaned
+
+def clean_questions(questions) -> List[dict]:
+    # Only cleaned questions reach the caches, so a bad reply is not replayed for a whole TTL.
+    if not isinstance(questions, list):
+        questions = [questions] if isinstance(questions, dict) else []
+    return [c for c in map(clean_question, questions) if c is not None]
+
+def to_question(q: dict, asset_base: str = "", inline: bool = False) -> Question:
+    image_url = None
+    image_base64 = q.get("image_base64", None)
+    digest = q.get("image_asset")
+    if digest:
+        image_url = f"{asset_base}/assets/{digest}"
+        stored = asset_store.get(digest) if inline else None
+        if stored:
+            image_base64 = f"data:{stored[0]};base64,{base64.b64encode(stored[1]).decode('ascii')}"
+    return Question(
+        id=str(uuid.uuid4()),
+        number=str(q.get("number", "?")),
+        type=q.get("type", "text"),
+        content=q.get("content", ""),
+        marks=parse_marks(q.get("marks")),
+        isMath=parse_flag(q.get("isMath", False)),
+        hasImage=parse_flag(q.get("hasImage", False)),
+        image_base64=image_base64,
+        image_url=image_url,
+        index_id=q.get("index_id"),
+        similar=q.get("similar") or []
+    )
+
+async def to_questions(questions: List[dict], asset_base: str = "", inline: bool = False) -> List[Question]:
+    """to_question over a list. Inlining reads crops from the asset store, so
+    that happens off the event loop."""
+    if inline and any(q.get("image_asset") for q in questions):
+        return await run_io(lambda: [to_question(q, asset_base, inline) for q in questions])
+    return [to_question(q, asset_base, inline) for q in questions]
+
+def format_event(event: str, data: dict, sse: bool) -> str:
+    with span("serialize"):
+        if sse:
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"event": event, "data": data}) + "\n"
+
+async def stream_questions(pages: List[bytes], parser: JsonArrayStream):
+    async for chunk in llm.stream(
+        [window_prompt(0, len(pages), len(pages)), *(page_blob(p) for p in pages)],
+        generation_config={"response_mime_type": "application/json"}
+    ):
+        try:
+            text = chunk.text
+        except ValueError:
+            continue
+        with span("parse"):
+            batch = parser.feed(text)
+        yield batch
+
+async def stream_extraction(pdf: PdfSource, key: str, sse: bool, asset_base: str = "", inline: bool = False):
+    """Yield one "question" event per question as soon as it is known, then an
+    "image" event per crop, then "done".
+
+    Papers that fit in one window stream token by token; longer papers emit
+    each window's questions once the merge stage has made them final. Pages
+    found in the page cache are emitted with their crops straight away.
+    """
+    def event(name: str, data: dict) -> str:
+        return format_event(name, data, sse)
+
+    def question_event(question: Question) -> str:
+        return event("question", question.model_dump(exclude={"image_base64", "image_url", "index_id", "similar"}))
+
+    def image_event(question: Question) -> str:
+        return event("image", question.model_dump(include={"id", "image_url", "image_base64"}, exclude_none=True))
+
+    cached = await run_io(cached_extraction, key)
+    if cached is not None:
+        for question in await to_questions(cached, asset_base, inline):
+            yield question_event(question)
+            if question.image_url or question.image_base64:
+                yield image_event(question)
+        yield event("done", {"total": len(cached), "cached": True})
+        return
+
+    crops = {}
+    try:
+        if not GENAI_KEY:
+            raise HTTPException(status_code=500, detail="Server missing API Key")
+        pages, plans = await prepare_pdf_pages(pdf, EXTRACT_MAX_PAGES)
+        digests, known = await recall_pages(pdf, pages)
+        parser = JsonArrayStream()
+        batches = extract_batches(pages, known, parser)
+        extracted = []
+        question_ids = []
+
+        async def finished_crop(task) -> str:
+            question_id, index = crops.pop(task)
+            extracted[index] = task.result()[0]
+            question = (await to_questions([extracted[index]], asset_base, inline))[0]
+            question.id = question_id
+            return image_event(question)
+
+        async for batch in batches:
+            for q, question in zip(batch, await to_questions(batch, asset_base, inline)):
+                extracted.append(q)
+                question_ids.append(question.id)
+                yield question_event(question)
+                if question.image_url:
+                    yield image_event(question)
+                    continue
+                page_idx = page_of(q) - 1
+                if q.get("hasImage") and "visual_bbox" in q and 0 <= page_idx < len(pages):
+                    task = asyncio.ensure_future(crop_extracted(pdf, plans, [q]))
+                    crops[task] = (question.id, len(extracted) - 1)
+            for task in [t for t in crops if t.done()]:
+                yield await finished_crop(task)
+
+        while crops:
+            done, _ = await asyncio.wait(list(crops), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield await finished_crop(task)
+
+        await remember_pages(digests, known, extracted)
+        await index_paper(extracted, key)
+        for question_id, q in zip(question_ids, extracted):
+            if q.get("index_id") is not None:
+                yield event("similar", {"id": question_id, "index_id": q["index_id"], "similar": q.get("similar", [])})
+        await run_io(extraction_cache.set, key, extracted)
+        yield event("done", {"total": len(extracted), "cached": False, "skipped": parser.errors})
+    except Exception as e:
+        print(f"AI Error: {str(e)}")
+        detail = e.detail if isinstance(e, HTTPException) else f"AI Processing Failed: {str(e)}"
+        yield event("error", {"detail": detail})
+    finally:
+        for task in crops:
+            task.cancel()
+
+class JobLost(Exception):
+    """Another worker took over the job after our lease ran out."""
+
+def job_wakeup() -> asyncio.Event:
+    return loop_local("job_wakeup", asyncio.Event)
+
+async def job_worker(n: int):
+    worker = f"{os.getpid()}-{n}"
+    while True:
+        try:
+            job = await run_io(job_queue.claim, worker)
+            if job is None:
+                wakeup = job_wakeup()
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await run_extract_job(job, worker)
+            except asyncio.CancelledError:
+                # Shutting down: hand the job back so the next worker starts it without waiting for the lease.
+                await asyncio.shield(run_io(job_queue.release, job["id"], worker))
+                raise
+        except Exception as e:
+            # A locked or full queue database must not end the worker; an
+            # unfinished job is picked up again once its lease runs out.
+            print(f"Job worker {worker} error: {str(e)}")
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+async def run_extract_job(job: dict, worker: str):
+    """Run one /jobs/extract job, saving per-stage progress and the questions
+    found so far. The lease is renewed in the background while a stage has
+    nothing new to save."""
+    stages = {"render": {"state": "running"}, "extract": {"state": "pending"}, "crop": {"state": "pending"}}
+    questions = []
+
+    async def save():
+        if not await run_io(job_queue.progress, job["id"], worker, stages, questions):
+            raise JobLost(job["id"])
+
+    async def keep_lease():
+        while True:
+            await asyncio.sleep(job_queue.lease_seconds / 3)
+            await run_io(job_queue.renew, job["id"], worker)
+
+    renewer = asyncio.ensure_future(keep_lease())
+    try:
+        await save()
+        # Large PDFs go to the render workers by path, as uploads do.
+        pdf = await run_io(spool_pdf, job.pop("payload"))
+        pages, plans = await prepare_pdf_pages(pdf, EXTRACT_MAX_PAGES)
+        digests, known = await recall_pages(pdf, pages)
+        cached_pages = sum(1 for k in known if k is not None)
+        stages["render"] = {"state": DONE, "pages": len(pages)}
+        stages["extract"] = {"state": "running", "pages": len(pages), "pages_done": 0, "questions": 0, "cached_pages": cached_pages}
+        await save()
+
+        batches = extract_batches(pages, known, JsonArrayStream())
+        last_save = time.monotonic()
+        async for batch in batches:
+            questions.extend(batch)
+            if batch and time.monotonic() - last_save >= 0.5:
+                stages["extract"].update(questions=len(questions), pages_done=max(map(page_of, questions), default=0))
+                await save()
+                last_save = time.monotonic()
+        stages["extract"] = {"state": DONE, "pages": len(pages), "pages_done": len(pages), "questions": len(questions), "cached_pages": cached_pages}
+        stages["crop"] = {"state": "running", "images": sum(1 for q in questions if q.get("hasImage"))}
+        await save()
+
+        questions = await crop_extracted(pdf, plans, questions)
+        await remember_pages(digests, known, questions)
+        questions = await index_paper(questions, job["key"])
+        stages["crop"]["state"] = DONE
+        await run_io(extraction_cache.set, job["key"], questions)
+        await run_io(job_queue.complete, job["id"], worker, stages, questions)
+    except JobLost:
+        print(f"Job {job['id']} was taken over by another worker")
+    except Exception as e:
+        print(f"Job {job['id']} failed: {str(e)}")
+        for stage in stages.values():
+            if stage["state"] == "running":
+                stage["state"] = FAILED
+        detail = e.detail if isinstance(e, HTTPException) else f"AI Processing Failed: {str(e)}"
+        await run_io(job_queue.fail, job["id"], worker, stages, detail)
+    finally:
+        renewer.cancel()
+
 # --- Endpoints ---
 
 @app.post("/extract", response_model=ExtractionResponse)
-async def extract_questions(file: UploadFile = File(...)):
+async def extract_questions(request: Request, file: UploadFile = File(...), inline_images: bool = ASSET_INLINE):
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir='/tmp') as tmp_pdf:
-        tmp_pdf.write(await file.read())
-        tmp_pdf_path = tmp_pdf.name
-
-    image_paths = []
+    with span("upload"):
+        pdf, digest = await read_upload(file, max_pages=EXTRACT_MAX_PAGES)
+    key = extract_cache_key(digest)
     
     try:
-        pdf = pdfium.PdfDocument(tmp_pdf_path)
-        n_pages = min(len(pdf), 10) 
-        
-        for i in range(n_pages):
-            page = pdf[i]
-            bitmap = page.render(scale=2)
-            pil_image = bitmap.to_pil()
-            tmp_img_path = f"/tmp/page_{uuid.uuid4()}_{i}.jpg"
-            pil_image.save(tmp_img_path, "JPEG")
-            image_paths.append(tmp_img_path)
-
-        extracted_data = analyze_images_with_gemini(image_paths)
-
-        final_questions = []
-        for q in extracted_data:
-            final_questions.append(Question(
-                id=str(uuid.uuid4()),
-                number=str(q.get("number", "?")),
-                type=q.get("type", "text"),
-                content=q.get("content", ""),
-                marks=int(q.get("marks", 0)),
-                isMath=q.get("isMath", False),
-                hasImage=q.get("hasImage", False),
-                image_base64=q.get("image_base64", None)
-            ))
+        extracted_data = await run_io(cached_extraction, key)
+        if extracted_data is None:
+            extracted_data = await inflight.do("extract", key, lambda: extract_and_cache(pdf, key))
+
+        with span("serialize"):
+            final_questions = await to_questions(extracted_data, str(request.base_url).rstrip("/"), inline_images)
 
         return {"questions": final_questions, "total": len(final_questions)}
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        if os.path.exists(tmp_pdf_path):
-            os.remove(tmp_pdf_path)
-        for p in image_paths:
-            if os.path.exists(p):
-                os.remove(p)
+
+@app.post("/extract/stream")
+async def extract_questions_stream(request: Request, file: UploadFile = File(...), inline_images: bool = ASSET_INLINE):
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    with span("upload"):
+        pdf, digest = await read_upload(file, max_pages=EXTRACT_MAX_PAGES)
+    return StreamingResponse(
+        stream_extraction(pdf, extract_cache_key(digest), sse, str(request.base_url).rstrip("/"), inline_images),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class SimilarRequest(BaseModel):
+    content: str
+    limit: int = SIMILAR_LIMIT
+    threshold: float = SIMILAR_THRESHOLD
+
+@app.post("/similar")
+async def similar_questions(request: SimilarRequest):
+    """Previously extracted questions that are near-duplicates of ``content``."""
+    limit = min(max(request.limit, 1), 50)
+    matches = await run_io(similar_index.query, request.content, request.threshold, limit)
+    return {"matches": [SimilarQuestion(**m) for m in matches]}
+
+@app.get("/similar/{index_id}")
+async def similar_to_question(index_id: int, limit: int = SIMILAR_LIMIT, threshold: float = SIMILAR_THRESHOLD):
+    matches = await run_io(similar_index.neighbours, index_id, threshold, min(max(limit, 1), 50))
+    if matches is None:
+        raise HTTPException(status_code=404, detail="Question not in the similarity index")
+    return {"matches": [SimilarQuestion(**m) for m in matches]}
+
+@app.post("/jobs/extract", status_code=202)
+async def submit_extract_job(request: Request, file: UploadFile = File(...)):
+    """Queue an extraction and return at once; poll GET /jobs/{id}. The same
+    PDF maps to the same job while it is pending, and to a finished job
+    straight away once its extraction is cached."""
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    if not GENAI_KEY:
+        raise HTTPException(status_code=500, detail="Server missing API Key")
+
+    with span("upload"):
+        pdf, digest = await read_upload(file, max_pages=EXTRACT_MAX_PAGES)
+    key = extract_cache_key(digest)
+    cached = await run_io(cached_extraction, key)
+    if cached is not None:
+        job_id = await run_io(job_queue.finished, key, cached)
+    else:
+        payload = await run_io(pdf_bytes_of, pdf)
+        job_id = await run_io(job_queue.submit, key, payload)
+        job_wakeup().set()
+    job = await run_io(job_queue.get, job_id)
+    return {"id": job_id, "state": job["state"], "status_url": f"{str(request.base_url).rstrip('/')}/jobs/{job_id}"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request, inline_images: bool = ASSET_INLINE):
+    job = await run_io(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    questions = await to_questions(job["result"], str(request.base_url).rstrip("/"), inline_images)
+    for i, question in enumerate(questions):
+        # Stable across polls so clients can merge partial results.
+        question.id = f"{job_id}-{i}"
+    return {
+        "id": job["id"],
+        "state": job["state"],
+        "stages": job["stages"],
+        "questions": questions,
+        "total": len(questions),
+        "error": job["error"],
+        "attempts": job["attempts"],
+    }
 
 from fastapi import Form
 
+PDF_TEXT_PROMPT = "Extract all text content from this PDF resume. Return ONLY the raw text content, preserving the structure and formatting. No explanations or commentary."
+URL_TEXT_PROMPT = "Extract all text content from this PDF resume. Return only the raw text, preserving the structure."
+DIFF_TEXT_PROMPT = "Extract all text from this PDF resume."
+
+async def extract_resume_text(pdf: PdfSource, prompt: str, digest: Optional[str] = None) -> dict:
+    """Text of the first 5 pages, read from the PDF's own text layer where it
+    is good enough and OCR'd by Gemini page by page where it is not."""
+    key = cache_key("resume-text", prompt, digest or hashlib.sha256(pdf).hexdigest())
+    return await inflight.do("resume-text", key, lambda: read_resume_text(pdf, prompt, key))
+
+async def read_resume_text(pdf: PdfSource, prompt: str, key: str) -> dict:
+    cached = await run_io(extraction_cache.get, key)
+    if cached is not None:
+        return cached
+
+    with span("text_layer"):
+        layer = await run_cpu(read_text_layer, pdf, 5)
+    scanned = [p for p in layer if not p["usable"]]
+    if scanned:
+        async def ocr_page(page: dict):
+            with span("render"):
+                image = await run_cpu(render_page_jpeg, pdf, page["page"] - 1, 2, 90)
+            response = await llm.generate([prompt, image_blob(image)])
+            page["text"] = response.text
+
+        await asyncio.gather(*(ocr_page(p) for p in scanned))
+
+    result = {
+        "text": "\n\n".join(p["text"].strip() for p in layer if p["text"].strip()),
+        "pages": [
+            {"page": p["page"], "source": "text_layer" if p["usable"] else "llm", "chars": p["chars"]}
+            for p in layer
+        ],
+    }
+    await run_io(extraction_cache.set, key, result)
+    return result
+
+async def read_resume(file: Optional[UploadFile], url: Optional[str], prompt: str) -> Optional[dict]:
+    """Text of a resume given as an upload or a URL, or None if neither was sent.
+
+    Both routes end in extract_resume_text, keyed by the PDF's hash, so the
+    same resume sent twice (or by upload and by URL) is only extracted once.
+    """
+    if file and file.filename:
+        with span("upload"):
+            pdf, digest = await read_upload(file)
+        return await extract_resume_text(pdf, prompt, digest)
+    if url:
+        return await extract_text_from_url(url, prompt)
+    return None
+
 @app.post("/extract-pdf-text")
 async def extract_pdf_text(
     file: Optional[UploadFile] = File(None),
@@ -222,54 +852,23 @@ async def extract_pdf_text(
     if not GENAI_KEY:
         raise HTTPException(status_code=500, detail="Server missing API Key")
 
-    tmp_pdf_path = None
     try:
-        if file and file.filename:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir='/tmp') as tmp_pdf:
-                content = await file.read()
-                tmp_pdf.write(content)
-                tmp_pdf_path = tmp_pdf.name
-        elif url:
-            tmp_pdf_path = f"/tmp/resume_{uuid.uuid4()}.pdf"
-            urllib.request.urlretrieve(url, tmp_pdf_path)
-        else:
+        result = await read_resume(file, url, PDF_TEXT_PROMPT)
+        if result is None:
             raise HTTPException(status_code=400, detail="No file or URL provided")
+        return result
 
-        pdf = pdfium.PdfDocument(tmp_pdf_path)
-        n_pages = min(len(pdf), 5)
-        
-        pil_images = []
-        for i in range(n_pages):
-            page = pdf[i]
-            bitmap = page.render(scale=2)
-            pil_images.append(bitmap.to_pil())
-
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(
-            ["Extract all text content from this PDF resume. Return ONLY the raw text content, preserving the structure and formatting. No explanations or commentary.", *pil_images]
-        )
-        
-        return {"text": response.text}
-
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if tmp_pdf_path and os.path.exists(tmp_pdf_path):
-            os.remove(tmp_pdf_path)
 
-@app.post("/solve", response_model=SolutionResponse)
-async def solve_question(request: SolveRequest):
-    if not GENAI_KEY:
-        raise HTTPException(status_code=500, detail="Server missing API Key")
-        
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    prompt = f"""
+SOLVE_PROMPT = """
     You are an expert academic tutor. Provide a comprehensive solution to this question. You always give the easiest and the most straightforward answer without any additional explanation or story. U dont go in any roundabout way to solve a problem. You always give the solution with the simplest and fewest number of steps.
     Important: You must detect if the question is intended for malicious purposes. Since your response is directly rendered as HTML, prevent any tag that can cause potential XSS such as <script>, <iframe>, <embed>, <object>, etc. If you detect any such intent, respond with "Cannot provide solution due to policy violation." and disable any javascript events for existing tags such as <div onclick=>, <img onerror=>, etc.
     You are also required to try to provide an ascii art for questions where an image answer is required such as in circuit diagrams or other similar questions instead of generating an image. 
     **Question:**
-    {request.content}
+    {content}
     
     **FORMATTING INSTRUCTIONS (CRITICAL):**
     1. **Structure with HTML:**
@@ -298,76 +897,298 @@ async def solve_question(request: SolveRequest):
       <li>The result is $f'(x) = 2x$.</li>
     </ul>
     """
-    
-    content_parts = [prompt]
-    
-    temp_img_path = None
-    if request.image_url:
+
+# Spacing commands only change typesetting, never the question.
+LATEX_SPACING = re.compile(r"\\[,;:! ]|\\q?quad\b|~")
+LATEX_PUNCT_SPACE = re.compile(r"\s*([{}()\[\]^_=+\-*/,])\s*")
+MATH_SEGMENT = re.compile(r"(\$\$.*?\$\$|\$.*?\$)", re.S)
+
+def normalize_question(content: str) -> str:
+    """Canonical form of a question for cache lookups.
+
+    Whitespace is collapsed everywhere and LaTeX spacing inside math. Prose
+    is case-folded but math is not, since $\\Delta$ and $\\delta$ differ.
+    """
+    parts = []
+    for i, part in enumerate(MATH_SEGMENT.split(content)):
+        if i % 2:
+            part = LATEX_PUNCT_SPACE.sub(r"\1", LATEX_SPACING.sub(" ", part))
+        else:
+            part = part.casefold()
+        parts.append(part)
+    return re.sub(r"\s+", " ", "".join(parts)).strip()
+
+def solution_key(content: str, image_digest: Optional[str]) -> str:
+    question = f"{normalize_question(content)}\0{image_digest or ''}"
+    return cache_key("solution", SOLVE_PROMPT, hashlib.sha256(question.encode("utf-8")).hexdigest())
+
+ASSET_PATH = re.compile(r"/assets/([0-9a-f]{32})$")
+
+async def fetch_image(image_url: str) -> bytes:
+    data = data_url_bytes(image_url)
+    if data is not None:
+        return data
+    # Crops served by /assets are content-addressed, so a matching digest can be
+    # read straight from the local store whichever host the URL names.
+    match = ASSET_PATH.search(urllib.parse.urlparse(image_url).path)
+    if match:
+        stored = await run_io(asset_store.get, match.group(1))
+        if stored:
+            return stored[1]
+    return await fetcher.fetch_bytes(image_url)
+
+async def resolve_image(image_url: Optional[str]):
+    """(sha256, bytes) of a question image. Known URLs resolve from the cache
+    without downloading; bytes are None unless a download happened."""
+    if not image_url:
+        return None, None
+    data = data_url_bytes(image_url)
+    if data is not None:
+        # The URL is the image; hashing it is cheaper than a cache round trip.
+        return hashlib.sha256(data).hexdigest(), data
+    alias = f"image-url:{image_url}"
+    digest = await run_io(solution_cache.get, alias)
+    if digest is not None:
+        return digest, None
+    data = await fetch_image(image_url)
+    digest = hashlib.sha256(data).hexdigest()
+    await run_io(solution_cache.set, alias, digest)
+    return digest, data
+
+@app.post("/solve", response_model=SolutionResponse)
+async def solve_question(request: SolveRequest):
+    if not GENAI_KEY:
+        raise HTTPException(status_code=500, detail="Server missing API Key")
+
+    # Requests for the same question and image URL share one download + lookup + LLM call.
+    identity = f"{normalize_question(request.content)}\0{request.image_url or ''}"
+    solution = await inflight.do(
+        "solve",
+        hashlib.sha256(identity.encode("utf-8")).hexdigest(),
+        lambda: solve_content(request.content, request.image_url)
+    )
+    return {"solution": solution}
+
+async def solve_content(content: str, image_url: Optional[str]) -> str:
+    started = time.perf_counter()
+    image_digest = image_bytes = None
+    try:
+        image_digest, image_bytes = await resolve_image(image_url)
+    except Exception as e:
+        print(f"Failed to download image for solving: {e}")
+
+    key = solution_key(content, image_digest)
+    solution = await run_io(solution_cache.get, key)
+    if solution is not None:
+        solve_latency["hits"] += 1
+        solve_latency["hit_seconds"] += time.perf_counter() - started
+        return solution
+
+    if image_url and image_bytes is None:
         try:
-            temp_img_path = f"/tmp/solve_{uuid.uuid4()}.jpg"
-            urllib.request.urlretrieve(request.image_url, temp_img_path)
-            img = PIL.Image.open(temp_img_path)
-            content_parts.append(img)
+            image_bytes = await fetch_image(image_url)
         except Exception as e:
             print(f"Failed to download image for solving: {e}")
 
-    try:
-        response = model.generate_content(content_parts)
-        return {"solution": response.text}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI Solution Failed: {str(e)}")
-    finally:
-        if temp_img_path and os.path.exists(temp_img_path):
-            os.remove(temp_img_path)
+    solution = await solve_and_store(key, content, image_bytes, INTERACTIVE)
+    solve_latency["misses"] += 1
+    solve_latency["miss_seconds"] += time.perf_counter() - started
+    return solution
 
-class StealTemplateRequest(BaseModel):
-    template_text: Optional[str] = None
-    child_text: Optional[str] = None
-    template_url: Optional[str] = None
-    user_resume_text: Optional[str] = None
+async def solve_and_store(key: str, content: str, image_bytes: Optional[bytes], priority: int = BULK) -> str:
+    async def solve():
+        solution = await generate_solution(content, image_bytes, priority)
+        await run_io(solution_cache.set, key, solution)
+        return solution
+
+    return await inflight.do("solution", key, solve)
+
+class BatchSolveItem(SolveRequest):
+    id: Optional[str] = None
+    image_base64: Optional[str] = None
+
+class BatchSolveRequest(BaseModel):
+    questions: List[BatchSolveItem]
+
+SOLVE_BATCH_MAX_ITEMS = int(os.getenv("SOLVE_BATCH_MAX_ITEMS", "100"))
+SOLVE_BATCH_CONCURRENCY = int(os.getenv("SOLVE_BATCH_CONCURRENCY", "8"))
+SOLVE_PACK_SIZE = int(os.getenv("SOLVE_PACK_SIZE", "5"))
+SOLVE_PACK_MAX_CHARS = int(os.getenv("SOLVE_PACK_MAX_CHARS", "1200"))
+
+PACKED_SOLVE_RULES = """
+    **BATCH MODE:** The question above is actually several independent questions, each prefixed with a label like [Q1].
+    Solve each one separately following all of the instructions above.
+    Return ONLY a JSON object mapping each label (without brackets) to that question's complete HTML solution string, e.g. {"Q1": "<h3>...</h3>", "Q2": "..."}.
+    """
+
+async def generate_solution(content: str, image_bytes: Optional[bytes] = None, priority: int = INTERACTIVE) -> str:
+    content_parts = [SOLVE_PROMPT.format(content=content)]
+    if image_bytes:
+        try:
+            content_parts.append(await run_io(sniff_image_blob, image_bytes))
+        except Exception as e:
+            print(f"Failed to read image for solving: {e}")
 
-async def extract_text_from_url(url: str) -> str:
-    tmp_path = f"/tmp/pdf_{uuid.uuid4()}.pdf"
     try:
-        urllib.request.urlretrieve(url, tmp_path)
-        pdf = pdfium.PdfDocument(tmp_path)
-        n_pages = min(len(pdf), 5)
-        pil_images = []
-        for i in range(n_pages):
-            page = pdf[i]
-            bitmap = page.render(scale=2)
-            pil_images.append(bitmap.to_pil())
-        
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(
-            ["Extract all text content from this PDF resume. Return only the raw text, preserving the structure.", *pil_images]
-        )
+        response = await llm.generate(content_parts, priority)
         return response.text
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AI Solution Failed: {str(e)}")
 
-@app.post("/fork-template")
-async def fork_template(request: StealTemplateRequest):
+async def generate_packed_solutions(contents: List[str]) -> dict:
+    """Solve several short text-only questions in one structured call.
+
+    Returns {index: solution}; questions the model skipped are left out so
+    the caller can solve them individually.
+    """
+    labelled = "\n\n".join(f"[Q{i + 1}] {c}" for i, c in enumerate(contents))
+    response = await llm.generate(
+        [SOLVE_PROMPT.format(content=labelled) + PACKED_SOLVE_RULES],
+        generation_config={"response_mime_type": "application/json"}
+    )
+    data = parse_json_response(response.text)
+    solutions = {}
+    for i in range(len(contents)):
+        solution = data.get(f"Q{i + 1}") if isinstance(data, dict) else None
+        if isinstance(solution, str) and solution.strip():
+            solutions[i] = solution
+    return solutions
+
+@app.post("/solve-batch")
+async def solve_batch(request: BatchSolveRequest):
     if not GENAI_KEY:
         raise HTTPException(status_code=500, detail="Server missing API Key")
+    if len(request.questions) > SOLVE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {SOLVE_BATCH_MAX_ITEMS} questions per batch")
+
+    items = [(q.id or str(i), q) for i, q in enumerate(request.questions)]
+    results = {}
+    slots = asyncio.Semaphore(SOLVE_BATCH_CONCURRENCY)
+
+    async def prepare(item_id: str, q: BatchSolveItem):
+        async with slots:
+            digest, data = None, None
+            try:
+                if q.image_base64:
+                    data = base64.b64decode(q.image_base64.split(",", 1)[-1])
+                    digest = hashlib.sha256(data).hexdigest()
+                elif q.image_url:
+                    digest, data = await resolve_image(q.image_url)
+                    if data is None:
+                        data = await fetch_image(q.image_url)
+            except Exception as e:
+                results[item_id] = {"error": f"Failed to load question image: {str(e)}"}
+                return None
+            return item_id, q, digest, data
+
+    # Identical questions in one paper are solved once and shared.
+    pending = {}
+    for prepared in await asyncio.gather(*(prepare(i, q) for i, q in items)):
+        if prepared is None:
+            continue
+        item_id, q, digest, data = prepared
+        key = solution_key(q.content, digest)
+        solution = await run_io(solution_cache.get, key)
+        if solution is not None:
+            results[item_id] = {"solution": solution, "cached": True}
+        else:
+            pending.setdefault(key, {"content": q.content, "image": data, "ids": []})["ids"].append(item_id)
+
+    def store(key: str, solution: str):
+        for item_id in pending[key]["ids"]:
+            results[item_id] = {"solution": solution, "cached": False}
+
+    async def solve_single(key: str):
+        async with slots:
+            try:
+                store(key, await solve_and_store(key, pending[key]["content"], pending[key]["image"]))
+            except HTTPException as e:
+                for item_id in pending[key]["ids"]:
+                    results[item_id] = {"error": e.detail}
+            except Exception as e:
+                for item_id in pending[key]["ids"]:
+                    results[item_id] = {"error": f"Failed to solve: {str(e)}"}
+
+    async def solve_pack(keys: List[str]):
+        async with slots:
+            try:
+                solved = await generate_packed_solutions([pending[k]["content"] for k in keys])
+            except Exception as e:
+                print(f"Packed solve failed, falling back to single calls: {e}")
+                solved = {}
+        for i, key in enumerate(keys):
+            if i in solved:
+                # Packed answers follow the same instructions, so they are
+                # cached under the single-question key and served by /solve.
+                store(key, solved[i])
+                try:
+                    await run_io(solution_cache.set, key, solved[i])
+                except Exception as e:
+                    print(f"Failed to cache packed solution: {e}")
+        await asyncio.gather(*(solve_single(k) for i, k in enumerate(keys) if i not in solved))
+
+    packable = [k for k, p in pending.items() if p["image"] is None and len(p["content"]) <= SOLVE_PACK_MAX_CHARS]
+    singles = [k for k in pending if k not in packable]
+    packs = [packable[i:i + SOLVE_PACK_SIZE] for i in range(0, len(packable), SOLVE_PACK_SIZE)] if SOLVE_PACK_SIZE > 1 else []
+    if not packs:
+        singles += packable
+    await asyncio.gather(
+        *(solve_pack(keys) for keys in packs),
+        *(solve_single(k) for k in singles)
+    )
 
-    template_text = request.template_text
-    user_text = request.child_text or request.user_resume_text
-
-    if not template_text and request.template_url:
-        template_text = await extract_text_from_url(request.template_url)
-    
-    if not template_text or not user_text:
-        raise HTTPException(status_code=400, detail="Missing template_text or user resume text")
-
-    model = genai.GenerativeModel('gemini-2.5-flash')
+    return {"solutions": {item_id: results[item_id] for item_id, _ in items}, "total": len(items)}
 
-    step1_prompt = f"""Extract ALL information from this resume into a strict JSON format. 
+class StealTemplateRequest(BaseModel):
+    template_text: Optional[str] = None
+    child_text: Optional[str] = None
+    template_url: Optional[str] = None
+    user_resume_text: Optional[str] = None
+    # The extractedDataId from an earlier response (skips step 1), or the extractedData itself.
+    extractedData: Optional[Union[str, dict]] = None
+
+class ResumeExperience(BaseModel):
+    company: str = ""
+    role: str = ""
+    dates: str = ""
+    location: str = ""
+    bullets: List[str] = []
+
+class ResumeEducation(BaseModel):
+    school: str = ""
+    degree: str = ""
+    dates: str = ""
+    gpa: str = ""
+
+class ResumeProject(BaseModel):
+    name: str = ""
+    description: str = ""
+    tech: List[str] = []
+
+class ParsedResume(BaseModel):
+    name: str = ""
+    email: str = ""
+    phone: str = ""
+    linkedin: str = ""
+    github: str = ""
+    portfolio: str = ""
+    summary: str = ""
+    experience: List[ResumeExperience] = []
+    education: List[ResumeEducation] = []
+    skills: List[str] = []
+    projects: List[ResumeProject] = []
+    certifications: List[str] = []
+
+# Bump when ParsedResume changes shape; stored parses and ids from older versions stop matching.
+RESUME_SCHEMA_VERSION = "1"
+
+RESUME_JSON_PROMPT = """Extract ALL information from this resume into a strict JSON format. 
 Include EVERY piece of information - do not skip anything.
 
 RESUME TEXT:
-{user_text}
+{resume_text}
 
 Return ONLY valid JSON with this exact structure:
 {{
@@ -408,15 +1229,72 @@ Return ONLY valid JSON with this exact structure:
 
 Output ONLY the JSON, no markdown formatting."""
 
-    try:
-        step1_response = model.generate_content([step1_prompt])
-        user_data_raw = step1_response.text.strip()
-        if user_data_raw.startswith("```"):
-            user_data_raw = user_data_raw.split("```json")[-1].split("```")[0].strip() if "```json" in user_data_raw else user_data_raw.split("```")[1].split("```")[0].strip()
-        
-        user_data = json.loads(user_data_raw)
+def parsed_resume_id(resume_text: str) -> str:
+    normalized = " ".join(resume_text.split())
+    return hashlib.sha256(f"{RESUME_SCHEMA_VERSION}\0{normalized}".encode("utf-8")).hexdigest()[:32]
+
+def parsed_resume_key(resume_id: str) -> str:
+    return cache_key("parsed-resume", RESUME_JSON_PROMPT + RESUME_SCHEMA_VERSION, resume_id)
+
+async def parse_resume(resume_text: str) -> tuple:
+    """(id, structured resume) for step 1 of /fork-template, stored by the
+    hash of the normalized text so repeat forks of one resume skip the LLM."""
+    resume_id = parsed_resume_id(resume_text)
+    key = parsed_resume_key(resume_id)
+    cached = await run_io(extraction_cache.get, key)
+    if cached is not None:
+        return resume_id, cached
+
+    async def parse():
+        response = await llm.generate([RESUME_JSON_PROMPT.format(resume_text=resume_text)])
+        try:
+            data = ParsedResume.model_validate(parse_json_response(response.text)).model_dump()
+        except (json.JSONDecodeError, ValidationError) as e:
+            raise HTTPException(status_code=500, detail=f"Failed to parse resume data: {str(e)}")
+        await run_io(extraction_cache.set, key, data)
+        return data
+
+    return resume_id, await inflight.do("parsed-resume", key, parse)
+
+async def extract_text_from_url(url: str, prompt: str = URL_TEXT_PROMPT) -> dict:
+    async def download_and_extract():
+        pdf, digest = await fetcher.fetch(url)
+        return await extract_resume_text(pdf, prompt, digest)
+
+    return await inflight.do("resume-url", f"{prompt}\0{url}", download_and_extract)
+
+# Forks of a template are rendered locally from its compiled style; templates the
+# style spec cannot describe fall back to the LLM cloning step.
+FORK_COMPILE_TEMPLATES = os.getenv("FORK_COMPILE_TEMPLATES", "1") == "1"
 
-        step2_prompt = f"""You are a frontend developer tasked with CLONING a resume's visual design.
+async def compile_template(template_text: str) -> Optional[TemplateStyle]:
+    """The template's compiled style, or None when it cannot be compiled.
+    Both outcomes are cached per template text."""
+    normalized = " ".join(template_text.split())
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+    key = cache_key("template-style", STYLE_PROMPT + STYLE_VERSION, digest)
+
+    async def compile():
+        response = await llm.generate([STYLE_PROMPT.format(template_text=template_text)])
+        try:
+            spec = parse_json_response(response.text)
+            if not isinstance(spec, dict) or spec.get("compilable") is False:
+                raise ValueError("template not compilable")
+            compiled = compile_style(spec).model_dump()
+        except (ValueError, ValidationError) as e:
+            print(f"Template style not compilable: {e}")
+            compiled = {"compilable": False}
+        await run_io(extraction_cache.set, key, compiled)
+        return compiled
+
+    compiled = await run_io(extraction_cache.get, key)
+    if compiled is None:
+        compiled = await inflight.do("template-style", key, compile)
+    if compiled.get("compilable") is False:
+        return None
+    return TemplateStyle.model_validate(compiled)
+
+FORK_CLONE_PROMPT = """You are a frontend developer tasked with CLONING a resume's visual design.
 
 Think of this like reverse-engineering a UI. You need to recreate the EXACT visual appearance.
 
@@ -432,7 +1310,7 @@ Analyze and replicate:
 6. COLOR: Any accent colors? Header colors? Link colors?
 
 NOW BUILD THE HTML with this person's data:
-{json.dumps(user_data, indent=2)}
+{resume_json}
 
 CRITICAL: You are filling in the template you just analyzed with this new data.
 - Same fonts, sizes, colors, layout
@@ -443,17 +1321,148 @@ CRITICAL: You are filling in the template you just analyzed with this new data.
 Output a complete HTML document with all styles embedded in a <style> tag.
 Start with <!DOCTYPE html> and output NOTHING else - no explanations."""
 
-        step2_response = model.generate_content([step2_prompt])
+@app.post("/fork-template")
+async def fork_template(request: StealTemplateRequest):
+    if not GENAI_KEY:
+        raise HTTPException(status_code=500, detail="Server missing API Key")
+
+    template_text = request.template_text
+    user_text = request.child_text or request.user_resume_text
+
+    if not template_text and request.template_url:
+        template_text = (await extract_text_from_url(request.template_url))["text"]
+    
+    if not template_text:
+        raise HTTPException(status_code=400, detail="Missing template_text or user resume text")
+
+    resume_id = user_data = None
+    if isinstance(request.extractedData, dict):
+        try:
+            user_data = ParsedResume.model_validate(request.extractedData).model_dump()
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid extractedData: {str(e)}")
+    elif request.extractedData and not user_text:
+        # With the text sent as well, the text wins: parse_resume finds it in
+        # the cache by its own id if it is unchanged, and parses it if edited.
+        user_data = await run_io(extraction_cache.get, parsed_resume_key(request.extractedData))
+        if user_data is not None:
+            resume_id = request.extractedData
+    if user_data is None and not user_text:
+        if request.extractedData:
+            raise HTTPException(status_code=410, detail="extractedData has expired; send the resume text again")
+        raise HTTPException(status_code=400, detail="Missing template_text or user resume text")
+
+    async def known_resume():
+        return resume_id, user_data
+
+    async def no_style():
+        return None
+
+    try:
+        # Step 1 and the template's style compilation are independent; on a
+        # first fork both go to the LLM at once.
+        (resume_id, user_data), style = await asyncio.gather(
+            parse_resume(user_text) if user_data is None else known_resume(),
+            compile_template(template_text) if FORK_COMPILE_TEMPLATES else no_style(),
+        )
+        if style is not None:
+            with span("render"):
+                html_content = render_resume(style, user_data)
+            return {
+                "rewrittenContent": html_content,
+                "rewritten_content": html_content,
+                "extractedData": user_data,
+                "extractedDataId": resume_id,
+                "renderer": "compiled",
+            }
+
+        step2_prompt = FORK_CLONE_PROMPT.format(template_text=template_text, resume_json=json.dumps(user_data, indent=2))
+
+        step2_response = await llm.generate([step2_prompt])
         html_content = step2_response.text.strip()
         if html_content.startswith("```"):
             html_content = html_content.split("```html")[-1].split("```")[0].strip() if "```html" in html_content else html_content.split("```")[1].split("```")[0].strip()
         
-        return {"rewrittenContent": html_content, "rewritten_content": html_content, "extractedData": user_data}
+        return {
+            "rewrittenContent": html_content,
+            "rewritten_content": html_content,
+            "extractedData": user_data,
+            "extractedDataId": resume_id,
+            "renderer": "llm",
+        }
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=500, detail=f"Failed to parse resume data: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+DIFF_NARRATIVE_PROMPT = """You are an expert career advisor comparing two resumes.
+A structural analysis has already been computed; do not recompute scores or lists, use it as evidence.
+
+TARGET RESUME (Resume 1):
+{resume1_text}
+
+USER'S RESUME (Resume 2):
+{resume2_text}
+
+ANALYSIS:
+{analysis}
+
+Return ONLY a JSON object:
+{{
+  "overallComparison": "A 2-3 sentence summary comparing both resumes",
+  "suggestions": ["5-8 specific, actionable suggestions to improve resume 2"]
+}}"""
+
+def diff_analysis(resume1_text: str, resume2_text: str) -> dict:
+    with span("diff"):
+        analysis = diff_resumes(resume1_text, resume2_text)
+        lists = resume_strengths(analysis)
+    return {
+        **lists,
+        "target_strengths": lists["resume1Strengths"],
+        "your_strengths": lists["resume2Strengths"],
+        "overall_score": analysis["overall_score"],
+        "analysis": analysis,
+    }
+
+async def diff_narrative(resume1_text: str, resume2_text: str, analysis: dict) -> dict:
+    """overallComparison and suggestions from the LLM, or from the rule-based
+    analysis when the model is unavailable or its reply does not parse."""
+    prompt = DIFF_NARRATIVE_PROMPT.format(
+        resume1_text=resume1_text, resume2_text=resume2_text, analysis=json.dumps(analysis, indent=1)
+    )
+    try:
+        response = await llm.generate([prompt], generation_config={"response_mime_type": "application/json"})
+        narrative = parse_json_response(response.text)
+        if isinstance(narrative.get("overallComparison"), str) and isinstance(narrative.get("suggestions"), list):
+            return {
+                "overallComparison": narrative["overallComparison"],
+                "suggestions": [str(s) for s in narrative["suggestions"]],
+                "narrativeSource": "llm",
+            }
+    except Exception as e:
+        print(f"Diff narrative failed: {str(e)}")
+    return rule_narrative(analysis)
+
+def rule_narrative(analysis: dict) -> dict:
+    return {
+        "overallComparison": diff_comparison(analysis),
+        "suggestions": diff_suggestions(analysis),
+        "narrativeSource": "rules",
+    }
+
+async def read_diff_resumes(resume1_file, resume2_file, resume1_url, resume2_url) -> tuple:
+    # Both sides extract concurrently; identical resumes coalesce into one extraction.
+    resume1, resume2 = await asyncio.gather(
+        read_resume(resume1_file, resume1_url, DIFF_TEXT_PROMPT),
+        read_resume(resume2_file, resume2_url, DIFF_TEXT_PROMPT),
+    )
+    if not (resume1 and resume1["text"]) or not (resume2 and resume2["text"]):
+        raise HTTPException(status_code=400, detail="Missing resume data")
+    return resume1, resume2
+
 @app.post("/resume-diff")
 async def resume_diff(
     resume1_file: Optional[UploadFile] = File(None),
@@ -461,99 +1470,215 @@ async def resume_diff(
     resume1_url: Optional[str] = Form(None),
     resume2_url: Optional[str] = Form(None),
     target_url: Optional[str] = Form(None),
-    yours_url: Optional[str] = Form(None)
+    yours_url: Optional[str] = Form(None),
+    narrative: bool = Form(True)
 ):
     if not GENAI_KEY:
         raise HTTPException(status_code=500, detail="Server missing API Key")
 
-    resume1_text = None
-    resume2_text = None
-
-    url1 = target_url or resume1_url
-    url2 = yours_url or resume2_url
-
-    if resume1_file and resume1_file.filename:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir='/tmp') as tmp:
-            tmp.write(await resume1_file.read())
-            tmp_path = tmp.name
-        try:
-            pdf = pdfium.PdfDocument(tmp_path)
-            pil_images = [pdf[i].render(scale=2).to_pil() for i in range(min(len(pdf), 5))]
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            response = model.generate_content(["Extract all text from this PDF resume.", *pil_images])
-            resume1_text = response.text
-        finally:
-            os.remove(tmp_path)
-    elif url1:
-        resume1_text = await extract_text_from_url(url1)
-
-    if resume2_file and resume2_file.filename:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir='/tmp') as tmp:
-            tmp.write(await resume2_file.read())
-            tmp_path = tmp.name
-        try:
-            pdf = pdfium.PdfDocument(tmp_path)
-            pil_images = [pdf[i].render(scale=2).to_pil() for i in range(min(len(pdf), 5))]
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            response = model.generate_content(["Extract all text from this PDF resume.", *pil_images])
-            resume2_text = response.text
-        finally:
-            os.remove(tmp_path)
-    elif url2:
-        resume2_text = await extract_text_from_url(url2)
-
-    if not resume1_text or not resume2_text:
-        raise HTTPException(status_code=400, detail="Missing resume data")
-
-    prompt = f"""You are an expert career advisor analyzing two resumes. Compare them and provide actionable insights.
+    resume1, resume2 = await read_diff_resumes(resume1_file, resume2_file, target_url or resume1_url, yours_url or resume2_url)
+    result = diff_analysis(resume1["text"], resume2["text"])
+    if narrative:
+        result.update(await diff_narrative(resume1["text"], resume2["text"], result["analysis"]))
+    else:
+        result.update(rule_narrative(result["analysis"]))
+    result["extraction"] = {"resume1": resume1["pages"], "resume2": resume2["pages"]}
+    return result
+
+@app.post("/resume-diff/stream")
+async def resume_diff_stream(
+    request: Request,
+    resume1_file: Optional[UploadFile] = File(None),
+    resume2_file: Optional[UploadFile] = File(None),
+    resume1_url: Optional[str] = Form(None),
+    resume2_url: Optional[str] = Form(None),
+    target_url: Optional[str] = Form(None),
+    yours_url: Optional[str] = Form(None)
+):
+    """The local analysis as soon as both resumes are read, then the narrative."""
+    if not GENAI_KEY:
+        raise HTTPException(status_code=500, detail="Server missing API Key")
 
-TARGET RESUME (Resume 1):
-{resume1_text}
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    resume1, resume2 = await read_diff_resumes(resume1_file, resume2_file, target_url or resume1_url, yours_url or resume2_url)
 
-USER'S RESUME (Resume 2):
-{resume2_text}
+    async def events():
+        result = diff_analysis(resume1["text"], resume2["text"])
+        result["extraction"] = {"resume1": resume1["pages"], "resume2": resume2["pages"]}
+        yield format_event("analysis", result, sse)
+        yield format_event("narrative", await diff_narrative(resume1["text"], resume2["text"], result["analysis"]), sse)
+        yield format_event("done", {}, sse)
 
-Analyze both resumes and return a JSON object with the following structure:
-{{
-  "resume1Strengths": ["list of 3-5 key strengths of resume 1"],
-  "resume2Strengths": ["list of 3-5 things resume 2 does well or has that resume 1 lacks"],
-  "suggestions": ["list of 5-8 actionable suggestions to improve resume 2"],
-  "overallComparison": "A 2-3 sentence summary comparing both resumes",
-  "target_strengths": ["same as resume1Strengths for backwards compatibility"],
-  "your_strengths": ["same as resume2Strengths for backwards compatibility"],
-  "you_lack": ["list of things resume 1 has that resume 2 lacks"],
-  "overall_score": <number from 0-100>
-}}
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-Return ONLY the JSON object, no other text."""
+@app.get("/admin/cache", dependencies=[Depends(require_admin)])
+async def cache_stats():
+    extraction, assets = await asyncio.gather(run_io(extraction_cache.stats), run_io(asset_store.stats))
+    return {**extraction, "assets": assets}
+
+@app.get("/assets/{digest}")
+async def get_asset(digest: str, request: Request):
+    etag = f'"{digest}"'
+    # Content-addressed: a given URL never changes, so any cached copy is valid forever.
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") in (etag, "*"):
+        return Response(status_code=304, headers=headers)
+    stored = await run_io(asset_store.get, digest) if ASSET_PATH.fullmatch(f"/assets/{digest}") else None
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    mime_type, data = stored
+    return Response(content=data, media_type=mime_type, headers=headers)
+
+# Stores /admin/cache/purge can empty. ``namespace`` narrows the key-value
+# caches (extraction, solutions); the others are always emptied whole. Crops
+# are not listed: cached extractions refer to them by digest.
+PURGEABLE = {
+    "extraction": extraction_cache.purge,
+    "solutions": solution_cache.purge,
+    "downloads": lambda namespace: fetcher.cache.purge(),
+    "pages": lambda namespace: page_cache.purge(),
+}
+
+@app.post("/admin/cache/purge", dependencies=[Depends(require_admin)])
+async def purge_cache(namespace: Optional[str] = None, store: str = "extraction"):
+    """Empty one store, or every store with ``store=all``."""
+    names = list(PURGEABLE) if store == "all" else [store]
+    if any(name not in PURGEABLE for name in names):
+        raise HTTPException(status_code=400, detail=f"Unknown store; use one of {', '.join(PURGEABLE)} or all")
+    purged = {name: await run_io(PURGEABLE[name], namespace) for name in names}
+    return {"purged": sum(purged.values()), "stores": purged}
+
+class PinSolutionRequest(BaseModel):
+    content: str
+    image_url: Optional[str] = None
+    pinned: bool = True
 
+@app.post("/admin/solutions/pin", dependencies=[Depends(require_admin)])
+async def pin_solution(request: PinSolutionRequest):
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(
-            [prompt],
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
-        result_text = response.text
-        if "```json" in result_text:
-            result_text = result_text.split("```json")[1].split("```")[0]
-        elif "```" in result_text:
-            result_text = result_text.split("```")[1]
-        
-        return json.loads(result_text.strip())
-    except json.JSONDecodeError:
-        return {
-            "resume1Strengths": ["Strong technical skills", "Quantified achievements", "Clear formatting"],
-            "resume2Strengths": ["Unique experiences", "Diverse skill set"],
-            "suggestions": ["Add metrics to achievements", "Include relevant keywords", "Expand project descriptions"],
-            "overallComparison": "Both resumes show potential. Resume 1 has stronger quantification while Resume 2 shows diverse experience.",
-            "target_strengths": ["Strong technical skills", "Quantified achievements"],
-            "your_strengths": ["Unique experiences", "Diverse skill set"],
-            "you_lack": ["More quantified metrics", "Industry-specific keywords"],
-            "overall_score": 65
-        }
+        image_digest, _ = await resolve_image(request.image_url)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=400, detail=f"Failed to download image: {str(e)}")
+    if not await run_io(solution_cache.pin, solution_key(request.content, image_digest), request.pinned):
+        raise HTTPException(status_code=404, detail="No cached solution for this question")
+    return {"pinned": request.pinned}
+
+def store_stats() -> dict:
+    """Counters kept in the SQLite-backed stores; read with run_io."""
+    return {
+        "solutions": solution_cache.stats()["namespaces"].get("solution", {}),
+        "jobs": job_queue.counts(),
+        "similar": similar_index.stats(),
+        "pages": page_cache.counts(),
+    }
+
+@app.get("/stats")
+async def stats():
+    stores = await run_io(store_stats)
+    solutions = stores["solutions"]
+    hits, misses = solutions.get("hits", 0), solutions.get("misses", 0)
+    timed_hits, timed_misses = solve_latency["hits"], solve_latency["misses"]
+    avg_hit = solve_latency["hit_seconds"] / timed_hits if timed_hits else 0.0
+    avg_miss = solve_latency["miss_seconds"] / timed_misses if timed_misses else 0.0
+    return {
+        "solutions": {
+            "entries": solutions.get("entries", 0),
+            "pinned": solutions.get("pinned", 0),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "avg_hit_ms": round(avg_hit * 1000, 2),
+            "avg_miss_ms": round(avg_miss * 1000, 2),
+            "saved_seconds": round(hits * max(avg_miss - avg_hit, 0.0), 2),
+        },
+        # "coalesced" requests joined an identical in-flight call instead of making their own.
+        "coalescing": inflight.stats,
+        "fetch": fetcher.stats,
+        "llm": llm.stats(),
+        "jobs": stores["jobs"],
+        "similar": stores["similar"],
+        "pages": stores["pages"],
+    }
+
+def store_metrics() -> List[str]:
+    """Exposition lines for the SQLite-backed stores; read with run_io."""
+    lines = [
+        "# TYPE sastracker_cache_hits_total counter",
+        "# TYPE sastracker_cache_misses_total counter",
+        "# TYPE sastracker_cache_bytes gauge",
+    ]
+    for name, store in (("extraction", extraction_cache), ("solutions", solution_cache)):
+        for ns, info in store.stats()["namespaces"].items():
+            labels = f'cache="{name}",namespace="{ns}"'
+            lines.append(f"sastracker_cache_hits_total{{{labels}}} {info['hits']}")
+            lines.append(f"sastracker_cache_misses_total{{{labels}}} {info['misses']}")
+            lines.append(f"sastracker_cache_bytes{{{labels}}} {info['bytes']}")
+
+    assets = asset_store.stats()
+    lines += [
+        "# TYPE sastracker_asset_bytes gauge",
+        f"sastracker_asset_bytes {assets['bytes']}",
+        "# TYPE sastracker_asset_entries gauge",
+        f"sastracker_asset_entries {assets['entries']}",
+        "# TYPE sastracker_asset_deduped_total counter",
+        f"sastracker_asset_deduped_total {assets['deduped']}",
+    ]
+
+    jobs = job_queue.counts()
+    lines += [
+        "# TYPE sastracker_jobs gauge",
+        *(f'sastracker_jobs{{state="{state}"}} {jobs[state]}' for state in ("queued", "running", "done", "failed")),
+        "# TYPE sastracker_jobs_events_total counter",
+        *(f'sastracker_jobs_events_total{{event="{event}"}} {jobs[event]}' for event in ("submitted", "deduplicated", "rejected", "reclaimed")),
+    ]
+    lines += ["# TYPE sastracker_similar_questions gauge", f"sastracker_similar_questions {similar_index.stats()['questions']}"]
+    pages = page_cache.counts()
+    lines += [
+        "# TYPE sastracker_page_cache_entries gauge",
+        f"sastracker_page_cache_entries {pages['entries']}",
+        "# TYPE sastracker_page_cache_events_total counter",
+        *(f'sastracker_page_cache_events_total{{event="{event}"}} {pages[event]}' for event in ("lookups", "hits", "stored")),
+    ]
+    return lines
+
+def collect_app_metrics() -> List[str]:
+    lines = ["# TYPE sastracker_coalesced_total counter"]
+    for ns, counters in inflight.stats.items():
+        lines.append(f'sastracker_coalesced_total{{namespace="{ns}"}} {counters["coalesced"]}')
+
+    llm_stats = llm.stats()
+    lines += [
+        "# TYPE sastracker_llm_concurrency_limit gauge",
+        f"sastracker_llm_concurrency_limit {llm_stats['limit']}",
+        "# TYPE sastracker_llm_active gauge",
+        f"sastracker_llm_active {llm_stats['active']}",
+        "# TYPE sastracker_llm_queued gauge",
+        *(f'sastracker_llm_queued{{lane="{lane}"}} {n}' for lane, n in llm_stats["queued"].items()),
+        "# TYPE sastracker_llm_events_total counter",
+        *(
+            f'sastracker_llm_events_total{{event="{event}"}} {llm_stats[event]}'
+            for event in ("calls", "retries", "quota_errors", "transient_errors", "deadline_exceeded")
+        ),
+    ]
+    return lines
+
+register_collector(collect_app_metrics)
+
+@app.get("/metrics")
+async def metrics():
+    stores = await run_io(store_metrics)
+    return PlainTextResponse(render_metrics() + "\n".join(stores) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """Collapsed stacks from a request sent with `X-Profile: 1` (feed to flamegraph.pl or speedscope)."""
+    if profile_id not in profiles:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profiles[profile_id])
 
 class GenerateHtmlRequest(BaseModel):
     content: str
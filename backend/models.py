@@ -0,0 +1,74 @@
+import importlib
+import os
+import threading
+import time
+
+# Cold starts matter on serverless deployments, so nothing here runs at import
+# time: the Gemini SDK (about a second to import) is loaded, configured and
+# asked for a model client only when the first request needs one, and every
+# later call reuses that client. WARMUP=1 does the same work at startup instead.
+WARMUP = os.getenv("WARMUP", "0").lower() in ("1", "true", "yes")
+FAKE_LLM = os.getenv("FAKE_LLM", "").lower() in ("1", "true", "yes")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_lock = threading.Lock()
+_models = {}
+_configured = False
+
+
+def load_env() -> bool:
+    """Read a local .env if there is one. Deployments set the environment
+    directly, so python-dotenv is only imported when a file exists."""
+    for directory in (os.getcwd(), BACKEND_DIR):
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            return load_dotenv(path)
+    return False
+
+
+def _configure():
+    global _configured
+    if not _configured:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        _configured = True
+
+
+def get_model(model_name: str):
+    """The process-wide client for ``model_name``, created on first use."""
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+    with _lock:
+        if model_name not in _models:
+            if FAKE_LLM:
+                from fake_model import FakeModel
+                _models[model_name] = FakeModel(model_name)
+            else:
+                _configure()
+                import google.generativeai as genai
+                _models[model_name] = genai.GenerativeModel(model_name)
+        return _models[model_name]
+
+
+def reset():
+    """Drop cached clients, e.g. after swapping ``genai.GenerativeModel``."""
+    with _lock:
+        _models.clear()
+
+
+def warmup(model_names) -> dict:
+    """Import the heavy dependencies and build the model clients now, returning
+    the seconds each step took."""
+    timings = {}
+    started = time.perf_counter()
+    for module in ("PIL.Image", "pypdfium2"):
+        importlib.import_module(module)
+    timings["imports"] = time.perf_counter() - started
+    started = time.perf_counter()
+    for model_name in model_names:
+        get_model(model_name)
+    timings["models"] = time.perf_counter() - started
+    return timings
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from render import PdfSource, open_pdf
+from textlayer import read_text_layer
+
+# The same paper keeps arriving as different bytes: re-exported, merged with
+# another paper or given a cover page. Extraction results are therefore also
+# cached per page, so only pages not seen before go to the model. A page is
+# keyed by a digest of what is on it: its size, its text layer and the
+# position (and, for images, the data) of every other object, so a page only
+# matches one that shows the same thing.
+#
+# Only pages with a usable text layer are cached. Scans are left out: a
+# changed word or mark, "(8)" to "(10)", moves a perceptual hash of a scanned
+# page by 0-5 bits, well inside re-encoding noise, and comparing stored
+# thumbnails region by region could not tell such an edit from a 10%
+# rescale in small print. Scans always go to the model.
+PAGE_CACHE = os.getenv("PAGE_CACHE", "1").lower() in ("1", "true", "yes")
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "20000"))
+
+
+def page_digests(pdf_source: PdfSource, max_pages: int) -> List[Optional[str]]:
+    """A digest per page, or None for pages without a usable text layer."""
+    import pypdfium2 as pdfium
+
+    layer = read_text_layer(pdf_source, max_pages)
+    pdf = open_pdf(pdf_source)
+    try:
+        digests = []
+        for p in layer:
+            if not p["usable"]:
+                digests.append(None)
+                continue
+            page = pdf[p["page"] - 1]
+            digest = hashlib.sha256()
+            digest.update(repr(page.get_size()).encode("ascii"))
+            digest.update(" ".join(p["text"].split()).encode("utf-8"))
+            for obj in page.get_objects():
+                # Text is covered above; figures are images and vector paths.
+                if obj.type == pdfium.raw.FPDF_PAGEOBJ_TEXT:
+                    continue
+                digest.update(b"\0%d %r" % (obj.type, tuple(round(v, 1) for v in obj.get_bounds())))
+                if isinstance(obj, pdfium.PdfImage):
+                    digest.update(bytes(obj.get_data(decode_simple=False)))
+            page.close()
+            digests.append(digest.hexdigest())
+        return digests
+    finally:
+        pdf.close()
+
+
+class PageCache:
+    """Persistent per-page extraction results, keyed by page digest.
+
+    Rows live in SQLite so every worker process shares them. ``version``
+    identifies the prompt, model and crop settings the results came from; a
+    different version starts the cache afresh.
+    """
+
+    def __init__(self, path: str, version: str, max_entries: int = PAGE_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "stored": 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        stored = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if stored is not None and stored[0] != version:
+            self._conn.execute("DROP TABLE IF EXISTS pages")
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(pages)")]
+        if columns and "digest" not in columns:
+            # Rows keyed by the old perceptual hash.
+            self._conn.execute("DROP TABLE pages")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                digest TEXT PRIMARY KEY,
+                questions TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages(accessed)")
+
+    def lookup(self, digests: List[Optional[str]]) -> List[Optional[List[dict]]]:
+        """Cached questions for each page, or None where the page is new.
+        Cached questions carry no page_number; the caller sets it."""
+        found = [None] * len(digests)
+        with self._lock:
+            now = time.time()
+            for i, digest in enumerate(digests):
+                if digest is None:
+                    continue
+                self.stats["lookups"] += 1
+                row = self._conn.execute("SELECT questions FROM pages WHERE digest = ?", (digest,)).fetchone()
+                if row is None:
+                    continue
+                self._conn.execute("UPDATE pages SET accessed = ? WHERE digest = ?", (now, digest))
+                found[i] = json.loads(row[0])
+                self.stats["hits"] += 1
+        return found
+
+    def add(self, pages: Dict[int, Tuple[str, List[dict]]]):
+        """Store ``{page index: (digest, questions)}``."""
+        if not pages:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO pages (digest, questions, created, accessed) VALUES (?, ?, ?, ?)",
+                    [(digest, json.dumps(questions), now, now) for digest, questions in pages.values()],
+                )
+                count = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+                if count > self.max_entries:
+                    # Evict a tenth at a time so the count is not hit on every add.
+                    self._conn.execute(
+                        "DELETE FROM pages WHERE digest IN (SELECT digest FROM pages ORDER BY accessed LIMIT ?)",
+                        (count - self.max_entries + self.max_entries // 10,),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.stats["stored"] += len(pages)
+
+    def purge(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM pages").rowcount
+
+    def counts(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {"entries": entries, **self.stats}
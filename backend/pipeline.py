@@ -0,0 +1,108 @@
+import asyncio
+import os
+from typing import List, Tuple
+
+from executor import loop_local, run_cpu
+from preprocess import (
+    PREPROCESS, PREPROCESS_MAX_BYTES, PREPROCESS_MAX_PIXELS, PREPROCESS_QUALITY,
+    fit_budget, frame_pixels, plan_page, render_frame,
+)
+from render import PdfSource, full_frame, page_sizes, render_page_jpeg_timed
+from tracing import record, span
+
+# Upper bound on raw page bitmaps alive at once across all requests on this
+# worker. Pages render concurrently in the process pool, but each render must
+# first reserve its estimated bitmap size, so a burst of 10-page uploads
+# streams through instead of materialising every page at once.
+RENDER_MEMORY_BUDGET = int(os.getenv("RENDER_MEMORY_BUDGET_MB", "512")) * 1024 * 1024
+# pdfium renders BGR (3 bytes/px) and to_pil() makes an RGB copy of it.
+BYTES_PER_PIXEL = 6
+
+
+class MemoryBudget:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, amount: int) -> int:
+        # An oversized page may still run, but only on its own.
+        amount = min(amount, self.limit)
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.used + amount <= self.limit)
+            self.used += amount
+        return amount
+
+    async def release(self, amount: int):
+        async with self._cond:
+            self.used -= amount
+            self._cond.notify_all()
+
+
+async def render_pdf_in_memory(pdf: PdfSource, max_pages: int, scale: float = 2, quality: int = 75) -> List[bytes]:
+    sizes = await run_cpu(page_sizes, pdf, max_pages)
+    page_budget = loop_local("render_budget", lambda: MemoryBudget(RENDER_MEMORY_BUDGET))
+
+    async def render(index: int, width: float, height: float) -> bytes:
+        cost = await page_budget.acquire(int(width * scale * height * scale * BYTES_PER_PIXEL))
+        try:
+            jpeg, render_seconds, encode_seconds = await run_cpu(render_page_jpeg_timed, pdf, index, scale, quality)
+        finally:
+            await page_budget.release(cost)
+        record("render", render_seconds)
+        record("encode", encode_seconds)
+        return jpeg
+
+    with span("render_wall"):
+        return list(await asyncio.gather(*(render(i, w, h) for i, (w, h) in enumerate(sizes))))
+
+
+async def prepare_pdf_pages(pdf: PdfSource, max_pages: int, max_pixels: int = PREPROCESS_MAX_PIXELS,
+                            max_bytes: int = PREPROCESS_MAX_BYTES) -> Tuple[List[bytes], List[dict]]:
+    """Page images for the model and each page's plan (see plan_page),
+    whose ``frame`` is the part of the page its image shows.
+
+    Pages are planned (trim, colour mode, scale) in parallel, their scales fit
+    to ``max_pixels`` together, and if the encoded pages still exceed
+    ``max_bytes`` they are rendered again, smaller. With PREPROCESS off this
+    is render_pdf_in_memory, and plans only hold whole-page frames.
+    """
+    sizes = await run_cpu(page_sizes, pdf, max_pages)
+    if not PREPROCESS:
+        return await render_pdf_in_memory(pdf, max_pages), [{"frame": full_frame(w, h)} for w, h in sizes]
+
+    with span("preprocess"):
+        plans = await asyncio.gather(*(run_cpu(plan_page, pdf, i) for i in range(len(sizes))))
+    for plan in plans:
+        record("plan", plan["seconds"])
+    page_budget = loop_local("render_budget", lambda: MemoryBudget(RENDER_MEMORY_BUDGET))
+
+    async def render(index: int, scale: float) -> bytes:
+        plan = plans[index]
+        cost = await page_budget.acquire(frame_pixels(plan["frame"], scale) * BYTES_PER_PIXEL)
+        try:
+            image, render_seconds, encode_seconds = await run_cpu(
+                render_frame, pdf, index, plan["frame"], scale, plan["mode"], PREPROCESS_QUALITY
+            )
+        finally:
+            await page_budget.release(cost)
+        record("render", render_seconds)
+        record("encode", encode_seconds)
+        return image
+
+    scales = fit_budget(plans, max_pixels)
+    with span("render_wall"):
+        pages = list(await asyncio.gather(*(render(i, s) for i, s in enumerate(scales))))
+        # Encoded size tracks pixel count closely enough that a couple of
+        # uniform shrinks get under the byte budget.
+        size = sum(map(len, pages))
+        for _ in range(3):
+            if size <= max_bytes:
+                break
+            factor = 0.95 * (max_bytes / size) ** 0.5
+            scales = [s * factor for s in scales]
+            pages = list(await asyncio.gather(*(render(i, s) for i, s in enumerate(scales))))
+            size = sum(map(len, pages))
+    if size > max_bytes:
+        print(f"Pages still take {size} bytes after shrinking; the budget is {max_bytes}")
+    return pages, plans
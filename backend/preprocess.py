@@ -0,0 +1,187 @@
+import io
+import os
+import time
+from typing import List, Optional, Tuple
+
+from render import Frame, PdfSource, full_frame, open_pdf, pdfium_crop
+
+# Exam pages are mostly black text on white, yet every page used to reach the
+# model as a full-bleed colour JPEG at scale 2. Each page is now looked at
+# once at low resolution first: blank margins are trimmed, pages without
+# colour go as greyscale, and the render scale is picked so a line of text
+# comes out about PREPROCESS_LINE_PX tall. All pages of an upload then share
+# a pixel and a byte budget. Figure crops are rendered separately from the
+# PDF at full scale (see render.render_crops), so crops lose nothing.
+#
+# PREPROCESS_TEXT_MODE=bilevel sends pages with no shading or photo as 1-bit
+# PNG, a fraction of the bytes again, but thresholding at these scales
+# thins small glyphs, so it is off until it has been checked against real
+# papers (bench/preprocess_bench.py --live).
+PREPROCESS = os.getenv("PREPROCESS", "1").lower() in ("1", "true", "yes")
+PREPROCESS_LINE_PX = float(os.getenv("PREPROCESS_LINE_PX", "22"))
+PREPROCESS_MIN_SCALE = float(os.getenv("PREPROCESS_MIN_SCALE", "0.5"))
+PREPROCESS_MAX_SCALE = float(os.getenv("PREPROCESS_MAX_SCALE", "2"))
+# Gemini scales larger images down to fit this anyway.
+PREPROCESS_MAX_SIDE = int(os.getenv("PREPROCESS_MAX_SIDE", "3072"))
+PREPROCESS_TEXT_MODE = os.getenv("PREPROCESS_TEXT_MODE", "gray").lower()
+PREPROCESS_MAX_PIXELS = int(float(os.getenv("PREPROCESS_MAX_MEGAPIXELS", "48")) * 1e6)
+PREPROCESS_MAX_BYTES = int(float(os.getenv("PREPROCESS_MAX_MB", "12")) * 1024 * 1024)
+PREPROCESS_QUALITY = int(os.getenv("PREPROCESS_QUALITY", "75"))
+# Versions extraction results: different settings show the model different pages.
+PREPROCESS_SETTINGS = (
+    f"{PREPROCESS}/{PREPROCESS_LINE_PX}/{PREPROCESS_MIN_SCALE}/{PREPROCESS_MAX_SCALE}/{PREPROCESS_MAX_SIDE}"
+    f"/{PREPROCESS_TEXT_MODE}/{PREPROCESS_MAX_PIXELS}/{PREPROCESS_MAX_BYTES}/{PREPROCESS_QUALITY}"
+)
+
+# The low-resolution look at a page is rendered with its long side this long.
+ANALYSIS_SIDE = 1000
+# Grey levels below the paper level that count as ink.
+INK_DEPTH = 48
+# Share of a row's width that must be inked for it to be part of a text line.
+ROW_INK = 0.02
+# Kept around the inked area when trimming, in PDF points.
+TRIM_PAD = 12
+# Share of the page that may be saturated colour (or isolated mid-grey, for
+# bilevel) before the page counts as having colour (or shading).
+COLOUR_SHARE = 0.002
+SHADE_SHARE = 0.005
+
+
+def _line_pitch(mask, scale: float) -> Optional[float]:
+    """Median distance in points between the tops of consecutive text lines,
+    or None if the page has fewer than three."""
+    import PIL.Image
+    rows = mask.resize((1, mask.height), PIL.Image.BOX).tobytes()
+    starts = []
+    inked = False
+    for y, level in enumerate(rows):
+        if level > ROW_INK * 255 and not inked:
+            starts.append(y)
+        inked = level > ROW_INK * 255
+    if len(starts) < 3:
+        return None
+    gaps = sorted(b - a for a, b in zip(starts, starts[1:]))
+    return gaps[len(gaps) // 2] / scale
+
+
+def plan_page(pdf_source: PdfSource, index: int) -> dict:
+    """Look at a page at low resolution and decide how to send it.
+
+    Returns its trimmed ``frame``, ``mode`` ("RGB", "L" or "1"), the
+    ``scale`` that puts a text line at PREPROCESS_LINE_PX (``line_pitch`` is
+    None on pages with no run of text) and ``seconds`` spent.
+    """
+    import PIL.Image
+    import PIL.ImageChops
+
+    started = time.perf_counter()
+    pdf = open_pdf(pdf_source)
+    try:
+        page = pdf[index]
+        width, height = page.get_size()
+        scale = min(1.0, ANALYSIS_SIDE / max(width, height))
+        bitmap = page.render(scale=scale)
+        img = bitmap.to_pil()
+        bitmap.close()
+        page.close()
+    finally:
+        pdf.close()
+
+    gray = img.convert("L")
+    histogram = gray.histogram()
+    total = gray.width * gray.height
+    seen, paper = 0, 255
+    for level, count in enumerate(histogram):
+        seen += count
+        if seen >= total * 0.9:
+            paper = level
+            break
+    threshold = paper - INK_DEPTH
+    ink = gray.point(lambda v: 255 if v < threshold else 0)
+    # Scanner specks and dust would otherwise stop the trim short: only 4x4
+    # blocks that are at least a quarter ink count.
+    box = ink.reduce(4).point(lambda v: 255 if v >= 64 else 0).getbbox()
+    if box is None:
+        return {"frame": full_frame(width, height), "mode": "L", "scale": PREPROCESS_MIN_SCALE, "line_pitch": None,
+                "seconds": time.perf_counter() - started}
+
+    box = tuple(4 * v for v in box)
+    left, top, right, bottom = box
+    frame = (
+        width, height,
+        max(left / scale - TRIM_PAD, 0.0), max(top / scale - TRIM_PAD, 0.0),
+        min(right / scale + TRIM_PAD, width), min(bottom / scale + TRIM_PAD, height),
+    )
+
+    small = img.reduce(4)
+    saturation = small.convert("HSV").getchannel("S").point(lambda v: 255 if v > 80 else 0)
+    colour = saturation.histogram()[255] > COLOUR_SHARE * small.width * small.height
+    if colour:
+        mode = "RGB"
+    else:
+        mode = "L"
+        if PREPROCESS_TEXT_MODE == "bilevel":
+            # Grey that is not the anti-aliased edge of ink is shading or a
+            # photo, which thresholding would destroy. "Near ink" is a cheap
+            # dilation: any 4x4 block holding dark ink, blurred a block wide.
+            dark = gray.point(lambda v: 255 if v < threshold // 2 else 0)
+            near = dark.reduce(4).point(lambda v: 255 if v else 0).resize(gray.size, PIL.Image.BILINEAR)
+            mid = gray.point(lambda v: 255 if threshold // 2 <= v < threshold else 0)
+            shade = PIL.ImageChops.subtract(mid, near.point(lambda v: 255 if v else 0))
+            if shade.histogram()[255] <= SHADE_SHARE * total:
+                mode = "1"
+
+    pitch = _line_pitch(ink.crop(box), scale)
+    page_scale = PREPROCESS_MAX_SCALE if pitch is None else PREPROCESS_LINE_PX / pitch
+    page_scale = min(max(page_scale, PREPROCESS_MIN_SCALE), PREPROCESS_MAX_SCALE)
+    page_scale = min(page_scale, PREPROCESS_MAX_SIDE / max(frame[4] - frame[2], frame[5] - frame[3]))
+    return {"frame": frame, "mode": mode, "scale": page_scale, "line_pitch": pitch,
+            "seconds": time.perf_counter() - started}
+
+
+def frame_pixels(frame: Frame, scale: float) -> int:
+    return int((frame[4] - frame[2]) * scale) * int((frame[5] - frame[3]) * scale)
+
+
+def fit_budget(plans: List[dict], max_pixels: int = PREPROCESS_MAX_PIXELS) -> List[float]:
+    """Per-page scales, all shrunk by the same factor if together they would
+    exceed ``max_pixels``, so every page keeps its relative legibility."""
+    scales = [p["scale"] for p in plans]
+    total = sum(frame_pixels(p["frame"], s) for p, s in zip(plans, scales))
+    if total > max_pixels:
+        factor = (max_pixels / total) ** 0.5
+        scales = [s * factor for s in scales]
+    return scales
+
+
+def render_frame(pdf_source: PdfSource, index: int, frame: Frame, scale: float, mode: str = "RGB",
+                 quality: int = PREPROCESS_QUALITY) -> Tuple[bytes, float, float]:
+    """Render the ``frame`` part of a page at ``scale`` and encode it: JPEG in
+    colour or greyscale, or 1-bit PNG for ``mode`` "1". Returns the image and
+    the seconds spent rasterising and encoding it."""
+    import PIL.Image
+
+    pdf = open_pdf(pdf_source)
+    try:
+        started = time.perf_counter()
+        page = pdf[index]
+        bitmap = page.render(scale=scale, crop=pdfium_crop(frame), grayscale=mode != "RGB")
+        img = bitmap.to_pil()
+        bitmap.close()
+        page.close()
+        rendered = time.perf_counter()
+    finally:
+        pdf.close()
+
+    buffered = io.BytesIO()
+    if mode == "1":
+        gray = img.convert("L")
+        levels = sorted(gray.resize((64, 64), PIL.Image.BOX).tobytes())
+        # A third of the way from the paper to the darkest ink: anything
+        # lower loses the thin strokes of small text.
+        paper, darkest = levels[-1], gray.getextrema()[0]
+        threshold = paper - (paper - darkest) // 3
+        gray.point(lambda v: 255 if v > threshold else 0).convert("1").save(buffered, format="PNG", optimize=True)
+    else:
+        img.convert(mode).save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue(), rendered - started, time.perf_counter() - rendered
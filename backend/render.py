@@ -0,0 +1,213 @@
+import io
+import os
+import time
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
+
+if TYPE_CHECKING:
+    import PIL.Image
+
+# Everything in this module runs inside executor pools, so functions take and
+# return plain picklable values (paths, bytes, dicts) rather than PIL objects.
+# PIL and pdfium are imported where they are used: worker processes pay for
+# them, and the web process only when it renders on its own thread.
+
+# A PDF is passed around either as bytes or as the path of a file on disk
+# (see uploads.SpooledPdf), so large uploads reach the workers by name.
+PdfSource = Union[bytes, str, os.PathLike]
+
+# The part of a page an image shows, in PDF points from the page's top-left
+# corner: (page width, page height, left, top, right, bottom). The model's
+# visual_bbox is relative to the image it was sent, so crops go through this.
+Frame = Tuple[float, float, float, float, float, float]
+
+
+def open_pdf(pdf: PdfSource):
+    import pypdfium2 as pdfium
+    # pdfium loads bytes in place and reads a path from disk as it needs it.
+    return pdfium.PdfDocument(pdf if isinstance(pdf, bytes) else os.fspath(pdf))
+
+
+def page_count(pdf: PdfSource) -> int:
+    document = open_pdf(pdf)
+    try:
+        return len(document)
+    finally:
+        document.close()
+
+
+def full_frame(width: float, height: float) -> Frame:
+    return (width, height, 0.0, 0.0, width, height)
+
+
+def pdfium_crop(frame: Frame) -> Tuple[float, float, float, float]:
+    """The frame as pdfium's render crop: points cut off (left, bottom, right, top)."""
+    width, height, left, top, right, bottom = frame
+    return (left, height - bottom, width - right, top)
+
+
+def bbox_frame(frame: Frame, bbox) -> Frame:
+    """The frame of a visual_bbox ([ymin, xmin, ymax, xmax], 0-1000 across the
+    image of ``frame``) on the whole page."""
+    width, height, left, top, right, bottom = frame
+    ymin, xmin, ymax, xmax = (float(v) for v in bbox)
+
+    def clamp(v: float, limit: float) -> float:
+        return min(max(v, 0.0), limit)
+
+    return (
+        width, height,
+        clamp(left + xmin / 1000 * (right - left), width),
+        clamp(top + ymin / 1000 * (bottom - top), height),
+        clamp(left + xmax / 1000 * (right - left), width),
+        clamp(top + ymax / 1000 * (bottom - top), height),
+    )
+
+
+def image_blob(data: bytes, mime_type: str = "image/jpeg") -> dict:
+    return {"mime_type": mime_type, "data": data}
+
+
+def page_blob(data: bytes) -> dict:
+    # Pages are prepared as JPEG, or as PNG when sent bilevel.
+    return image_blob(data, "image/png" if data.startswith(b"\x89PNG") else "image/jpeg")
+
+
+def sniff_image_blob(data: bytes) -> dict:
+    import PIL.Image
+    with PIL.Image.open(io.BytesIO(data)) as img:
+        mime_type = img.get_format_mimetype() or "image/jpeg"
+    return image_blob(data, mime_type)
+
+
+def page_sizes(pdf_source: PdfSource, max_pages: int) -> List[Tuple[float, float]]:
+    pdf = open_pdf(pdf_source)
+    try:
+        return [pdf[i].get_size() for i in range(min(len(pdf), max_pages))]
+    finally:
+        pdf.close()
+
+
+def render_page_jpeg(pdf_source: PdfSource, index: int, scale: float = 2, quality: int = 75) -> bytes:
+    return render_page_jpeg_timed(pdf_source, index, scale, quality)[0]
+
+
+def render_page_jpeg_timed(pdf_source: PdfSource, index: int, scale: float = 2, quality: int = 75) -> Tuple[bytes, float, float]:
+    """The page's JPEG plus the seconds spent rasterising and encoding it.
+
+    Only the encoded JPEG leaves the worker; the raw bitmap is released here.
+    """
+    pdf = open_pdf(pdf_source)
+    try:
+        started = time.perf_counter()
+        page = pdf[index]
+        bitmap = page.render(scale=scale)
+        rendered = time.perf_counter()
+        buffered = io.BytesIO()
+        bitmap.to_pil().save(buffered, format="JPEG", quality=quality)
+        bitmap.close()
+        page.close()
+        return buffered.getvalue(), rendered - started, time.perf_counter() - rendered
+    finally:
+        pdf.close()
+
+
+def encode_crop(img: "PIL.Image.Image", max_dimension: int, fmt: str, quality: int) -> Tuple[bytes, str]:
+    import PIL.Image
+    import PIL.features
+    if max_dimension and max(img.size) > max_dimension:
+        img = img.copy()
+        img.thumbnail((max_dimension, max_dimension), PIL.Image.LANCZOS)
+    if fmt == "WEBP" and not PIL.features.check("webp"):
+        fmt = "JPEG"
+    buffered = io.BytesIO()
+    img.convert("RGB").save(buffered, format=fmt, quality=quality, **({"method": 4} if fmt == "WEBP" else {"optimize": True}))
+    return buffered.getvalue(), f"image/{fmt.lower()}"
+
+
+def questions_by_page(questions: List[dict], pages) -> Dict[int, List[dict]]:
+    """Questions with a visual_bbox, grouped by 0-based page index in ``pages``."""
+    by_page = {}
+    for q in questions:
+        if q.get('hasImage') and 'visual_bbox' in q and 'page_number' in q:
+            try:
+                page_idx = int(q['page_number']) - 1
+            except (TypeError, ValueError):
+                continue
+            if page_idx in pages:
+                by_page.setdefault(page_idx, []).append(q)
+    return by_page
+
+
+def crop_questions(
+    pages: Dict[int, bytes],
+    questions: List[dict],
+    max_dimension: int = 0,
+    fmt: str = "JPEG",
+    quality: int = 75,
+) -> List[dict]:
+    """Crop each question's visual_bbox out of its (JPEG-encoded) page.
+
+    Sets ``image_data`` (encoded bytes) and ``image_mime`` on each cropped
+    question; identical bboxes on the same page are encoded once.
+    ``pages`` maps 0-based page index to the page image; pages are decoded one
+    at a time so at most one full-resolution bitmap is alive.
+    """
+    import PIL.Image
+    for page_idx, page_questions in questions_by_page(questions, pages).items():
+        with PIL.Image.open(io.BytesIO(pages[page_idx])) as target_img:
+            target_img.load()
+            width, height = target_img.size
+            encoded = {}
+            for q in page_questions:
+                try:
+                    ymin, xmin, ymax, xmax = q['visual_bbox']
+                    box = (
+                        round(xmin * width / 1000),
+                        round(ymin * height / 1000),
+                        round(xmax * width / 1000),
+                        round(ymax * height / 1000),
+                    )
+                    if box not in encoded:
+                        encoded[box] = encode_crop(target_img.crop(box), max_dimension, fmt, quality)
+                    q['image_data'], q['image_mime'] = encoded[box]
+                except Exception as img_err:
+                    print(f"Failed to crop image: {img_err}")
+    return questions
+
+
+def render_crops(
+    pdf_source: PdfSource,
+    frames: Dict[int, Frame],
+    questions: List[dict],
+    scale: float = 2,
+    max_dimension: int = 0,
+    fmt: str = "JPEG",
+    quality: int = 75,
+) -> List[dict]:
+    """Like crop_questions, but each visual_bbox is rendered straight from the
+    PDF at ``scale``, whatever resolution the model saw the page at.
+
+    ``frames`` maps 0-based page index to the frame of the image the model
+    was sent, which the bbox is relative to. Only the bbox area is rasterised.
+    """
+    pdf = open_pdf(pdf_source)
+    try:
+        for page_idx, page_questions in questions_by_page(questions, frames).items():
+            page = pdf[page_idx]
+            encoded = {}
+            for q in page_questions:
+                try:
+                    box = bbox_frame(frames[page_idx], q['visual_bbox'])
+                    if box[4] - box[2] < 1 or box[5] - box[3] < 1:
+                        raise ValueError(f"empty visual_bbox {q['visual_bbox']}")
+                    if box not in encoded:
+                        bitmap = page.render(scale=scale, crop=pdfium_crop(box))
+                        encoded[box] = encode_crop(bitmap.to_pil(), max_dimension, fmt, quality)
+                        bitmap.close()
+                    q['image_data'], q['image_mime'] = encoded[box]
+                except Exception as img_err:
+                    print(f"Failed to crop image: {img_err}")
+            page.close()
+    finally:
+        pdf.close()
+    return questions
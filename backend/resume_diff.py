@@ -0,0 +1,310 @@
+import difflib
+import math
+import re
+from collections import Counter
+from typing import Dict, List
+
+# Deterministic half of /resume-diff: everything that can be measured from
+# the two texts (sections, keyword and skill overlap, bullet quality, the
+# score) is computed here in milliseconds; the LLM only writes the narrative.
+
+SECTION_ALIASES = {
+    "summary": ("summary", "profile", "objective", "about", "about me", "professional summary", "career objective"),
+    "experience": ("experience", "work experience", "professional experience", "employment", "work history", "internships", "internship"),
+    "education": ("education", "academics", "academic background", "qualifications"),
+    "projects": ("projects", "personal projects", "academic projects", "key projects"),
+    "skills": ("skills", "technical skills", "core skills", "technologies", "tech stack", "tools", "competencies"),
+    "certifications": ("certifications", "certificates", "courses", "coursework", "licenses"),
+    "achievements": ("achievements", "awards", "honors", "honours", "accomplishments"),
+    "leadership": ("leadership", "activities", "extracurricular", "extracurricular activities", "volunteering", "positions of responsibility"),
+    "publications": ("publications", "research", "papers"),
+}
+HEADINGS = {alias: section for section, aliases in SECTION_ALIASES.items() for alias in aliases}
+CORE_SECTIONS = ("experience", "education", "projects", "skills")
+# Names, contact details and school names are not keywords to match.
+KEYWORD_SKIP = ("header", "education")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or that the their this to was were will with "
+    "using used use via over per our we i my me etc also other more such all any each both than then".split()
+)
+ACTION_VERBS = frozenset(
+    "built led designed developed implemented created launched improved reduced increased optimized automated "
+    "architected managed delivered migrated scaled shipped drove owned spearheaded engineered streamlined "
+    "established mentored analyzed deployed integrated refactored achieved founded organized won".split()
+)
+
+BULLET = re.compile(r"^\s*(?:[-•*▪●◦‣–]|\d+[.)])\s+")
+QUANTIFIED = re.compile(r"\d+(?:[.,]\d+)?\s*(?:%|x\b|k\b|m\b|\+)|[$₹€£]\s*\d|\b\d{2,}\b|\b\d+\s*(?:users|customers|ms|hours|days|people|engineers|members)\b", re.I)
+TOKEN = re.compile(r"[a-z][a-z0-9+#.]*[a-z0-9+#]|[a-z]")
+SKILL_SPLIT = re.compile(r"[,|;•·/\n]|\s{2,}")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+TOP_KEYWORDS = 25
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN.findall(text.lower()) if (t not in STOPWORDS and len(t) > 1) or t in ("c", "r")]
+
+
+def heading(line: str):
+    """Canonical section for a heading line, or None."""
+    cleaned = re.sub(r"[^a-z ]", "", line.lower()).strip()
+    if not cleaned or len(cleaned) > 40:
+        return None
+    return HEADINGS.get(cleaned)
+
+
+def split_sections(text: str) -> Dict[str, List[str]]:
+    """Lines of each section; text before the first heading is the header."""
+    sections = {"header": []}
+    current = "header"
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        section = heading(line.rstrip(":"))
+        if section:
+            current = section
+            sections.setdefault(current, [])
+        else:
+            sections.setdefault(current, []).append(line)
+    return sections
+
+
+def bullets_of(lines: List[str]) -> List[str]:
+    marked = [BULLET.sub("", line) for line in lines if BULLET.match(line)]
+    # Text-layer extraction often drops bullet glyphs; fall back to sentence-length lines.
+    return marked or [line for line in lines if len(line.split()) >= 6]
+
+
+def mentions(text: str, term: str) -> bool:
+    return re.search(r"(?<![a-z0-9])" + re.escape(term) + r"(?![a-z0-9+#])", text) is not None
+
+
+def parse_skills(lines: List[str]) -> List[str]:
+    skills = []
+    for line in lines:
+        line = line.split(":", 1)[1] if ":" in line and len(line.split(":", 1)[0]) < 30 else line
+        for item in SKILL_SPLIT.split(BULLET.sub("", line)):
+            item = item.strip(" .-").lower()
+            if item and len(item) <= 40:
+                skills.append(item)
+    return list(dict.fromkeys(skills))
+
+
+def metrics(sections: Dict[str, List[str]]) -> dict:
+    bullets = [b for name in ("experience", "projects", "leadership", "achievements") for b in bullets_of(sections.get(name, []))]
+    quantified = sum(1 for b in bullets if QUANTIFIED.search(b))
+    action = sum(1 for b in bullets if (b.split() or [""])[0].lower().strip(",.") in ACTION_VERBS)
+    words = sum(len(line.split()) for lines in sections.values() for line in lines)
+    return {
+        "words": words,
+        "sections": [s for s in sections if s != "header"],
+        "bullets": len(bullets),
+        "quantified_bullets": quantified,
+        "quantified_density": round(quantified / len(bullets), 2) if bullets else 0.0,
+        "action_verb_density": round(action / len(bullets), 2) if bullets else 0.0,
+        "avg_bullet_words": round(sum(len(b.split()) for b in bullets) / len(bullets), 1) if bullets else 0.0,
+    }
+
+
+class BM25:
+    """Okapi BM25 over a small corpus: the sections of both resumes."""
+
+    def __init__(self, documents: List[List[str]]):
+        self.documents = [Counter(d) for d in documents]
+        self.lengths = [len(d) for d in documents]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if documents else 0.0
+        df = Counter(term for d in self.documents for term in d)
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    def score(self, query: Counter, doc: Counter, length: int) -> float:
+        total = 0.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self.avg_length or 1))
+        for term, weight in query.items():
+            tf = doc.get(term, 0)
+            if tf:
+                total += weight * self.idf.get(term, 0.0) * tf * (BM25_K1 + 1) / (tf + norm)
+        return total
+
+
+def salient_terms(sections: Dict[str, List[str]]) -> set:
+    """Terms that look like technologies or names rather than prose: anything
+    in the skills section, and words capitalized or containing +#./digits
+    anywhere but at the start of a line."""
+    terms = set(tokenize(" ".join(parse_skills(sections.get("skills", [])))))
+    for name, lines in sections.items():
+        if name in KEYWORD_SKIP:
+            continue
+        for line in lines:
+            for word in BULLET.sub("", line).split()[1:]:
+                word = word.strip(",.;:()")
+                if word[:1].isupper() or re.search(r"[+#.\d]", word):
+                    terms.update(tokenize(word))
+    return terms
+
+
+def content(sections: Dict[str, List[str]]) -> List[List[str]]:
+    """Tokens of each section that can hold keywords. A resume with no
+    recognizable headings is all "header" and is used whole."""
+    docs = [tokenize(" ".join(lines)) for name, lines in sections.items() if name not in KEYWORD_SKIP]
+    if not any(docs):
+        docs = [tokenize(" ".join(lines)) for lines in sections.values()]
+    return docs
+
+
+def keyword_overlap(target_sections: Dict[str, List[str]], other_sections: Dict[str, List[str]]) -> dict:
+    target_docs = content(target_sections)
+    other_docs = content(other_sections)
+    target_tokens = [t for d in target_docs for t in d]
+    other_tokens = [t for d in other_docs for t in d]
+    bm25 = BM25([d for d in target_docs + other_docs if d])
+    salient = salient_terms(target_sections) - ACTION_VERBS
+
+    # Every target term is in the query; technology-like terms count double.
+    query = Counter({t: 2 if t in salient else 1 for t in set(target_tokens)})
+    self_score = bm25.score(query, Counter(target_tokens), len(target_tokens))
+    other_score = bm25.score(query, Counter(other_tokens), len(other_tokens))
+
+    tf = Counter(target_tokens)
+    ranked = sorted((t for t in tf if t in salient), key=lambda t: (-tf[t] * bm25.idf.get(t, 0.0), t))[:TOP_KEYWORDS]
+    present = set(other_tokens)
+    return {
+        "score": round(min(other_score / self_score, 1.0), 2) if self_score else 0.0,
+        "keywords": ranked,
+        "matched": [t for t in ranked if t in present],
+        "missing": [t for t in ranked if t not in present],
+    }
+
+
+def section_diff(target_sections: Dict[str, List[str]], other_sections: Dict[str, List[str]]) -> List[dict]:
+    rows = []
+    for name in [s for s in SECTION_ALIASES if s in target_sections or s in other_sections]:
+        a, b = target_sections.get(name), other_sections.get(name)
+        row = {"section": name, "in_target": a is not None, "in_yours": b is not None}
+        if a is not None and b is not None:
+            matcher = difflib.SequenceMatcher(None, tokenize(" ".join(a)), tokenize(" ".join(b)), autojunk=False)
+            row["similarity"] = round(matcher.ratio(), 2)
+        row["target_words"] = sum(len(line.split()) for line in a or [])
+        row["your_words"] = sum(len(line.split()) for line in b or [])
+        rows.append(row)
+    return rows
+
+
+def diff_resumes(target_text: str, your_text: str) -> dict:
+    """Structural comparison of the target resume (1) against the user's (2)."""
+    target, yours = split_sections(target_text), split_sections(your_text)
+    target_metrics, your_metrics = metrics(target), metrics(yours)
+    keywords = keyword_overlap(target, yours)
+
+    target_skills = parse_skills(target.get("skills", []))
+    your_skills = parse_skills(yours.get("skills", []))
+    # A skill counts as present if it appears anywhere, not only in the skills section.
+    missing_skills = [s for s in target_skills if not mentions(your_text.lower(), s)]
+    extra_skills = [s for s in your_skills if not mentions(target_text.lower(), s)]
+    skill_score = 1 - len(missing_skills) / len(target_skills) if target_skills else keywords["score"]
+
+    expected = [s for s in CORE_SECTIONS if s in target]
+    section_score = sum(1 for s in expected if s in yours) / len(expected) if expected else 1.0
+    if target_metrics["bullets"]:
+        quant_score = min(your_metrics["quantified_density"] / max(target_metrics["quantified_density"], 0.3), 1.0)
+    else:
+        quant_score = 1.0
+
+    score = round(100 * (0.4 * keywords["score"] + 0.25 * skill_score + 0.15 * section_score + 0.2 * quant_score))
+
+    return {
+        "overall_score": score,
+        "score_breakdown": {
+            "keywords": keywords["score"],
+            "skills": round(skill_score, 2),
+            "sections": round(section_score, 2),
+            "quantification": round(quant_score, 2),
+        },
+        "metrics": {"resume1": target_metrics, "resume2": your_metrics},
+        "sections": section_diff(target, yours),
+        "keywords": keywords,
+        "skills": {
+            "shared": [s for s in target_skills if s not in missing_skills],
+            "missing": missing_skills,
+            "extra": extra_skills,
+        },
+    }
+
+
+def strengths(analysis: dict) -> dict:
+    """The list fields of the /resume-diff response, derived from ``analysis``."""
+    m1, m2 = analysis["metrics"]["resume1"], analysis["metrics"]["resume2"]
+    rows = analysis["sections"]
+
+    def quant(m):
+        return f"{m['quantified_bullets']} of {m['bullets']} bullets quantified ({round(m['quantified_density'] * 100)}%)"
+
+    resume1, resume2, lack = [], [], []
+    if m1["quantified_density"] > m2["quantified_density"]:
+        resume1.append(quant(m1))
+        lack.append(f"Quantified impact: {quant(m2)}")
+    elif m2["bullets"]:
+        resume2.append(quant(m2))
+    if m1["action_verb_density"] > m2["action_verb_density"] + 0.1:
+        resume1.append(f"{round(m1['action_verb_density'] * 100)}% of bullets start with a strong action verb")
+    elif m2["action_verb_density"] > m1["action_verb_density"] + 0.1:
+        resume2.append(f"{round(m2['action_verb_density'] * 100)}% of bullets start with a strong action verb")
+
+    only_target = [r["section"] for r in rows if r["in_target"] and not r["in_yours"]]
+    only_yours = [r["section"] for r in rows if r["in_yours"] and not r["in_target"]]
+    if only_target:
+        resume1.append("Includes " + ", ".join(only_target) + " section" + ("s" if len(only_target) > 1 else ""))
+        lack.extend(f"A {s} section" for s in only_target)
+    if only_yours:
+        resume2.append("Includes " + ", ".join(only_yours) + " section" + ("s" if len(only_yours) > 1 else ""))
+
+    skills = analysis["skills"]
+    if skills["shared"]:
+        resume2.append("Shares key skills: " + ", ".join(skills["shared"][:6]))
+    if skills["extra"]:
+        resume2.append("Additional skills: " + ", ".join(skills["extra"][:6]))
+    if skills["missing"]:
+        lack.append("Skills: " + ", ".join(skills["missing"][:8]))
+    missing_keywords = [k for k in analysis["keywords"]["missing"] if k not in " ".join(skills["missing"])]
+    if missing_keywords:
+        lack.append("Keywords: " + ", ".join(missing_keywords[:8]))
+    if analysis["keywords"]["matched"]:
+        resume1.append("Emphasizes " + ", ".join(analysis["keywords"]["keywords"][:5]))
+
+    return {"resume1Strengths": resume1, "resume2Strengths": resume2, "you_lack": lack}
+
+
+def comparison(analysis: dict) -> str:
+    """One-paragraph summary, used when the LLM narrative is unavailable."""
+    b = analysis["score_breakdown"]
+    weakest = min(b, key=b.get)
+    return (
+        f"Your resume scores {analysis['overall_score']}/100 against the target: "
+        f"{round(b['keywords'] * 100)}% keyword coverage, {round(b['skills'] * 100)}% of its skills, "
+        f"{round(b['sections'] * 100)}% of its core sections. The biggest gap is {weakest}."
+    )
+
+
+def suggestions(analysis: dict) -> List[str]:
+    """Rule-based suggestions, used when the LLM narrative is unavailable."""
+    m1, m2 = analysis["metrics"]["resume1"], analysis["metrics"]["resume2"]
+    out = []
+    unquantified = m2["bullets"] - m2["quantified_bullets"]
+    if unquantified and m2["quantified_density"] < max(m1["quantified_density"], 0.5):
+        out.append(f"Add numbers (%, time saved, users, scale) to {unquantified} of your {m2['bullets']} bullets.")
+    if m2["action_verb_density"] < 0.5 and m2["bullets"]:
+        out.append("Start more bullets with a strong action verb (built, led, reduced, shipped).")
+    for row in analysis["sections"]:
+        if row["in_target"] and not row["in_yours"]:
+            out.append(f"Add a {row['section']} section.")
+    if analysis["skills"]["missing"]:
+        out.append("If you have them, list these skills: " + ", ".join(analysis["skills"]["missing"][:8]) + ".")
+    if analysis["keywords"]["missing"]:
+        out.append("Work these terms from the target into your bullets: " + ", ".join(analysis["keywords"]["missing"][:8]) + ".")
+    if m2["avg_bullet_words"] > 30:
+        out.append(f"Tighten bullets; they average {m2['avg_bullet_words']} words.")
+    return out
@@ -0,0 +1,213 @@
+from html import escape
+from typing import List, Literal
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+# Forked resumes are rendered locally from a compiled template style: the LLM
+# describes a template's look once as a TemplateStyle, and every fork of that
+# template fills the same fixed HTML skeleton with the person's parsed resume.
+# Only validated, enumerated style values reach the CSS, and all resume text
+# is escaped, so neither the template nor the resume can inject markup.
+
+SECTIONS = ("summary", "experience", "education", "projects", "skills", "certifications")
+
+FONTS = {
+    "serif": "Georgia, 'Times New Roman', serif",
+    "sans-serif": "'Helvetica Neue', Arial, sans-serif",
+    "garamond": "Garamond, 'EB Garamond', Georgia, serif",
+    "computer-modern": "'CMU Serif', 'Latin Modern Roman', 'Times New Roman', serif",
+    "calibri": "Calibri, Carlito, Arial, sans-serif",
+    "monospace": "'Courier New', monospace",
+}
+
+BULLETS = {"disc": "disc", "circle": "circle", "square": "square", "dash": "'\\2013  '", "none": "none"}
+
+# Bump when TemplateStyle or the skeleton changes; compiled styles are cached under it.
+STYLE_VERSION = "1"
+
+Section = Literal["summary", "experience", "education", "projects", "skills", "certifications"]
+HEX_COLOR = r"^#[0-9a-fA-F]{6}$"
+
+
+class TemplateStyle(BaseModel):
+    font: Literal["serif", "sans-serif", "garamond", "computer-modern", "calibri", "monospace"] = "serif"
+    base_size_pt: float = Field(default=10.5, ge=8, le=13)
+    name_size_pt: float = Field(default=20, ge=12, le=36)
+    section_size_pt: float = Field(default=12, ge=9, le=18)
+    line_height: float = Field(default=1.3, ge=1.0, le=1.8)
+    margin_in: float = Field(default=0.6, ge=0.25, le=1.25)
+    section_gap_pt: float = Field(default=8, ge=0, le=24)
+    text_color: str = Field(default="#000000", pattern=HEX_COLOR)
+    accent_color: str = Field(default="#000000", pattern=HEX_COLOR)
+    header_align: Literal["left", "center"] = "center"
+    contact_separator: Literal["|", "•", "·", "newline"] = "|"
+    section_case: Literal["upper", "title", "small-caps"] = "upper"
+    section_rule: Literal["underline", "none", "bar", "full"] = "underline"
+    layout: Literal["single", "two-column"] = "single"
+    sidebar: List[Section] = []
+    section_order: List[Section] = list(SECTIONS)
+    date_position: Literal["right", "inline", "below"] = "right"
+    bullet: Literal["disc", "circle", "square", "dash", "none"] = "disc"
+    skills_style: Literal["inline", "list"] = "inline"
+
+    @field_validator("section_order")
+    @classmethod
+    def complete_order(cls, order):
+        # Sections the template never shows still render (last) so no data is dropped.
+        seen = list(dict.fromkeys(order))
+        return seen + [s for s in SECTIONS if s not in seen]
+
+
+def compile_style(spec: dict) -> TemplateStyle:
+    """Validate an LLM style spec; keys with out-of-range values fall back to
+    their defaults instead of failing the whole template."""
+    try:
+        return TemplateStyle.model_validate(spec)
+    except ValidationError as e:
+        bad = {err["loc"][0] for err in e.errors() if err["loc"]}
+        return TemplateStyle.model_validate({k: v for k, v in spec.items() if k not in bad})
+
+
+STYLE_PROMPT = """You are compiling a resume template into a style spec.
+Describe the visual design of the template below (fonts, sizes, colors, layout, section styling) - NOT its content.
+
+TEMPLATE RESUME:
+{template_text}
+
+Return ONLY a JSON object with these keys (omit any you cannot tell; use only the listed values):
+{{
+  "font": "serif" | "sans-serif" | "garamond" | "computer-modern" | "calibri" | "monospace",
+  "base_size_pt": 8-13,
+  "name_size_pt": 12-36,
+  "section_size_pt": 9-18,
+  "line_height": 1.0-1.8,
+  "margin_in": 0.25-1.25,
+  "section_gap_pt": 0-24,
+  "text_color": "#rrggbb",
+  "accent_color": "#rrggbb",
+  "header_align": "left" | "center",
+  "contact_separator": "|" | "•" | "·" | "newline",
+  "section_case": "upper" | "title" | "small-caps",
+  "section_rule": "underline" | "none" | "bar" | "full",
+  "layout": "single" | "two-column",
+  "sidebar": [sections shown in the narrow column of a two-column layout],
+  "section_order": [sections in the order they appear],
+  "date_position": "right" | "inline" | "below",
+  "bullet": "disc" | "circle" | "square" | "dash" | "none",
+  "skills_style": "inline" | "list"
+}}
+Sections are: "summary", "experience", "education", "projects", "skills", "certifications".
+If the template's layout cannot be described with these options, return {{"compilable": false}}."""
+
+
+def style_css(style: TemplateStyle) -> str:
+    rule = {
+        "underline": f"border-bottom: 1px solid {style.accent_color}; padding-bottom: 2pt;",
+        "full": f"border-bottom: 1.5pt solid {style.accent_color}; padding-bottom: 2pt;",
+        "bar": f"border-left: 3pt solid {style.accent_color}; padding-left: 6pt;",
+        "none": "",
+    }[style.section_rule]
+    case = {
+        "upper": "text-transform: uppercase; letter-spacing: 0.5pt;",
+        "title": "",
+        "small-caps": "font-variant: small-caps; letter-spacing: 0.5pt;",
+    }[style.section_case]
+    date_css = {
+        "right": ".entry-head { display: flex; justify-content: space-between; gap: 12pt; }",
+        "inline": ".entry-head .dates::before { content: ' \\2014  '; } .entry-head span { display: inline; }",
+        "below": ".entry-head .dates { display: block; font-style: italic; }",
+    }[style.date_position]
+    columns = ""
+    if style.layout == "two-column" and style.sidebar:
+        columns = ".columns { display: grid; grid-template-columns: 30% 1fr; gap: 18pt; }"
+    return f"""@page {{ size: letter; margin: {style.margin_in}in; }}
+body {{ font-family: {FONTS[style.font]}; font-size: {style.base_size_pt}pt; line-height: {style.line_height}; color: {style.text_color}; margin: 0; }}
+header {{ text-align: {style.header_align}; margin-bottom: {style.section_gap_pt}pt; }}
+header h1 {{ font-size: {style.name_size_pt}pt; margin: 0; color: {style.accent_color}; }}
+.contact {{ margin-top: 2pt; }}
+.contact span + span::before {{ content: "{'' if style.contact_separator == 'newline' else f' {style.contact_separator} '}"; }}
+{'.contact span { display: block; }' if style.contact_separator == 'newline' else ''}
+section {{ margin-top: {style.section_gap_pt}pt; }}
+section h2 {{ font-size: {style.section_size_pt}pt; color: {style.accent_color}; margin: 0 0 4pt; {case} {rule} }}
+.entry {{ margin-bottom: 4pt; }}
+.entry-head .title {{ font-weight: bold; }}
+.entry-sub {{ font-style: italic; }}
+{date_css}
+ul {{ margin: 2pt 0 0; padding-left: {0 if style.bullet == 'none' else 14}pt; list-style-type: {BULLETS[style.bullet]}; }}
+.skills-inline {{ margin: 0; }}
+{columns}"""
+
+
+def _text(value) -> str:
+    return escape(str(value or "").strip())
+
+
+def _joined(*values, sep: str = ", ") -> str:
+    return escape(sep.join(str(v).strip() for v in values if v and str(v).strip()))
+
+
+def _entry(title: str, dates: str, sub: str = "", bullets: List[str] = ()) -> str:
+    parts = [f'<div class="entry"><div class="entry-head"><span class="title">{title}</span>']
+    if dates:
+        parts.append(f'<span class="dates">{dates}</span>')
+    parts.append("</div>")
+    if sub:
+        parts.append(f'<div class="entry-sub">{sub}</div>')
+    items = [f"<li>{_text(b)}</li>" for b in bullets if b and str(b).strip()]
+    if items:
+        parts.append(f"<ul>{''.join(items)}</ul>")
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def _section(key: str, style: TemplateStyle, data: dict) -> str:
+    body = ""
+    if key == "summary" and data.get("summary"):
+        body = f"<p>{_text(data['summary'])}</p>"
+    elif key == "experience":
+        body = "".join(
+            _entry(_joined(e.get("role"), e.get("company"), sep=" — "), _text(e.get("dates")), _text(e.get("location")), e.get("bullets") or [])
+            for e in data.get("experience") or []
+        )
+    elif key == "education":
+        body = "".join(
+            _entry(_text(e.get("school")), _text(e.get("dates")), _joined(e.get("degree"), f"GPA: {e['gpa']}" if e.get("gpa") else ""))
+            for e in data.get("education") or []
+        )
+    elif key == "projects":
+        body = "".join(
+            _entry(_text(p.get("name")), "", _joined(*(p.get("tech") or [])), [p.get("description")])
+            for p in data.get("projects") or []
+        )
+    elif key in ("skills", "certifications"):
+        items = [s for s in data.get(key) or [] if s and str(s).strip()]
+        if items and (style.skills_style == "list" or key == "certifications"):
+            body = "<ul>" + "".join(f"<li>{_text(s)}</li>" for s in items) + "</ul>"
+        elif items:
+            body = f'<p class="skills-inline">{_joined(*items)}</p>'
+    if not body:
+        return ""
+    title = "Certifications" if key == "certifications" else key.title()
+    return f'<section class="{key}"><h2>{title}</h2>{body}</section>'
+
+
+def render_resume(style: TemplateStyle, data: dict) -> str:
+    """A complete HTML document for the parsed resume ``data`` in ``style``."""
+    contact = "".join(
+        f"<span>{_text(data.get(k))}</span>"
+        for k in ("email", "phone", "linkedin", "github", "portfolio")
+        if data.get(k) and str(data[k]).strip()
+    )
+    header = f'<header><h1>{_text(data.get("name"))}</h1><div class="contact">{contact}</div></header>'
+
+    if style.layout == "two-column" and style.sidebar:
+        side = "".join(_section(k, style, data) for k in style.section_order if k in style.sidebar)
+        main = "".join(_section(k, style, data) for k in style.section_order if k not in style.sidebar)
+        body = f'<div class="columns"><aside>{side}</aside><main>{main}</main></div>'
+    else:
+        body = "".join(_section(k, style, data) for k in style.section_order)
+
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{_text(data.get("name")) or "Resume"}</title>'
+        f"<style>{style_css(style)}</style></head><body>{header}{body}</body></html>"
+    )
@@ -0,0 +1,310 @@
+import asyncio
+import collections
+import functools
+import heapq
+import io
+import itertools
+import math
+import os
+import random
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+
+from executor import loop_local
+from models import get_model
+from tracing import span
+
+# Every Gemini call goes through one scheduler so that bulk work (paper
+# extraction, template forking, resume diffs) cannot starve interactive
+# /solve requests, and so a quota error slows everyone down instead of
+# surfacing as a 500.
+INTERACTIVE = 0
+BULK = 1
+LANES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+LLM_INTERACTIVE_DEADLINE = float(os.getenv("LLM_INTERACTIVE_DEADLINE", "60"))
+LLM_BULK_DEADLINE = float(os.getenv("LLM_BULK_DEADLINE", "300"))
+# 0 disables the token budget; otherwise estimated input tokens per rolling minute.
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+
+
+# Gemini bills an image as 258 tokens per 768px tile (one tile if it fits in 384px).
+IMAGE_TILE = 768
+TOKENS_PER_TILE = 258
+
+
+class LLMUnavailable(HTTPException):
+    """The model could not be reached within the request's deadline or retry budget."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        headers = {"Retry-After": str(math.ceil(retry_after))} if retry_after else None
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+
+
+@functools.lru_cache(maxsize=None)
+def _errors():
+    # (quota errors, every retryable error). google.api_core comes with the
+    # Gemini SDK, so it is imported with the first call, not with this module.
+    from google.api_core import exceptions as google_exceptions
+    quota = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+    transient = (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+        asyncio.TimeoutError,
+    )
+    return quota, quota + transient
+
+
+def estimate_tokens(parts) -> int:
+    tokens = 0
+    for part in parts:
+        if isinstance(part, str):
+            tokens += len(part) // 4 + 1
+        elif isinstance(part, dict) and "data" in part:
+            import PIL.Image
+            try:
+                width, height = PIL.Image.open(io.BytesIO(part["data"])).size
+            except Exception:
+                width = height = IMAGE_TILE * 2
+            if width <= IMAGE_TILE // 2 and height <= IMAGE_TILE // 2:
+                tokens += TOKENS_PER_TILE
+            else:
+                tokens += math.ceil(width / IMAGE_TILE) * math.ceil(height / IMAGE_TILE) * TOKENS_PER_TILE
+    return tokens
+
+
+class _Slots:
+    def __init__(self):
+        self.active = 0
+        self.waiters = []
+
+
+class _TokenWindow:
+    def __init__(self):
+        self.spent = collections.deque()
+        self.total = 0
+
+    def trim(self, now: float):
+        while self.spent and self.spent[0][0] <= now - 60:
+            self.total -= self.spent.popleft()[1]
+
+
+class Scheduler:
+    """Priority-laned, AIMD-limited gateway for Gemini calls.
+
+    Callers wait in a priority queue for one of ``limit`` concurrent slots.
+    ``limit`` grows by about one per round of successful calls and halves on
+    a quota error (at most once per second). Quota and transient errors are
+    retried with full-jitter exponential backoff until the call's deadline.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.limit = float(min(max(LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY), LLM_MAX_CONCURRENCY))
+        self._last_decrease = 0.0
+        self._seq = itertools.count()
+        self.counters = {
+            "calls": 0,
+            "retries": 0,
+            "quota_errors": 0,
+            "transient_errors": 0,
+            "deadline_exceeded": 0,
+            "tokens_estimated": 0,
+        }
+
+    def stats(self) -> dict:
+        slots = loop_local("llm_slots", _Slots)
+        queued = {name: 0 for name in LANES.values()}
+        for priority, _, future in slots.waiters:
+            if not future.done():
+                queued[LANES[priority]] += 1
+        return {
+            "limit": round(self.limit, 2),
+            "active": slots.active,
+            "queued": queued,
+            **self.counters,
+        }
+
+    # --- Concurrency ---
+
+    def _wake(self, slots: _Slots):
+        while slots.waiters and slots.active < int(self.limit):
+            _, _, future = heapq.heappop(slots.waiters)
+            if not future.done():
+                slots.active += 1
+                future.set_result(None)
+
+    def _release(self, slots: _Slots):
+        slots.active -= 1
+        self._wake(slots)
+
+    async def _acquire(self, priority: int, deadline: float) -> _Slots:
+        slots = loop_local("llm_slots", _Slots)
+        if slots.active < int(self.limit) and not slots.waiters:
+            slots.active += 1
+            return slots
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(slots.waiters, (priority, next(self._seq), future))
+        try:
+            await asyncio.wait_for(future, max(deadline - time.monotonic(), 0))
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self._release(slots)
+            else:
+                future.cancel()
+            raise
+        return slots
+
+    def _on_success(self):
+        self.limit = min(self.limit + 1 / self.limit, LLM_MAX_CONCURRENCY)
+
+    def _on_quota_error(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= 1.0:
+            self._last_decrease = now
+            self.limit = max(self.limit / 2, LLM_MIN_CONCURRENCY)
+
+    # --- Token budget ---
+
+    async def _spend_tokens(self, tokens: int, deadline: float):
+        self.counters["tokens_estimated"] += tokens
+        if LLM_TOKENS_PER_MINUTE <= 0:
+            return
+        window = loop_local("llm_tokens", _TokenWindow)
+        while True:
+            now = time.monotonic()
+            window.trim(now)
+            # A single oversized call still goes through once the window is empty.
+            if not window.spent or window.total + tokens <= LLM_TOKENS_PER_MINUTE:
+                window.spent.append((now, tokens))
+                window.total += tokens
+                return
+            wait = window.spent[0][0] + 60 - now
+            if now + wait > deadline:
+                raise self._deadline_error("token budget")
+            await asyncio.sleep(wait)
+
+    # --- Calls ---
+
+    def _deadline(self, priority: int, timeout: Optional[float]) -> float:
+        if timeout is None:
+            timeout = LLM_INTERACTIVE_DEADLINE if priority == INTERACTIVE else LLM_BULK_DEADLINE
+        return time.monotonic() + timeout
+
+    def _deadline_error(self, waiting_for: str) -> LLMUnavailable:
+        self.counters["deadline_exceeded"] += 1
+        return LLMUnavailable(504, f"AI request timed out waiting for {waiting_for}")
+
+    async def _backoff(self, attempt: int, error: Exception, deadline: float):
+        quota = isinstance(error, _errors()[0])
+        if quota:
+            self.counters["quota_errors"] += 1
+            self._on_quota_error()
+        else:
+            self.counters["transient_errors"] += 1
+        delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+        if attempt >= LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+            if quota:
+                raise LLMUnavailable(429, "AI quota exhausted, try again shortly", retry_after=LLM_BACKOFF_MAX)
+            raise LLMUnavailable(503, f"AI service unavailable: {error}", retry_after=LLM_BACKOFF_BASE)
+        self.counters["retries"] += 1
+        print(f"LLM call failed ({type(error).__name__}), retry {attempt + 1} in {delay:.2f}s")
+        with span("llm_backoff"):
+            await asyncio.sleep(delay)
+
+    async def generate(
+        self,
+        parts: list,
+        priority: int = BULK,
+        timeout: Optional[float] = None,
+        generation_config: Optional[dict] = None,
+    ):
+        """One ``generate_content_async`` call, scheduled, retried and bounded by a deadline."""
+        deadline = self._deadline(priority, timeout)
+        await self._spend_tokens(estimate_tokens(parts), deadline)
+        for attempt in itertools.count():
+            try:
+                with span("llm_queue"):
+                    slots = await self._acquire(priority, deadline)
+            except asyncio.TimeoutError:
+                raise self._deadline_error("a free slot")
+            try:
+                self.counters["calls"] += 1
+                with span("llm"):
+                    response = await asyncio.wait_for(
+                        get_model(self.model_name).generate_content_async(parts, generation_config=generation_config),
+                        max(deadline - time.monotonic(), 0),
+                    )
+                self._on_success()
+                return response
+            except asyncio.TimeoutError:
+                if time.monotonic() >= deadline:
+                    raise self._deadline_error("the model")
+                error = asyncio.TimeoutError()
+            except _errors()[1] as e:
+                error = e
+            finally:
+                self._release(slots)
+            await self._backoff(attempt, error, deadline)
+
+    async def stream(
+        self,
+        parts: list,
+        priority: int = BULK,
+        timeout: Optional[float] = None,
+        generation_config: Optional[dict] = None,
+    ):
+        """Streamed variant of ``generate`` yielding response chunks.
+
+        The slot is held until the stream is exhausted. Failures are only
+        retried before the first chunk arrives, since the caller may already
+        have acted on earlier chunks.
+        """
+        deadline = self._deadline(priority, timeout)
+        await self._spend_tokens(estimate_tokens(parts), deadline)
+        for attempt in itertools.count():
+            try:
+                with span("llm_queue"):
+                    slots = await self._acquire(priority, deadline)
+            except asyncio.TimeoutError:
+                raise self._deadline_error("a free slot")
+            started = False
+            try:
+                self.counters["calls"] += 1
+                with span("llm_first_chunk"):
+                    response = await asyncio.wait_for(
+                        get_model(self.model_name).generate_content_async(
+                            parts, generation_config=generation_config, stream=True
+                        ),
+                        max(deadline - time.monotonic(), 0),
+                    )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), max(deadline - time.monotonic(), 0))
+                    except StopAsyncIteration:
+                        break
+                    started = True
+                    yield chunk
+                self._on_success()
+                return
+            except asyncio.TimeoutError:
+                if started or time.monotonic() >= deadline:
+                    raise self._deadline_error("the model")
+                error = asyncio.TimeoutError()
+            except _errors()[1] as e:
+                if started:
+                    raise
+                error = e
+            finally:
+                self._release(slots)
+            await self._backoff(attempt, error, deadline)
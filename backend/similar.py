@@ -0,0 +1,214 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter
+from operator import eq
+from typing import List, Optional, Tuple
+
+# University papers reuse questions year after year with small edits. Every
+# extracted question is fingerprinted with MinHash over shingles of its
+# normalized text and filed into LSH buckets, so near-duplicates are found by
+# a handful of index lookups instead of a scan. The index lives in SQLite and
+# grows one paper at a time.
+SIMILAR_THRESHOLD = float(os.getenv("SIMILAR_THRESHOLD", "0.5"))
+SIMILAR_LIMIT = int(os.getenv("SIMILAR_LIMIT", "5"))
+
+NUM_PERM = 64
+BANDS, ROWS = 21, 3  # a pair at Jaccard 0.5 shares a band 94% of the time; at 0.2, 16%
+# Exam questions are short: with word pairs a one-word edit still leaves a
+# typical question above the threshold, where triples would not.
+SHINGLE = 2
+BUCKET_LIMIT = 16
+MAX_CANDIDATES = 20
+# Bump when normalization, shingling or the hash family changes: stored
+# signatures are only comparable with ones computed the same way.
+INDEX_VERSION = "1"
+
+# Markup that changes how a question is typeset but not what it asks.
+LATEX_NOISE = re.compile(r"\\(?:left|right|big|Big|bigg|Bigg|displaystyle|textstyle|limits|,|;|:|!| )|\\q?quad\b|~|\$")
+LATEX_WRAPPER = re.compile(r"\\(?:mathrm|mathbf|mathit|text|textbf|textit|operatorname|boldsymbol)\s*\{([^{}]*)\}")
+TOKEN = re.compile(r"\\[A-Za-z]+|[A-Za-z]+|\d+(?:\.\d+)?|[^\sA-Za-z\d{}]")
+QUESTION_LABEL = re.compile(r"^\s*(?:q(?:uestion)?\s*)?\(?\d+[a-z]?[.)]\s*|^\s*\(?[a-z][.)]\s+", re.I)
+
+
+def tokens(text: str) -> List[str]:
+    """LaTeX-aware tokens: commands are kept whole (\\frac, \\int), styling
+    wrappers and spacing are dropped, and prose is case-folded. Math letters
+    keep their case, so $\\Delta$ and $\\delta$ stay distinct."""
+    text = QUESTION_LABEL.sub("", text)
+    text = LATEX_WRAPPER.sub(r" \1 ", text)
+    text = LATEX_NOISE.sub(" ", text)
+    out = []
+    for token in TOKEN.findall(text):
+        if token[0].isalpha() and len(token) > 1:
+            token = token.casefold()
+        out.append(token)
+    return out
+
+
+def shingles(text: str) -> set:
+    words = tokens(text)
+    if len(words) < SHINGLE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+
+
+def signature(shingle_set: set) -> array:
+    # shake_128 yields NUM_PERM independent 32-bit hashes of a shingle in one
+    # call, so the per-hash minimum runs in C rather than a Python loop.
+    hashes = [array("I", hashlib.shake_128(s.encode("utf-8")).digest(4 * NUM_PERM)) for s in shingle_set]
+    return array("I", map(min, *hashes)) if len(hashes) > 1 else hashes[0]
+
+
+def band_keys(sig: array) -> List[Tuple[int, int]]:
+    keys = []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS:(band + 1) * ROWS].tobytes()
+        # 63 bits so the bucket fits SQLite's signed INTEGER.
+        keys.append((band, int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "little") >> 1))
+    return keys
+
+
+def estimate(a: array, b: array) -> float:
+    return sum(map(eq, a, b)) / NUM_PERM
+
+
+class SimilarIndex:
+    """Persistent MinHash/LSH index of question texts.
+
+    Identical normalized texts share one entry. Lookups verify at most
+    ``MAX_CANDIDATES`` entries, those colliding in the most bands, scoring
+    each by the fraction of matching MinHash values.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        version = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is not None and version[0] != INDEX_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS questions")
+            self._conn.execute("DROP TABLE IF EXISTS buckets")
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (INDEX_VERSION,))
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                fingerprint TEXT UNIQUE NOT NULL,
+                content TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                source TEXT,
+                seen INTEGER NOT NULL DEFAULT 1,
+                created REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                question_id INTEGER NOT NULL,
+                PRIMARY KEY (band, bucket, question_id)
+            ) WITHOUT ROWID"""
+        )
+
+    def _candidates(self, sig: array, exclude_source: Optional[str], exclude_id: Optional[int]) -> List[tuple]:
+        keys = band_keys(sig)
+        # One indexed probe per band; a crowded bucket contributes its BUCKET_LIMIT
+        # newest ids, so questions added since it filled up can still be found.
+        probe = " UNION ALL ".join(
+            f"SELECT * FROM (SELECT question_id FROM buckets WHERE band = ? AND bucket = ? "
+            f"ORDER BY question_id DESC LIMIT {BUCKET_LIMIT})"
+            for _ in keys
+        )
+        hits = Counter(row[0] for row in self._conn.execute(probe, [v for key in keys for v in key]))
+        hits.pop(exclude_id, None)
+        if not hits:
+            return []
+        # Pairs that collide in more bands are likelier matches, so only the top few are verified.
+        ids = [question_id for question_id, _ in hits.most_common(MAX_CANDIDATES)]
+        rows = self._conn.execute(
+            f"SELECT id, signature, source FROM questions WHERE id IN ({','.join('?' * len(ids))})", ids
+        ).fetchall()
+        return [row for row in rows if exclude_source is None or row[2] != exclude_source]
+
+    def _rank(self, sig: array, rows: List[tuple], threshold: float, limit: int) -> List[dict]:
+        scored = []
+        for question_id, stored, source in rows:
+            score = estimate(sig, array("I", stored))
+            if score >= threshold:
+                scored.append((score, question_id))
+        scored.sort(key=lambda m: (-m[0], m[1]))
+        scored = scored[:limit]
+        if not scored:
+            return []
+        contents = dict(self._conn.execute(
+            f"SELECT id, content FROM questions WHERE id IN ({','.join('?' * len(scored))})", [i for _, i in scored]
+        ).fetchall())
+        return [{"id": i, "content": contents[i], "score": round(score, 3)} for score, i in scored]
+
+    def query(self, text: str, threshold: float = SIMILAR_THRESHOLD, limit: int = SIMILAR_LIMIT,
+              exclude_source: Optional[str] = None) -> List[dict]:
+        shingle_set = shingles(text)
+        if not shingle_set:
+            return []
+        sig = signature(shingle_set)
+        with self._lock:
+            return self._rank(sig, self._candidates(sig, exclude_source, None), threshold, limit)
+
+    def neighbours(self, question_id: int, threshold: float = SIMILAR_THRESHOLD, limit: int = SIMILAR_LIMIT) -> Optional[List[dict]]:
+        with self._lock:
+            row = self._conn.execute("SELECT signature FROM questions WHERE id = ?", (question_id,)).fetchone()
+            if row is None:
+                return None
+            sig = array("I", row[0])
+            return self._rank(sig, self._candidates(sig, None, question_id), threshold, limit)
+
+    def add_paper(self, questions: List[dict], source: str, threshold: float = SIMILAR_THRESHOLD,
+                  limit: int = SIMILAR_LIMIT) -> List[dict]:
+        """Index a paper's questions, setting ``index_id`` and ``similar`` on
+        each. Matches come from other papers only, so a paper is not listed
+        as a duplicate of itself when it is extracted again."""
+        prepared = []
+        for q in questions:
+            shingle_set = shingles(q.get("content") or "")
+            prepared.append((q, signature(shingle_set) if shingle_set else None))
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for q, sig in prepared:
+                    if sig is None:
+                        continue
+                    q["similar"] = self._rank(sig, self._candidates(sig, source, None), threshold, limit)
+                    fingerprint = hashlib.sha256(" ".join(tokens(q["content"])).encode("utf-8")).hexdigest()
+                    row = self._conn.execute("SELECT id FROM questions WHERE fingerprint = ?", (fingerprint,)).fetchone()
+                    if row is not None:
+                        self._conn.execute("UPDATE questions SET seen = seen + 1 WHERE id = ? AND source IS NOT ?", (row[0], source))
+                        q["index_id"] = row[0]
+                        continue
+                    cur = self._conn.execute(
+                        "INSERT INTO questions (fingerprint, content, signature, source, created) VALUES (?, ?, ?, ?, ?)",
+                        (fingerprint, q["content"], sig.tobytes(), source, now),
+                    )
+                    q["index_id"] = cur.lastrowid
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO buckets (band, bucket, question_id) VALUES (?, ?, ?)",
+                        [(band, bucket, cur.lastrowid) for band, bucket in band_keys(sig)],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return questions
+
+    def stats(self) -> dict:
+        with self._lock:
+            questions, seen = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(seen), 0) FROM questions").fetchone()
+        return {"questions": questions, "occurrences": seen, "threshold": SIMILAR_THRESHOLD}
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+from executor import loop_local
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent identical work onto one shared in-flight task.
+
+    The first caller for a key starts ``fn()``; callers that arrive while it
+    is running await the same task and get the same result or exception.
+    A caller that is cancelled only cancels the shared work if nobody else
+    is still waiting for it.
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, field: str):
+        counters = self.stats.setdefault(namespace, {"calls": 0, "coalesced": 0})
+        counters[field] += 1
+
+    async def do(self, namespace: str, key: str, fn: Callable[[], Awaitable]):
+        calls = loop_local("singleflight", dict)
+        full_key = (namespace, key)
+        call = calls.get(full_key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            calls[full_key] = call
+
+            def forget(task, full_key=full_key, call=call):
+                if calls.get(full_key) is call:
+                    del calls[full_key]
+                if not task.cancelled():
+                    task.exception()  # mark retrieved even if every waiter left
+
+            call.task.add_done_callback(forget)
+            self._count(namespace, "calls")
+        else:
+            self._count(namespace, "coalesced")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.task.cancelled() or call.waiters > 1:
+                raise
+            # Last interested caller went away: stop the work, and make sure a
+            # new caller starts fresh rather than joining a cancelled task.
+            if calls.get(full_key) is call:
+                del calls[full_key]
+            call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+
+inflight = SingleFlight()
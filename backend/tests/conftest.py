@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The backend modules import each other as top-level modules.
+sys.path.insert(0, BACKEND)
+
+
+@pytest.fixture
+def samples(monkeypatch):
+    """bench/common's sample PDFs, without its environment defaults leaking."""
+    for name in ("GOOGLE_API_KEY", "CACHE_DIR", "PAGE_CACHE"):
+        monkeypatch.setenv(name, os.environ.get(name, ""))
+    monkeypatch.syspath_prepend(os.path.join(BACKEND, "bench"))
+    import common
+    return common
@@ -0,0 +1,15 @@
+from assets import AssetStore
+
+
+def test_least_recently_used_assets_are_evicted(tmp_path):
+    store = AssetStore(str(tmp_path / "assets.sqlite3"), max_bytes=300)
+    first = store.put(b"a" * 100, "image/webp")
+    second = store.put(b"b" * 100, "image/webp")
+    assert store.put(b"a" * 100, "image/webp") == first
+    store.get(first)
+    store.put(b"c" * 100, "image/webp")
+    store.put(b"d" * 100, "image/webp")
+    assert store.get(second) is None
+    assert store.get(first) == ("image/webp", b"a" * 100)
+    assert store.stats()["bytes"] == store._bytes == 300
+    assert store.deduped == 1
@@ -0,0 +1,68 @@
+import asyncio
+import base64
+import hashlib
+
+import httpx
+import pytest
+
+from fetch import FetchCache, FetchError, Fetcher, data_url_bytes
+
+
+def test_data_urls_decode_locally():
+    png = b"\x89PNG\r\n\x1a\nrest"
+    assert data_url_bytes("data:image/png;base64," + base64.b64encode(png).decode()) == png
+    assert data_url_bytes("DATA:image/jpeg;BASE64, " + base64.b64encode(b"jpeg").decode()) == b"jpeg"
+    assert data_url_bytes("data:,a%20b") == b"a b"
+    assert data_url_bytes("https://example.com/a.png") is None
+    with pytest.raises(FetchError):
+        data_url_bytes("data:image/png;base64")
+
+
+def test_fetch_downloads_and_caches(tmp_path):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url)
+        return httpx.Response(200, content=b"body", headers={"cache-control": "max-age=60"})
+
+    fetcher = Fetcher(FetchCache(str(tmp_path / "downloads.sqlite3"), 1024 * 1024))
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    fetcher._client = lambda: client
+
+    async def main():
+        return [await fetcher.fetch_bytes("https://example.com/a.png") for _ in range(2)]
+
+    assert asyncio.run(main()) == [b"body", b"body"]
+    assert len(calls) == 1
+    assert fetcher.stats["fresh_hits"] == 1
+
+
+def test_cache_evicts_least_recently_used_bodies(tmp_path):
+    cache = FetchCache(str(tmp_path / "downloads.sqlite3"), max_bytes=300)
+    for name in "abc":
+        cache.set(f"https://example.com/{name}", None, None, 0.0, name.encode() * 100)
+    cache.get("https://example.com/a")
+    cache.set("https://example.com/c", None, None, 0.0, b"c" * 50)
+    cache.set("https://example.com/d", None, None, 0.0, b"d" * 200)
+    assert cache.get("https://example.com/b") is None
+    assert cache.get("https://example.com/a") is None
+    assert cache.get("https://example.com/c")["body"] == b"c" * 50
+    assert cache._bytes == cache._total() == 250
+
+
+def test_question_images_in_data_urls_are_not_downloaded(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    main = pytest.importorskip("main")
+
+    async def no_network(url):
+        raise AssertionError(f"downloaded {url[:30]}")
+
+    monkeypatch.setattr(main.fetcher, "fetch_bytes", no_network)
+    url = "data:image/png;base64," + base64.b64encode(b"figure").decode()
+
+    async def run():
+        return await main.fetch_image(url), await main.resolve_image(url)
+
+    data, (digest, resolved) = asyncio.run(run())
+    assert data == resolved == b"figure"
+    assert digest == hashlib.sha256(b"figure").hexdigest()
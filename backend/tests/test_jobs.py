@@ -0,0 +1,152 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, QueueFull
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), max_pending=2, lease_seconds=0.05, max_attempts=2)
+
+
+def test_submit_dedups_pending_jobs(queue):
+    job_id = queue.submit("k", b"pdf")
+    assert queue.submit("k", b"pdf") == job_id
+    assert queue.get(job_id)["state"] == QUEUED
+
+    job = queue.claim("w1")
+    assert (job["id"], job["payload"], job["attempt"]) == (job_id, b"pdf", 1)
+    assert queue.submit("k", b"pdf") == job_id
+    assert queue.counts()["deduplicated"] == 2
+
+
+def test_finished_job_is_queued_again_under_the_same_id(queue):
+    job_id = queue.submit("k", b"pdf")
+    job = queue.claim("w1")
+    assert queue.complete(job["id"], "w1", {}, [{"number": "1"}])
+    assert queue.get(job_id)["result"] == [{"number": "1"}]
+    assert queue.submit("k", b"pdf") == job_id
+    assert queue.get(job_id)["state"] == QUEUED
+
+
+def test_claim_is_fifo_and_exclusive(queue):
+    first = queue.submit("a", b"1")
+    second = queue.submit("b", b"2")
+    assert queue.claim("w1")["id"] == first
+    assert queue.claim("w2")["id"] == second
+    assert queue.claim("w3") is None
+
+
+def test_expired_lease_is_reclaimed(queue):
+    job_id = queue.submit("k", b"pdf")
+    queue.claim("w1")
+    assert queue.claim("w2") is None
+    time.sleep(0.1)
+    job = queue.claim("w2")
+    assert (job["id"], job["attempt"]) == (job_id, 2)
+    assert queue.counts()["reclaimed"] == 1
+    # The first worker no longer owns the job and cannot write to it.
+    assert not queue.progress(job_id, "w1", {}, [])
+    assert not queue.complete(job_id, "w1", {}, [])
+    assert queue.progress(job_id, "w2", {"extract": {"state": "running"}}, [])
+    assert queue.get(job_id)["stages"] == {"extract": {"state": "running"}}
+
+
+def test_renewed_lease_is_not_reclaimed(queue):
+    job_id = queue.submit("k", b"pdf")
+    queue.claim("w1")
+    for _ in range(3):
+        time.sleep(0.03)
+        assert queue.renew(job_id, "w1")
+    assert queue.claim("w2") is None
+
+
+def test_job_fails_after_max_attempts(queue):
+    job_id = queue.submit("k", b"pdf")
+    queue.claim("w1")
+    time.sleep(0.1)
+    queue.claim("w2")
+    time.sleep(0.1)
+    assert queue.claim("w3") is None
+    job = queue.get(job_id)
+    assert (job["state"], job["attempts"]) == (FAILED, 2)
+    assert job["error"]
+
+
+def test_release_does_not_count_the_attempt(queue):
+    job_id = queue.submit("k", b"pdf")
+    queue.claim("w1")
+    assert queue.release(job_id, "w1")
+    job = queue.get(job_id)
+    assert (job["state"], job["attempts"]) == (QUEUED, 0)
+    assert queue.claim("w2")["attempt"] == 1
+
+
+def test_full_queue_rejects_new_keys(queue):
+    queue.submit("a", b"1")
+    queue.submit("b", b"2")
+    with pytest.raises(QueueFull) as raised:
+        queue.submit("c", b"3")
+    assert raised.value.status_code == 503
+    assert "Retry-After" in raised.value.headers
+    # Known keys are still deduplicated.
+    assert queue.submit("a", b"1")
+    assert queue.counts()["rejected"] == 1
+
+    job = queue.claim("w1")
+    queue.complete(job["id"], "w1", {}, [])
+    assert queue.submit("c", b"3")
+
+
+def test_finished_records_cache_hits(queue):
+    job_id = queue.finished("k", [{"number": "1"}])
+    job = queue.get(job_id)
+    assert (job["state"], job["result"]) == (DONE, [{"number": "1"}])
+    assert queue.finished("k", [{"number": "1"}]) == job_id
+
+
+def test_finished_completes_a_queued_job_in_place(queue):
+    job_id = queue.submit("k", b"pdf")
+    assert queue.finished("k", [{"number": "1"}]) == job_id
+    assert queue.get(job_id)["state"] == DONE
+    assert queue.claim("w1") is None
+
+
+def test_finished_leaves_a_running_job_alone(queue):
+    job_id = queue.submit("k", b"pdf")
+    queue.claim("w1")
+    assert queue.finished("k", [{"number": "1"}]) == job_id
+    job = queue.get(job_id)
+    assert (job["state"], job["attempts"]) == (RUNNING, 1)
+    # The worker still owns its lease and completes the job.
+    assert queue.renew(job_id, "w1")
+    assert queue.complete(job_id, "w1", {}, [{"number": "2"}])
+    assert queue.get(job_id)["result"] == [{"number": "2"}]
+
+
+def test_worker_survives_queue_errors(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    main = pytest.importorskip("main")
+    monkeypatch.setattr(main, "JOB_POLL_SECONDS", 0.01)
+    claims = []
+
+    def claim(worker):
+        claims.append(worker)
+        if len(claims) <= 2:
+            raise sqlite3.OperationalError("database is locked")
+        return None
+
+    monkeypatch.setattr(main.job_queue, "claim", claim)
+
+    async def run():
+        worker = asyncio.ensure_future(main.job_worker(0))
+        while len(claims) < 4:
+            await asyncio.sleep(0.01)
+            assert not worker.done(), worker.exception()
+        worker.cancel()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert len(claims) >= 4
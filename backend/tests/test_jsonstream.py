@@ -0,0 +1,52 @@
+import json
+
+from jsonstream import JsonArrayStream, loads_lenient, repair_latex_escapes
+
+ITEMS = [
+    {"number": "1", "content": "Find {x} such that \"x > 1\"", "marks": 4},
+    {"number": "2", "content": "Nested", "meta": {"a": [1, {"b": 2}]}},
+    {"number": "3", "content": "Backslash \\ and brace } inside"},
+]
+
+
+def feed_in_chunks(text, size):
+    stream = JsonArrayStream()
+    out = []
+    for i in range(0, len(text), size):
+        out.extend(stream.feed(text[i:i + size]))
+    return stream, out
+
+
+def test_objects_are_returned_whatever_the_chunking():
+    text = "```json\n" + json.dumps(ITEMS, indent=2) + "\n```"
+    for size in (1, 2, 7, len(text)):
+        stream, out = feed_in_chunks(text, size)
+        assert out == ITEMS
+        assert stream.errors == 0
+
+
+def test_objects_arrive_as_soon_as_they_close():
+    stream = JsonArrayStream()
+    assert stream.feed('[{"number": "1"}, {"num') == [{"number": "1"}]
+    assert stream.feed('ber": "2"}') == [{"number": "2"}]
+    assert stream.feed("]") == []
+
+
+def test_text_before_the_array_is_skipped():
+    stream = JsonArrayStream()
+    assert stream.feed('Here you go: {"not": "this"} [{"number": "1"}]') == [{"number": "1"}]
+
+
+def test_latex_backslashes_are_repaired():
+    stream = JsonArrayStream()
+    out = stream.feed(r'[{"content": "\alpha + \sum_{i} \n \"q\""}]')
+    assert out == [{"content": "\\alpha + \\sum_{i} \n \"q\""}]
+    assert repair_latex_escapes(r"\sigma \n") == r"\\sigma \n"
+    assert loads_lenient(r'"\pi"') == "\\pi"
+
+
+def test_malformed_object_is_skipped_and_counted():
+    stream = JsonArrayStream()
+    out = stream.feed('[{"number": "1", oops}, {"number": "2"}]')
+    assert out == [{"number": "2"}]
+    assert stream.errors == 1
@@ -0,0 +1,34 @@
+from pagecache import PageCache, page_digests
+
+
+def test_lookup_by_digest(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite3"), "v1")
+    cache.add({0: ("a", [{"number": "1"}]), 3: ("b", [])})
+    assert cache.lookup(["a", "c", None, "b"]) == [[{"number": "1"}], None, None, []]
+    assert cache.counts()["entries"] == 2
+    assert cache.purge() == 2
+    assert cache.lookup(["a"]) == [None]
+
+
+def test_new_version_starts_afresh(tmp_path):
+    path = str(tmp_path / "pages.sqlite3")
+    PageCache(path, "v1").add({0: ("a", [])})
+    assert PageCache(path, "v1").lookup(["a"]) == [[]]
+    assert PageCache(path, "v2").lookup(["a"]) == [None]
+
+
+def test_oldest_pages_are_evicted(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite3"), "v1", max_entries=10)
+    for i in range(12):
+        cache.add({0: (str(i), [])})
+    assert cache.counts()["entries"] <= 10
+    assert cache.lookup(["0", "11"]) == [None, []]
+
+
+def test_page_digests_follow_page_content(samples):
+    first = page_digests(samples.make_text_pdf(3, seed=1), 3)
+    assert all(first) and len(set(first)) == 3
+    assert page_digests(samples.make_text_pdf(3, seed=1), 3) == first
+    assert page_digests(samples.make_text_pdf(3, seed=2), 3)[0] != first[0]
+    # Scans have no text layer and are never cached.
+    assert page_digests(samples.make_pdf(2), 2) == [None, None]
@@ -0,0 +1,23 @@
+import similar
+from similar import SimilarIndex
+
+
+def test_near_duplicates_from_other_papers_are_found(tmp_path):
+    index = SimilarIndex(str(tmp_path / "similar.sqlite3"))
+    index.add_paper([{"content": "Explain the working of a four stroke petrol engine with a neat sketch."}], "2022")
+    found = index.query("Explain the working of a four stroke diesel engine with a neat sketch.")
+    assert [m["id"] for m in found] == [1]
+    assert index.query("State Kirchhoff's laws.") == []
+    assert index.add_paper([{"content": "Explain the working of a four stroke petrol engine with a neat sketch."}], "2022")[0]["similar"] == []
+
+
+def test_crowded_buckets_return_the_newest_questions(tmp_path, monkeypatch):
+    monkeypatch.setattr(similar, "BUCKET_LIMIT", 3)
+    index = SimilarIndex(str(tmp_path / "similar.sqlite3"))
+    # Repeating a phrase gives distinct texts with the same shingles, so every
+    # question lands in the same bucket of every band.
+    for n in range(2, 10):
+        index.add_paper([{"content": " ".join(["mass energy"] * n)}], f"paper-{n}")
+    assert index.stats()["questions"] == 8
+    found = index.query("mass energy mass energy", limit=10)
+    assert sorted(m["id"] for m in found) == [6, 7, 8]
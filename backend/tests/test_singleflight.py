@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return len(runs)
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("ns", "k", work) for _ in range(5)))
+        # Finished work is forgotten: the next call runs again.
+        again = await flight.do("ns", "k", work)
+        other = await flight.do("ns", "other", work)
+        return results, again, other
+
+    results, again, other = asyncio.run(main())
+    assert results == [1] * 5
+    assert (again, other) == (2, 3)
+    assert flight.stats == {"ns": {"calls": 3, "coalesced": 4}}
+
+
+def test_exception_reaches_every_caller():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("ns", "k", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [type(r) for r in results] == [ValueError] * 3
+
+
+def test_cancelled_caller_leaves_shared_work_running():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("ns", "k", work))
+        second = asyncio.ensure_future(flight.do("ns", "k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_last_caller_cancelling_stops_the_work():
+    flight = SingleFlight()
+    events = []
+
+    async def work():
+        events.append("start")
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        return "slow"
+
+    async def quick():
+        return "fresh"
+
+    async def main():
+        caller = asyncio.ensure_future(flight.do("ns", "k", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        # A new caller must not join the cancelled task.
+        result = await flight.do("ns", "k", quick)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "fresh"
+    assert events == ["start", "cancelled"]
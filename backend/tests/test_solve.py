@@ -0,0 +1,53 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    return pytest.importorskip("main")
+
+
+def test_miss_latency_counts_only_timed_misses(main, monkeypatch):
+    monkeypatch.setattr(main, "solve_latency", {"hits": 0, "hit_seconds": 0.0, "misses": 0, "miss_seconds": 0.0})
+
+    async def fake_solve(key, content, image_bytes, priority=main.BULK):
+        await asyncio.sleep(0.05)
+        return "solved"
+
+    monkeypatch.setattr(main, "solve_and_store", fake_solve)
+    # A /solve-batch style miss: counted by the cache but never timed.
+    main.solution_cache.get(main.solution_key("batch question", None))
+    assert asyncio.run(main.solve_content("timed question", None)) == "solved"
+
+    solutions = asyncio.run(main.stats())["solutions"]
+    assert solutions["misses"] >= 2
+    assert main.solve_latency["misses"] == 1
+    assert solutions["avg_miss_ms"] == round(main.solve_latency["miss_seconds"] * 1000, 2)
+    assert solutions["avg_miss_ms"] >= 50
+
+
+def test_batch_reports_store_errors_per_item(main, monkeypatch):
+    monkeypatch.setattr(main, "GENAI_KEY", "test")
+
+    async def packed(contents):
+        return {0: "packed answer"}
+
+    async def single(content, image_bytes=None, priority=main.INTERACTIVE):
+        return "single answer"
+
+    def broken_set(key, value, ttl=None):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(main, "generate_packed_solutions", packed)
+    monkeypatch.setattr(main, "generate_solution", single)
+    monkeypatch.setattr(main.solution_cache, "set", broken_set)
+    request = main.BatchSolveRequest(questions=[
+        {"id": "a", "content": "First batch question"},
+        {"id": "b", "content": "Second batch question"},
+    ])
+    solutions = asyncio.run(main.solve_batch(request))["solutions"]
+    assert solutions["a"] == {"solution": "packed answer", "cached": False}
+    assert solutions["b"] == {"error": "Failed to solve: database is locked"}
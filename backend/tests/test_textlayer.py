@@ -0,0 +1,9 @@
+from textlayer import TEXT_LAYER_MIN_CHARS, read_text_layer
+
+
+def test_full_text_pages_are_dense_and_scans_have_no_layer(samples):
+    pages = read_text_layer(samples.make_text_pdf(2), 2)
+    assert [p["usable"] for p in pages] == [True, True]
+    assert all(40 <= p["density"] <= 85 for p in pages)
+    assert read_text_layer(samples.make_text_pdf(1, lines_per_page=3), 1)[0]["chars"] > TEXT_LAYER_MIN_CHARS
+    assert [p["usable"] for p in read_text_layer(samples.make_pdf(2), 2)] == [False, False]
@@ -0,0 +1,27 @@
+import asyncio
+
+from tracing import TracingMiddleware, span
+
+
+def test_server_timing_ends_with_the_request_total():
+    async def app(scope, receive, send):
+        with span("render"):
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.02)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await TracingMiddleware(app)({"type": "http", "method": "GET", "path": "/", "headers": []}, None, send)
+
+    asyncio.run(run())
+    timing = dict(sent[0]["headers"])[b"server-timing"].decode()
+    entries = dict(entry.split(";")[:2] for entry in timing.split(", "))
+    assert list(entries) == ["render", "total"]
+    render, total = (float(entries[name][len("dur="):]) for name in ("render", "total"))
+    assert render >= 10 and total >= render + 20
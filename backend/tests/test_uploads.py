@@ -0,0 +1,28 @@
+import io
+
+import pytest
+
+
+def blank_pdf(pages: int) -> bytes:
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument.new()
+    for _ in range(pages):
+        pdf.new_page(595, 842)
+    out = io.BytesIO()
+    pdf.save(out)
+    pdf.close()
+    return out.getvalue()
+
+
+def test_extract_rejects_pdfs_over_the_page_limit(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    main = pytest.importorskip("main")
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main, "EXTRACT_MAX_PAGES", 2)
+    with TestClient(main.app) as client:
+        files = {"file": ("paper.pdf", blank_pdf(3), "application/pdf")}
+        res = client.post("/extract", files=files)
+    assert res.status_code == 413
+    assert res.json()["detail"] == "PDF has 3 pages; the limit is 2"
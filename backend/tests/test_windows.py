@@ -0,0 +1,108 @@
+from windows import WindowMerger, normalize_number, plan_windows
+
+
+def q(number, page, content=None, continuation=False):
+    question = {"number": number, "page_number": page, "content": content or f"Q{number}"}
+    if continuation:
+        question["continuation"] = True
+    return question
+
+
+def merge(windows, results, order):
+    merger = WindowMerger(windows)
+    out = []
+    for index in order:
+        out.extend(merger.add(index, results[index]))
+    return out
+
+
+def test_plan_windows():
+    assert plan_windows(0, 3, 1) == []
+    assert plan_windows(2, 3, 1) == [(0, 2)]
+    assert plan_windows(7, 3, 1) == [(0, 3), (2, 5), (4, 7)]
+    # Overlap is capped so windows always advance.
+    assert plan_windows(3, 2, 5) == [(0, 2), (1, 3)]
+
+
+def test_normalize_number():
+    assert normalize_number(" (1a). ") == "1a"
+    assert normalize_number("[Q2]") == "q2"
+    assert normalize_number(None) == ""
+
+
+def test_pages_become_absolute_and_owned_once():
+    windows = plan_windows(5, 3, 1)
+    results = {
+        0: [q("1", 1), q("2", 2), q("3", 3)],
+        1: [q("3", 1), q("4", 2), q("5", 3)],
+    }
+    out = merge(windows, results, [0, 1])
+    assert [(x["number"], x["page_number"]) for x in out] == [("1", 1), ("2", 2), ("3", 3), ("4", 4), ("5", 5)]
+
+
+def test_out_of_order_windows_release_in_page_order():
+    windows = plan_windows(7, 3, 1)
+    results = lambda: {
+        0: [q("1", 1), q("2", 2)],
+        1: [q("3", 1), q("4", 2)],
+        2: [q("5", 1), q("6", 3)],
+    }
+    merger = WindowMerger(windows)
+    assert merger.add(2, results()[2]) == []
+    assert merger.add(1, results()[1]) == []
+    released = merger.add(0, results()[0])
+    assert [x["number"] for x in released] == ["1", "2", "3", "4", "5", "6"]
+    assert released == merge(windows, results(), [0, 1, 2])
+
+
+def test_continuation_on_overlap_page_is_dropped():
+    # Window 0 saw question 2 run onto page 3, which window 1 starts with.
+    windows = plan_windows(5, 3, 1)
+    results = {
+        0: [q("1", 1), q("2", 2, "Q2 part one\nQ2 part two")],
+        1: [q("", 1, "Q2 part two", continuation=True), q("3", 2)],
+    }
+    out = merge(windows, results, [0, 1])
+    assert [x["content"] for x in out] == ["Q1", "Q2 part one\nQ2 part two", "Q3"]
+    assert all("continuation" not in x for x in out)
+
+
+def test_continuation_past_previous_window_extends_held_question():
+    windows = plan_windows(5, 3, 1)
+    results = {
+        0: [q("1", 1), q("2", 3, "Q2 start")],
+        1: [q("2", 1, "Q2 start"), q("", 2, "Q2 end", continuation=True), q("3", 3)],
+    }
+    out = merge(windows, results, [0, 1])
+    assert [(x["number"], x["content"]) for x in out] == [("1", "Q1"), ("2", "Q2 start\nQ2 end"), ("3", "Q3")]
+
+
+def test_duplicate_on_overlap_page_is_dropped():
+    # Question 2 starts on the last page window 0 owns; window 1 sees its tail
+    # on the overlap page and reports it again under the same number.
+    windows = plan_windows(5, 3, 1)
+    results = {
+        0: [q("1", 1), q("(2)", 2, "Q2")],
+        1: [q("2.", 1, "tail of 2"), q("3", 2)],
+    }
+    out = merge(windows, results, [0, 1])
+    assert [(x["number"], x["content"]) for x in out] == [("1", "Q1"), ("(2)", "Q2"), ("3", "Q3")]
+
+
+def test_empty_window_between_keeps_last_question_open():
+    windows = plan_windows(7, 3, 1)
+    results = {
+        0: [q("1", 1), q("2", 2, "Q2 start")],
+        1: [],
+        2: [q("", 2, "Q2 end", continuation=True), q("3", 3)],
+    }
+    merger = WindowMerger(windows)
+    assert [x["number"] for x in merger.add(0, results[0])] == ["1"]
+    assert merger.add(1, results[1]) == []
+    out = merger.add(2, results[2])
+    assert [(x["number"], x["content"], x["page_number"]) for x in out] == [("2", "Q2 start\nQ2 end", 2), ("3", "Q3", 7)]
+
+
+def test_bad_page_numbers_are_clamped_to_the_window():
+    out = merge(plan_windows(3, 3, 1), {0: [q("1", "x"), q("2", None), q("3", 9)]}, [0])
+    assert [x["page_number"] for x in out] == [1, 1, 3]
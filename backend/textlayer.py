@@ -0,0 +1,69 @@
+import os
+import unicodedata
+from typing import List
+
+from render import PdfSource, open_pdf
+
+# Born-digital PDFs (Word, LaTeX, Canva exports) already carry a text layer,
+# which pdfium can read in milliseconds. A page is trusted only if it has
+# enough characters for its area and nearly all of them map to real Unicode
+# glyphs; scanned pages and fonts without a ToUnicode map fall back to OCR.
+#
+# Measured with pdfium on A4 pages (50 units of 100x100pt): a full page of
+# 10pt text has 60-85 characters per unit (3000-4300 in all), a 30-line exam
+# page about 40, the last page of a paper with four short questions about 3
+# (160 characters) and a cover page with a title and two short lines about 1
+# (60 characters). 80 characters keeps that short last page on the text
+# layer. Below it, the text layer may be no more than a stamp on a scan
+# ("Scanned with CamScanner" is 20 characters), so OCR is the safer read; on
+# A4 the density floor (25 characters) only matters for larger pages.
+TEXT_LAYER_MIN_CHARS = int(os.getenv("TEXT_LAYER_MIN_CHARS", "80"))
+TEXT_LAYER_MIN_DENSITY = float(os.getenv("TEXT_LAYER_MIN_DENSITY", "0.5"))
+TEXT_LAYER_MIN_COVERAGE = float(os.getenv("TEXT_LAYER_MIN_COVERAGE", "0.9"))
+
+
+def glyph_coverage(text: str) -> float:
+    """Fraction of non-space characters that decoded to a meaningful glyph."""
+    total = good = 0
+    for ch in text:
+        if ch.isspace():
+            continue
+        total += 1
+        category = unicodedata.category(ch)
+        # Unmapped glyphs surface as U+FFFD, control codes or private-use points.
+        if ch != "\ufffd" and category not in ("Cc", "Co", "Cn", "Cs"):
+            good += 1
+    return good / total if total else 0.0
+
+
+def read_text_layer(pdf_source: PdfSource, max_pages: int) -> List[dict]:
+    pdf = open_pdf(pdf_source)
+    try:
+        pages = []
+        for i in range(min(len(pdf), max_pages)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            text = textpage.get_text_bounded()
+            textpage.close()
+            width, height = page.get_size()
+            page.close()
+
+            chars = sum(1 for ch in text if not ch.isspace())
+            # Characters per 100x100pt; a full page of 10pt text is 60-85.
+            density = chars / max(width * height / 10000, 1)
+            coverage = glyph_coverage(text)
+            pages.append({
+                "page": i + 1,
+                "text": text.replace("\r\n", "\n"),
+                "chars": chars,
+                "density": round(density, 2),
+                "coverage": round(coverage, 3),
+                "usable": (
+                    chars >= TEXT_LAYER_MIN_CHARS
+                    and density >= TEXT_LAYER_MIN_DENSITY
+                    and coverage >= TEXT_LAYER_MIN_COVERAGE
+                ),
+            })
+        return pages
+    finally:
+        pdf.close()
@@ -0,0 +1,257 @@
+import bisect
+import collections
+import contextvars
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Named spans (download, render, encode, llm, parse, crop, serialize, ...)
+# are summed per request into a Server-Timing header, which ends with a
+# "total" entry for the request so far, and observed into per-stage
+# histograms exported on /metrics. With TRACING_ENABLED=0, span() returns a
+# shared no-op and the middleware passes requests straight through.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() not in ("0", "false", "no")
+PROFILE_HEADER = "x-profile"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [bucket counts..., +Inf count, sum]
+                series = self._series[labels] = [0] * (len(BUCKETS) + 1) + [0.0]
+            series[bisect.bisect_left(BUCKETS, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[tuple, float] = collections.defaultdict(float)
+
+    def inc(self, labels: tuple, amount: float = 1):
+        self._values[labels] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value:g}")
+        return lines
+
+
+def _labels(names: Tuple[str, ...], values: tuple) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+request_seconds = Histogram("sastracker_request_seconds", "Request latency until the response body completes.", ("route", "status"))
+stage_seconds = Histogram("sastracker_stage_seconds", "Time spent in a named stage of request handling.", ("route", "stage"))
+requests_total = Counter("sastracker_requests_total", "Requests served.", ("route", "status"))
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collect: Callable[[], List[str]]):
+    """Add a callable returning extra exposition lines (gauges from caches etc.)."""
+    _collectors.append(collect)
+
+
+def render_metrics() -> str:
+    lines = request_seconds.render() + requests_total.render() + stage_seconds.render()
+    for collect in _collectors:
+        try:
+            lines.extend(collect())
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+class Trace:
+    __slots__ = ("scope", "stages", "started")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.stages: Dict[str, List[float]] = {}
+        self.started = time.perf_counter()
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    def server_timing(self) -> str:
+        """Each stage's summed time, then ``total``: the time from the start
+        of the request until now."""
+        entries = [
+            f'{name};dur={total * 1000:.1f};desc="{count}x"'
+            for name, (total, count) in self.stages.items()
+        ]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def record(name: str, seconds: float):
+    """Attribute ``seconds`` to stage ``name`` of the current request."""
+    trace = _current.get()
+    if trace is None:
+        return
+    totals = trace.stages.setdefault(name, [0.0, 0])
+    totals[0] += seconds
+    totals[1] += 1
+    stage_seconds.observe((trace.route, name), seconds)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    if not TRACING_ENABLED or _current.get() is None:
+        return _NO_SPAN
+    return _Span(name)
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every ``interval`` seconds.
+
+    It profiles the event-loop thread, so work for other requests that runs
+    concurrently shows up too. The result is in collapsed-stack format
+    (``frame;frame;frame count``), which flamegraph tools accept directly.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+profiles: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens a trace per HTTP request.
+
+    ``allow_profile(scope)`` decides whether an ``X-Profile: 1`` request may
+    turn on the sampling profiler; its id is returned in ``X-Profile-Id`` and
+    the collapsed stacks are kept in ``profiles`` for the last few requests.
+    Server-Timing only covers stages finished before the response headers,
+    so streamed responses report their setup work.
+    """
+
+    def __init__(self, app, allow_profile: Optional[Callable[[dict], bool]] = None):
+        self.app = app
+        self.allow_profile = allow_profile
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope)
+        token = _current.set(trace)
+        status = 500
+        profiler = profile_id = None
+        headers = dict(scope.get("headers") or [])
+        if headers.get(PROFILE_HEADER.encode()) == b"1" and self.allow_profile and self.allow_profile(scope):
+            profile_id = uuid.uuid4().hex[:12]
+            profiler = SamplingProfiler(threading.get_ident())
+            profiler.start()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                extra = [(b"server-timing", trace.server_timing().encode("latin-1"))]
+                if profile_id:
+                    extra.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            labels = (trace.route, str(status))
+            request_seconds.observe(labels, time.perf_counter() - trace.started)
+            requests_total.inc(labels)
+            if profiler is not None:
+                profiles[profile_id] = profiler.stop()
+                while len(profiles) > PROFILE_KEEP:
+                    profiles.popitem(last=False)
+            _current.reset(token)
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import tempfile
+from typing import Tuple, Union
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from executor import run_cpu, run_io
+from render import page_count
+
+# Uploaded PDFs are read in chunks and hashed on the way in, so the cache key
+# is known without a second pass and an oversized body is cut off as soon as
+# it crosses the limit. Small uploads stay in memory; larger ones are spooled
+# to a named temp file that the render workers open by path, instead of the
+# whole body being pickled into the process pool for every page.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "25")) * 1024 * 1024
+UPLOAD_MAX_PAGES = int(os.getenv("UPLOAD_MAX_PAGES", "100"))
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_MB", "4")) * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 256 * 1024
+# Room for multipart boundaries, part headers and small form fields.
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Upload is larger than {max_bytes // 2 ** 20} MB")
+
+
+class SpooledPdf:
+    """An upload kept on disk. Worker processes are sent only its path, and
+    the file is deleted once the last reference to this object goes away, so
+    pass the object itself (not its path) to work that may outlive a request.
+    """
+
+    def __init__(self, file, size: int):
+        self._file = file
+        self.path = file.name
+        self.size = size
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __reduce__(self):
+        # Pickles as the bare path: workers never own (or delete) the file.
+        return (str, (self.path,))
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+UploadedPdf = Union[bytes, SpooledPdf]
+
+
+def pdf_bytes_of(pdf: UploadedPdf) -> bytes:
+    return pdf if isinstance(pdf, bytes) else pdf.read()
+
+
+def spool_pdf(data: bytes) -> UploadedPdf:
+    """``data`` as read_upload would have returned it: as is if small,
+    otherwise written to a named temp file."""
+    if len(data) <= UPLOAD_SPOOL_BYTES:
+        return data
+    spool = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf")
+    try:
+        spool.write(data)
+        spool.flush()
+    except BaseException:
+        spool.close()
+        raise
+    return SpooledPdf(spool, len(data))
+
+
+async def read_upload(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES,
+                      max_pages: int = UPLOAD_MAX_PAGES) -> Tuple[UploadedPdf, str]:
+    """Read an uploaded PDF and return it with its sha256.
+
+    Raises 413 as soon as the body passes ``max_bytes`` or if the document
+    has more than ``max_pages`` pages, and 400 if pdfium cannot open it.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spool = None
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            digest.update(chunk)
+            if spool is None and size > UPLOAD_SPOOL_BYTES:
+                spool = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf")
+                await run_io(spool.write, bytes(buffer))
+                buffer = None
+            if spool is None:
+                buffer += chunk
+            else:
+                await run_io(spool.write, chunk)
+        if spool is not None:
+            await run_io(spool.flush)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+        raise
+
+    pdf = bytes(buffer) if spool is None else SpooledPdf(spool, size)
+    try:
+        pages = await run_cpu(page_count, pdf)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read PDF: {str(e)}")
+    if pages > max_pages:
+        raise HTTPException(status_code=413, detail=f"PDF has {pages} pages; the limit is {max_pages}")
+    return pdf, digest.hexdigest()
+
+
+class UploadLimitMiddleware:
+    """Reject request bodies larger than ``max_bytes`` before they are parsed:
+    straight away when Content-Length says so, otherwise as soon as the body
+    streamed so far passes the limit."""
+
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope.get("headers") or []).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            error = UploadTooLarge(self.max_bytes)
+            await JSONResponse({"detail": error.detail}, status_code=error.status_code)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLarge(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,94 @@
+import re
+from typing import Dict, List, Tuple
+
+# Long papers are split into overlapping page windows that are extracted
+# concurrently. Window i "owns" the questions that start on its pages up to the
+# first page of window i+1; with an overlap of at least one page, the owner of a
+# question has also seen the page it continues onto.
+
+
+def plan_windows(n_pages: int, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """0-based, end-exclusive page ranges covering ``n_pages``."""
+    if n_pages <= 0:
+        return []
+    size = max(size, 1)
+    overlap = min(max(overlap, 0), size - 1)
+    step = size - overlap
+    windows = []
+    start = 0
+    while True:
+        end = min(start + size, n_pages)
+        windows.append((start, end))
+        if end >= n_pages:
+            return windows
+        start += step
+
+
+def normalize_number(number) -> str:
+    return re.sub(r"[\s().\[\]]", "", str(number or "")).lower()
+
+
+class WindowMerger:
+    """Stitch per-window question lists back into one paper, in page order.
+
+    Windows may be added in any order; ``add`` returns the questions that
+    became final. Page numbers are rewritten from window-relative to absolute.
+    The last question of each window is held back until the next window is
+    merged, since a continuation fragment there may still extend it.
+    """
+
+    def __init__(self, windows: List[Tuple[int, int]]):
+        self.windows = windows
+        self._pending: Dict[int, List[dict]] = {}
+        self._next = 0
+        self._held = None
+        self._boundary_numbers = set()
+
+    def add(self, index: int, questions: List[dict]) -> List[dict]:
+        self._pending[index] = questions
+        released = []
+        while self._next in self._pending:
+            released.extend(self._merge(self._next, self._pending.pop(self._next)))
+            self._next += 1
+        if self._next == len(self.windows) and self._held is not None:
+            released.append(self._held)
+            self._held = None
+        return released
+
+    def _merge(self, index: int, questions: List[dict]) -> List[dict]:
+        start, end = self.windows[index]
+        owned_end = self.windows[index + 1][0] if index + 1 < len(self.windows) else end
+        seen_end = self.windows[index - 1][1] if index > 0 else 0
+
+        kept = []
+        for q in questions:
+            try:
+                page = int(q.get("page_number") or 1)
+            except (TypeError, ValueError):
+                page = 1
+            page_idx = start + min(max(page, 1), end - start) - 1
+            q["page_number"] = page_idx + 1
+
+            if q.pop("continuation", False):
+                if page_idx < seen_end:
+                    # The previous window saw this page and has the whole question.
+                    continue
+                target = kept[-1] if kept else self._held
+                if target is not None:
+                    target["content"] = f"{target.get('content', '')}\n{q.get('content', '')}".strip()
+                    continue
+            if page_idx >= owned_end:
+                continue
+            if page_idx < seen_end and normalize_number(q.get("number")) in self._boundary_numbers:
+                continue
+            kept.append(q)
+
+        self._boundary_numbers = {
+            normalize_number(q.get("number")) for q in kept if q["page_number"] >= owned_end
+        }
+        released = [self._held] if self._held is not None else []
+        self._held = kept.pop() if kept else None
+        if self._held is None and released:
+            # Nothing new to hold; keep the previous candidate open.
+            self._held = released.pop()
+        return released + kept